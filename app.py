@@ -0,0 +1,30 @@
+# app.py
+from flask import Flask
+from models import init_db
+from routes.analytics import analytics_bp
+from routes.constraints import constraints_bp
+from routes.demands import demands_bp
+from routes.jobs import jobs_bp
+from routes.metrics import metrics_bp
+from routes.requests import requests_bp
+from routes.runs import runs_bp
+from routes.shift_definitions import shift_definitions_bp
+from routes.shifts import shifts_bp
+from routes.users import users_bp
+from utils.db import session_scope
+from utils.jobs import reset_stale_jobs
+
+# The API with every blueprint, on a database with all tables and indexes in place. Jobs left
+# queued or running by a previous server process are marked failed.
+def create_app():
+    init_db()
+    with session_scope() as session:
+        reset_stale_jobs(session)
+    app = Flask(__name__)
+    for blueprint in (users_bp, shift_definitions_bp, constraints_bp, demands_bp, shifts_bp, requests_bp,
+                      runs_bp, jobs_bp, metrics_bp, analytics_bp):
+        app.register_blueprint(blueprint)
+    return app
+
+if __name__ == '__main__':
+    create_app().run()
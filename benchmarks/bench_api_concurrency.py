@@ -0,0 +1,156 @@
+# Concurrency load test of the Flask blueprints. The app runs in a threaded WSGI server in
+# this process and a growing number of client threads send a mix of read requests to it for
+# a fixed time each; the table shows the throughput, latency and failed requests per level.
+# One request in six is a write (POST /requests).
+#
+# Usage: python -m benchmarks.bench_api_concurrency [--clients 1 4 16 32] [--duration 10]
+#            [--csrs 200] [--database-url URL] [--shared-session]
+#
+# --shared-session serves every request from one module-level session, the way the
+# blueprints did before they had request-scoped sessions, as the baseline to compare with.
+# --database-url must be a scratch database: its scheduling tables are replaced by a
+# generated scenario. The default is a temporary SQLite file.
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.scenarios import generate_scenario, horizon_constraints
+
+# (path, JSON body for a POST or None for a GET), sent in turn by every client
+ENDPOINTS = (
+    ("/users?limit=200", None),
+    ("/demands", None),
+    ("/shifts?run_id=1&limit=1000", None),
+    ("/runs/latest", None),
+    ("/requests", {'csr_id': 1, 'shift_def_id': 1, 'status': "pending", 'requested_date': "2024-01-15"}),
+    ("/metrics/summary", None),
+)
+
+
+def _seed(num_csrs, num_days):
+    from benchmarks.bench_pipeline import _seed_database
+    from models import init_db
+    from utils.db import get_session
+    from utils.heuristic import greedy_schedule
+    from utils.model_builder import build_coverage_matrix, leave_shift_index, shift_type_indices
+    from utils.persistence import save_run
+    from utils.solvers import SolveResult
+
+    scenario = generate_scenario(num_csrs, num_days, seed=0)
+    init_db()
+    session = get_session()
+    _seed_database(session, scenario)
+    type_indices = shift_type_indices(scenario.shift_definitions)
+    coverage = build_coverage_matrix(scenario.shift_definitions)
+    schedule = greedy_schedule(coverage, scenario.demand, num_csrs, leave_shift_index(scenario.shift_definitions),
+                               type_indices.get("Night", []), type_indices.get("Afternoon", []),
+                               horizon_constraints(scenario.constraints, scenario.start_date, num_days))
+    save_run(session, schedule, list(range(1, num_csrs + 1)), [sd.shift_def_id for sd in scenario.shift_definitions],
+             scenario.start_date, SolveResult("FEASIBLE"), "heuristic")
+    session.close()
+
+
+def _create_app():
+    from flask import Flask
+    from routes.demands import demands_bp
+    from routes.metrics import metrics_bp
+    from routes.requests import requests_bp
+    from routes.runs import runs_bp
+    from routes.shifts import shifts_bp
+    from routes.users import users_bp
+
+    app = Flask(__name__)
+    for blueprint in (users_bp, demands_bp, shifts_bp, runs_bp, requests_bp, metrics_bp):
+        app.register_blueprint(blueprint)
+    return app
+
+
+# Send requests from `clients` threads for `duration` seconds
+def run_level(base_url, clients, duration):
+    stop = time.perf_counter() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(n):
+        k = n
+        while time.perf_counter() < stop:
+            path, body = ENDPOINTS[k % len(ENDPOINTS)]
+            k += 1
+            data = json.dumps(body).encode() if body is not None else None
+            request = urllib.request.Request(base_url + path, data=data, headers={'Content-Type': "application/json"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    latencies = np.array(latencies) * 1000
+    return {
+        'clients': clients,
+        'requests_per_s': len(latencies) / duration,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else None,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--csrs", type=int, default=200)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--database-url", default=None, help="scratch database, defaults to a temporary SQLite file")
+    parser.add_argument("--shared-session", action="store_true", help="one session for all requests (baseline)")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    # Read by config.py, so it has to be set before the models are imported
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}"
+
+    import utils.db
+    if args.shared_session:
+        # The blueprints pick these up when they are imported below
+        utils.db.db_session = utils.db.get_session()
+        utils.db.remove_session = lambda exception=None: None
+
+    _seed(args.csrs, args.days)
+    app = _create_app()
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{'session':>8} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>8}")
+    for clients in args.clients:
+        row = run_level(base_url, clients, args.duration)
+        print(f"{'shared' if args.shared_session else 'request':>8} {row['clients']:>8} "
+              f"{row['requests_per_s']:>8.1f} {row['p50_ms'] or 0:>8.1f} {row['p95_ms'] or 0:>8.1f} {row['errors']:>8}")
+    server.shutdown()
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
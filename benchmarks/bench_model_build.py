@@ -0,0 +1,116 @@
+# Model build benchmark: legacy dense lpSum loops vs utils.model_builder
+#
+# Usage: python -m benchmarks.bench_model_build [--sizes 40 500 2000] [--skip-legacy-above N]
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pulp
+
+from utils.model_builder import build_coverage_matrix, build_demand_matrix, build_model, leave_shift_index, shift_type_indices
+
+NUM_DAYS = 31
+
+
+# Shift definitions shaped like the production table: one leave shift and 8-hour shifts at every start period
+def make_shift_definitions():
+    shift_definitions = [SimpleNamespace(shift_def_id=1, name="0", type="Leave", periods=[0] * 24)]
+    for start in range(9):
+        periods = [1 if start <= t < start + 16 else 0 for t in range(24)]
+        shift_type = "Morning" if start < 3 else "Afternoon" if start < 6 else "Night"
+        shift_definitions.append(SimpleNamespace(shift_def_id=start + 2, name=str(start + 1), type=shift_type, periods=periods))
+    return shift_definitions
+
+
+def make_constraints():
+    return SimpleNamespace(exact_days_off_per_month=8, max_days_off_in_period=7,
+                           max_night_shifts=1, max_night_shifts_in_period=7,
+                           max_afternoon_shifts=2, max_afternoon_shifts_in_period=7)
+
+
+# Demand scaled to the headcount so that every size produces a comparable model
+def make_demand(num_csrs, seed=0):
+    rng = np.random.default_rng(seed)
+    peak = max(1, int(num_csrs * 0.6))
+    return {day: rng.integers(peak // 2, peak + 1, size=24).tolist() for day in range(1, NUM_DAYS + 1)}
+
+
+# The original schedule2.main construction, kept verbatim for comparison
+def legacy_build(shift_definitions, demand, num_csrs, constraints):
+    shifts = {sd.shift_def_id: sd.periods for sd in shift_definitions}
+    prob = pulp.LpProblem("CSR_Scheduling", pulp.LpMinimize)
+    shift_id_to_index = {shift_def.shift_def_id: idx for idx, shift_def in enumerate(shift_definitions)}
+    x = [[[pulp.LpVariable(f"x_{i}_{j}_{k}", cat='Binary') for k in range(31)] for j in shift_id_to_index.values()] for i in range(num_csrs)]
+    lack = [[pulp.LpVariable(f"lack_{k}_{t}", lowBound=0, cat='Continuous') for t in range(24)] for k in range(31)]
+    prob += pulp.lpSum([lack[k][t] for k in range(31) for t in range(24)])
+    for k in range(31):
+        for t in range(24):
+            prob += lack[k][t] >= demand[k+1][t] - pulp.lpSum([x[i][shift_id_to_index[j]][k] * shifts[j][t] for i in range(num_csrs) for j in shifts.keys()])
+    for i in range(num_csrs):
+        for k in range(31):
+            prob += pulp.lpSum([x[i][j][k] for j in shift_id_to_index.values()]) == 1
+    leave_shift_index = shift_id_to_index[min(shift_id_to_index.keys())]
+    for i in range(num_csrs):
+        prob += pulp.lpSum([x[i][leave_shift_index][k] for k in range(31)]) == constraints.exact_days_off_per_month
+    afternoon_shifts_indices = [shift_id_to_index[s.shift_def_id] for s in shift_definitions if s.type == "Afternoon"]
+    night_shifts_indices = [shift_id_to_index[s.shift_def_id] for s in shift_definitions if s.type == "Night"]
+    num_days = 31
+    for i in range(num_csrs):
+        for k in range(num_days - constraints.max_night_shifts_in_period + 1):
+            prob += pulp.lpSum([x[i][j][k + m] for j in night_shifts_indices for m in range(constraints.max_night_shifts_in_period) if k + m < num_days]) <= constraints.max_night_shifts
+    for i in range(num_csrs):
+        for k in range(num_days - constraints.max_afternoon_shifts_in_period + 1):
+            prob += pulp.lpSum([x[i][j][k + m] for j in afternoon_shifts_indices for m in range(constraints.max_afternoon_shifts_in_period) if k + m < num_days]) <= constraints.max_afternoon_shifts
+    for i in range(num_csrs):
+        for k in range(num_days - constraints.max_days_off_in_period + 1):
+            prob += pulp.lpSum([x[i][j][k + m] for j in shift_id_to_index.values() if j != leave_shift_index for m in range(constraints.max_days_off_in_period) if k + m < num_days]) <= (constraints.max_days_off_in_period - 1)
+    return prob
+
+
+def sparse_build(shift_definitions, demand, num_csrs, constraints):
+    type_indices = shift_type_indices(shift_definitions)
+    prob, _, _ = build_model(build_coverage_matrix(shift_definitions), build_demand_matrix(demand, NUM_DAYS), num_csrs,
+                             leave_shift_index(shift_definitions), type_indices.get("Night", []),
+                             type_indices.get("Afternoon", []), constraints)
+    return prob
+
+
+def nonzeros(prob):
+    return sum(len(c) for c in prob.constraints.values())
+
+
+def timed(build, *args):
+    start = time.perf_counter()
+    prob = build(*args)
+    return time.perf_counter() - start, prob
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[40, 500, 2000])
+    parser.add_argument("--skip-legacy-above", type=int, default=None,
+                        help="only time the new builder for headcounts above this value")
+    args = parser.parse_args()
+
+    shift_definitions = make_shift_definitions()
+    constraints = make_constraints()
+
+    print(f"{'CSRs':>6} {'legacy (s)':>11} {'legacy nnz':>11} {'sparse (s)':>11} {'sparse nnz':>11} {'speedup':>8}")
+    for num_csrs in args.sizes:
+        demand = make_demand(num_csrs)
+        sparse_time, prob = timed(sparse_build, shift_definitions, demand, num_csrs, constraints)
+        sparse_nnz = nonzeros(prob)
+        del prob
+        if args.skip_legacy_above is not None and num_csrs > args.skip_legacy_above:
+            print(f"{num_csrs:>6} {'-':>11} {'-':>11} {sparse_time:>11.2f} {sparse_nnz:>11} {'-':>8}")
+            continue
+        legacy_time, prob = timed(legacy_build, shift_definitions, demand, num_csrs, constraints)
+        legacy_nnz = nonzeros(prob)
+        del prob
+        print(f"{num_csrs:>6} {legacy_time:>11.2f} {legacy_nnz:>11} {sparse_time:>11.2f} {sparse_nnz:>11} "
+              f"{legacy_time / sparse_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
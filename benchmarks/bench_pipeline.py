@@ -0,0 +1,253 @@
+# End-to-end benchmark of the scheduling pipeline on seeded synthetic scenarios.
+# Every scenario runs in a fresh process and reports the DB load, model build, solve,
+# extraction and output write times together with the peak memory of that process.
+# Results are saved as JSON under benchmarks/results/ so runs can be compared across commits.
+#
+# Usage: python -m benchmarks.bench_pipeline [--sizes 40 200 1000 5000] [--days 28 31]
+#            [--mode auto|individual|aggregated] [--time-limit 60] [--database-url URL] [--compare OLD.json]
+#
+# --database-url seeds and reads the scenario through the ORM models on that database, e.g.
+# "sqlite://" for an in-memory database. Use a scratch database: the scheduling tables are
+# emptied before every scenario.
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.scenarios import generate_scenario, horizon_constraints
+from config import AGGREGATE_ABOVE_CSRS, CSR_ROLE
+from utils.aggregated import solve_two_stage
+from utils.extraction import extract_solution
+from utils.model_builder import build_coverage_matrix, build_model, leave_shift_index, shift_type_indices
+from utils.profiling import peak_rss_mb
+from utils.solvers import BACKENDS, SolverSettings, solve
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PHASES = ("load", "build", "solve", "extract", "write")
+
+
+# Write the scenario into the database, replacing what the scheduling tables hold
+def _seed_database(session, scenario):
+    from sqlalchemy import delete, insert
+    from models import Constraint, Demand, Request, ScheduleRun, Shift, ShiftDefinition, User
+
+    for model in (Shift, Request, ScheduleRun, Demand, Constraint, ShiftDefinition, User):
+        session.execute(delete(model))
+    session.execute(insert(User), [
+        {'user_id': csr_id, 'name': f"Agent {csr_id}", 'email': f"agent{csr_id}@example.com", 'role': CSR_ROLE}
+        for csr_id in range(1, scenario.num_csrs + 1)
+    ])
+    session.execute(insert(ShiftDefinition), [
+        {'shift_def_id': sd.shift_def_id, 'type': sd.type, 'name': sd.name, 'periods': sd.periods}
+        for sd in scenario.shift_definitions
+    ])
+    session.execute(insert(Demand), [
+        {'date': scenario.start_date + timedelta(days=k), 'demand': row.tolist()}
+        for k, row in enumerate(scenario.demand)
+    ])
+    constraint_values = {key: value for key, value in vars(scenario.constraints).items() if key != 'id'}
+    session.execute(insert(Constraint), [constraint_values])
+    session.commit()
+
+
+# The inputs of the solver as schedule2.main reads them
+def _load_from_database(session, num_days):
+    from sqlalchemy import func
+    from models import Constraint, Demand, ShiftDefinition, User
+    from utils.demand_store import get_demand_table
+
+    csr_ids = [user_id for user_id, in
+               session.query(User.user_id).filter(User.role == CSR_ROLE).order_by(User.user_id).all()]
+    shift_definitions = session.query(ShiftDefinition).order_by(ShiftDefinition.shift_def_id).all()
+    constraints = session.query(Constraint).first()
+    start_date = session.query(func.min(Demand.date)).scalar()
+    end_date = start_date + timedelta(days=num_days - 1)
+    demand = get_demand_table(session, fresh=True, start=start_date, end=end_date).matrix(start_date, num_days)
+    return csr_ids, shift_definitions, demand, constraints
+
+
+def run_scenario(num_csrs, num_days, seed, mode, settings, database_url=None):
+    scenario = generate_scenario(num_csrs, num_days, seed)
+    times = dict.fromkeys(PHASES)
+    session = None
+
+    if database_url is not None:
+        # The scenario process was started with DATABASE_URL set to database_url, so init_db
+        # creates the tables on that database
+        from models import init_db
+        from utils.db import get_session
+
+        init_db()
+        session = get_session()
+        _seed_database(session, scenario)
+        start = time.perf_counter()
+        csr_ids, shift_definitions, demand, constraints = _load_from_database(session, num_days)
+        times['load'] = time.perf_counter() - start
+    else:
+        shift_definitions, demand, constraints = scenario.shift_definitions, scenario.demand, scenario.constraints
+        csr_ids = list(range(1, num_csrs + 1))
+    # The whole horizon is one model, so its days off are those of every month it covers
+    constraints = horizon_constraints(constraints, scenario.start_date, num_days)
+    if mode == "auto":
+        mode = "aggregated" if num_csrs > AGGREGATE_ABOVE_CSRS else "individual"
+
+    coverage = build_coverage_matrix(shift_definitions)
+    type_indices = shift_type_indices(shift_definitions)
+    night_indices = type_indices.get("Night", [])
+    afternoon_indices = type_indices.get("Afternoon", [])
+    leave_index = leave_shift_index(shift_definitions)
+
+    if mode == "aggregated":
+        # The two stages build their own models, so build time is part of the solve time
+        start = time.perf_counter()
+        result, schedule, lack_values = solve_two_stage(coverage, demand, num_csrs, leave_index, night_indices,
+                                                        afternoon_indices, constraints, settings)
+        times['solve'] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        prob, x, lack = build_model(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices,
+                                    constraints)
+        times['build'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = solve(prob, settings)
+        times['solve'] = time.perf_counter() - start
+
+        schedule = lack_values = None
+        if result.has_solution:
+            start = time.perf_counter()
+            schedule, lack_values = extract_solution(x, lack)
+            times['extract'] = time.perf_counter() - start
+        del prob, x, lack
+
+    if schedule is not None:
+        start = time.perf_counter()
+        names = np.array([sd.name for sd in shift_definitions], dtype=object)[schedule]
+        schedule_df = pd.DataFrame(names, columns=[f'Day {k}' for k in range(1, num_days + 1)],
+                                   index=[f'CSR {csr_id}' for csr_id in csr_ids])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            schedule_df.to_csv(os.path.join(tmp_dir, 'csr_schedule.csv'), index=True)
+        if session is not None:
+            from utils.persistence import save_run
+            save_run(session, schedule, csr_ids, [sd.shift_def_id for sd in shift_definitions],
+                     scenario.start_date, result, mode, total_lack=float(lack_values.sum()))
+        times['write'] = time.perf_counter() - start
+
+    if session is not None:
+        session.close()
+
+    return {
+        'num_csrs': num_csrs,
+        'num_days': num_days,
+        'seed': seed,
+        'mode': mode,
+        'status': result.status,
+        'objective': result.objective,
+        'gap': result.gap,
+        'total_lack': float(lack_values.sum()) if lack_values is not None else None,
+        'model_size': result.model_size,
+        'times': times,
+        'peak_rss_mb': peak_rss_mb(),
+        'solver_peak_rss_mb': peak_rss_mb(children=True),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format_time(value):
+    return f"{value:>8.2f}" if value is not None else f"{'-':>8}"
+
+
+def _header(compare=False):
+    header = f"{'CSRs':>6} {'days':>5} {'status':>10} " + " ".join(f"{phase:>8}" for phase in PHASES)
+    return header + f" {'peak MB':>8} {'lack':>8}" + (f" {'vs prev':>8}" if compare else "")
+
+
+# One table row; with `previous` the change of the total time against the same scenario
+def _row(row, previous=None):
+    line = (f"{row['num_csrs']:>6} {row['num_days']:>5} {row['status']:>10} "
+            + " ".join(_format_time(row['times'][phase]) for phase in PHASES)
+            + f" {row['peak_rss_mb']:>8.0f} "
+            + (f"{row['total_lack']:>8.0f}" if row['total_lack'] is not None else f"{'-':>8}"))
+    if previous is not None:
+        match = previous.get((row['num_csrs'], row['num_days'], row['seed'], row['mode']))
+        old = sum(t for t in match['times'].values() if t) if match else 0
+        new = sum(t for t in row['times'].values() if t)
+        line += f" {(new - old) / old:>+8.1%}" if old else f" {'-':>8}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[40, 200, 1000, 5000])
+    parser.add_argument("--days", type=int, nargs="+", default=[28, 31], help="horizon lengths")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=["auto", "individual", "aggregated"], default="auto")
+    parser.add_argument("--backend", choices=BACKENDS, default="cbc")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--time-limit", type=float, default=60, help="seconds per solve")
+    parser.add_argument("--database-url", default=None, help="scratch database to seed and load the scenarios from")
+    parser.add_argument("--output", default=None, help="results file, defaults to benchmarks/results/<time>_<commit>.json")
+    parser.add_argument("--compare", default=None, help="previous results file to compare the total times against")
+    args = parser.parse_args()
+
+    settings = SolverSettings(backend=args.backend, threads=args.threads, time_limit=args.time_limit,
+                              seed=args.seed)
+    if args.database_url is not None:
+        # Read by config.py in the scenario processes
+        os.environ["DATABASE_URL"] = args.database_url
+
+    results = []
+    print(_header())
+    for num_csrs in args.sizes:
+        for num_days in args.days:
+            # A fresh process per scenario, so the peak memory is that of the scenario alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                row = executor.submit(run_scenario, num_csrs, num_days, args.seed, args.mode, settings,
+                                      args.database_url).result()
+            results.append(row)
+            print(_row(row))
+
+    commit = _git_commit()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'settings': vars(args),
+            'results': results,
+        }, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nCompared with {args.compare} (commit {previous.get('commit')}):")
+        previous = {(r['num_csrs'], r['num_days'], r['seed'], r['mode']): r for r in previous['results']}
+        print(_header(compare=True))
+        for row in results:
+            print(_row(row, previous))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# Benchmark of the shift and request range endpoints on a large table, with and without the
+# shifts (csr_id, date) / (date) and requests (requested_date, status) / (csr_id) indexes.
+# The shifts table is filled with --runs schedule versions of --csrs CSRs over --days days
+# (3 x 2000 x 365 = 2.19M rows by default) and every endpoint is called --repeat times.
+#
+# Usage: python -m benchmarks.bench_queries [--csrs 2000] [--days 365] [--runs 3]
+#            [--requests 200000] [--repeat 20] [--database-url URL]
+#
+# --database-url must be a scratch database: its shifts, requests and users are replaced.
+# The default is a temporary SQLite file.
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+INDEXES = ("ix_shifts_csr_id_date", "ix_shifts_date", "ix_requests_requested_date_status", "ix_requests_csr_id")
+INSERT_BATCH_SIZE = 50000
+START_DATE = date(2024, 1, 1)
+
+
+def _seed(session, num_csrs, num_days, num_runs, num_requests):
+    from sqlalchemy import insert
+    from models import Request, ScheduleRun, Shift, ShiftDefinition, User
+
+    rng = np.random.default_rng(0)
+    for model in (Shift, Request, ScheduleRun, User, ShiftDefinition):
+        session.query(model).delete()
+    session.execute(insert(User), [{'user_id': i, 'name': f"CSR {i}", 'role': "CSR"} for i in range(1, num_csrs + 1)])
+    session.execute(insert(ShiftDefinition), [{'shift_def_id': j, 'type': "Morning", 'name': str(j), 'periods': [1] * 24}
+                                              for j in range(1, 11)])
+    for run_id in range(1, num_runs + 1):
+        session.add(ScheduleRun(run_id=run_id, status="FEASIBLE", start_date=START_DATE, num_days=num_days,
+                                num_csrs=num_csrs))
+    session.flush()
+
+    dates = [START_DATE + timedelta(days=k) for k in range(num_days)]
+    for run_id in range(1, num_runs + 1):
+        shift_ids = rng.integers(1, 11, size=num_csrs * num_days).tolist()
+        # Day by day, the order a rolling horizon writes them, so one CSR's rows are spread out
+        rows = [{'csr_id': i, 'shift_def_id': shift_ids[k * num_csrs + i - 1], 'date': dates[k], 'run_id': run_id}
+                for k in range(num_days) for i in range(1, num_csrs + 1)]
+        for n in range(0, len(rows), INSERT_BATCH_SIZE):
+            session.execute(insert(Shift), rows[n:n + INSERT_BATCH_SIZE])
+
+    statuses = np.array(["pending", "approved", "rejected"])[rng.integers(0, 3, size=num_requests)].tolist()
+    request_days = rng.integers(0, num_days, size=num_requests).tolist()
+    csr_ids = rng.integers(1, num_csrs + 1, size=num_requests).tolist()
+    rows = [{'csr_id': csr_ids[n], 'shift_def_id': 1, 'status': statuses[n], 'requested_date': dates[request_days[n]]}
+            for n in range(num_requests)]
+    for n in range(0, len(rows), INSERT_BATCH_SIZE):
+        session.execute(insert(Request), rows[n:n + INSERT_BATCH_SIZE])
+    session.commit()
+
+
+def _set_indexes(engine, enabled):
+    from sqlalchemy import text
+    from sqlalchemy.schema import CreateIndex
+    from models import Base
+
+    indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    with engine.begin() as connection:
+        for name in INDEXES:
+            if enabled:
+                connection.execute(CreateIndex(indexes[name], if_not_exists=True))
+            else:
+                connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if engine.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+
+
+# Median milliseconds and rows of `repeat` calls of every endpoint
+def _time_endpoints(client, num_csrs, num_days, repeat):
+    rng = np.random.default_rng(1)
+    last_month = START_DATE + timedelta(days=num_days - 1)
+    endpoints = {
+        "CSR, one month": lambda: f"/shifts/csr/{rng.integers(1, num_csrs + 1)}?run_id=2"
+                                  f"&start_date={START_DATE}&end_date={START_DATE + timedelta(days=30)}",
+        "CSR, whole run": lambda: f"/shifts/csr/{rng.integers(1, num_csrs + 1)}?run_id=2",
+        "one date": lambda: f"/shifts/date/{START_DATE + timedelta(days=int(rng.integers(num_days)))}?run_id=2",
+        "pending, month": lambda: f"/requests/pending?month={last_month:%Y-%m}",
+    }
+    results = {}
+    for name, url in endpoints.items():
+        times = []
+        rows = 0
+        for _ in range(repeat):
+            path = url()
+            start = time.perf_counter()
+            response = client.get(path)
+            times.append(time.perf_counter() - start)
+            assert response.status_code == 200, (path, response.status_code)
+            rows = len(response.get_json())
+        results[name] = (float(np.median(times)) * 1000, rows)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csrs", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--runs", type=int, default=3, help="schedule versions in the shifts table")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20, help="calls per endpoint")
+    parser.add_argument("--database-url", default=None, help="scratch database, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    # Read by config.py, so it has to be set before the models are imported
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}"
+
+    from flask import Flask
+    from models import init_db
+    from routes.requests import requests_bp
+    from routes.shifts import shifts_bp
+    from utils.db import get_engine, get_session
+
+    init_db()
+    session = get_session()
+    start = time.perf_counter()
+    _seed(session, args.csrs, args.days, args.runs, args.requests)
+    session.close()
+    print(f"Seeded {args.csrs * args.days * args.runs} shifts and {args.requests} requests "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    app = Flask(__name__)
+    app.register_blueprint(shifts_bp)
+    app.register_blueprint(requests_bp)
+    client = app.test_client()
+
+    timings = {}
+    for enabled in (False, True):
+        _set_indexes(get_engine(), enabled)
+        timings[enabled] = _time_endpoints(client, args.csrs, args.days, args.repeat)
+
+    print(f"{'endpoint':<16} {'rows':>6} {'no index ms':>12} {'index ms':>10} {'speedup':>8}")
+    for name, (without, rows) in timings[False].items():
+        with_index = timings[True][name][0]
+        print(f"{name:<16} {rows:>6} {without:>12.2f} {with_index:>10.2f} {without / with_index:>7.0f}x")
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
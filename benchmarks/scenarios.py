@@ -0,0 +1,79 @@
+# Seeded synthetic scenarios for the scheduling pipeline: shift definitions, demand curves
+# and a constraint set that the given headcount can roughly cover.
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.model_builder import NUM_PERIODS
+
+
+# One leave shift plus `num_shifts` working shifts of 6-9 hours with random start periods.
+# The type follows the start period the same way the production definitions do.
+def generate_shift_definitions(rng, num_shifts=None):
+    num_shifts = num_shifts or int(rng.integers(8, 15))
+    shift_definitions = [SimpleNamespace(shift_def_id=1, name="0", type="Leave", periods=[0] * NUM_PERIODS)]
+    starts = np.sort(rng.integers(0, NUM_PERIODS - 12, size=num_shifts))
+    for n, start in enumerate(starts):
+        length = int(rng.integers(12, 19))
+        periods = [1 if start <= t < start + length else 0 for t in range(NUM_PERIODS)]
+        shift_type = "Morning" if start < 4 else "Afternoon" if start < 8 else "Night"
+        shift_definitions.append(SimpleNamespace(shift_def_id=n + 2, name=str(n + 1), type=shift_type, periods=periods))
+    return shift_definitions
+
+
+# 8 days off per month like the production constraints, the window rules are drawn at random
+def generate_constraints(rng):
+    window = int(rng.integers(6, 8))
+    return SimpleNamespace(
+        id=1,
+        exact_days_off_per_month=8,
+        max_days_off_in_period=window,
+        max_night_shifts=int(rng.integers(1, 3)), max_night_shifts_in_period=7,
+        max_afternoon_shifts=int(rng.integers(2, 4)), max_afternoon_shifts_in_period=7,
+    )
+
+
+# (days x periods) demand with a morning and an afternoon peak, quieter weekends and noise,
+# scaled so that the average demand is `utilization` of what the team can staff
+def generate_demand(rng, num_csrs, num_days, shift_definitions, constraints, start_date, utilization=0.95):
+    # Imported here, utils.rolling reads config, which the benchmarks point at their database first
+    from utils.rolling import days_off_in_horizon
+
+    lengths = [sum(sd.periods) for sd in shift_definitions if sd.type != "Leave"]
+    days_off = days_off_in_horizon(constraints.exact_days_off_per_month, start_date, num_days)
+    working_fraction = 1 - days_off / num_days
+    capacity = num_csrs * working_fraction * np.mean(lengths) / NUM_PERIODS
+
+    t = np.arange(NUM_PERIODS)
+    profile = 0.6 + np.exp(-((t - 5) / 3.0) ** 2) + 0.8 * np.exp(-((t - 15) / 4.0) ** 2)
+    profile /= profile.mean()
+    weekday = np.array([1.1, 1.05, 1.0, 1.0, 1.05, 0.85, 0.75])
+    day_factor = weekday[[(start_date + timedelta(days=k)).weekday() for k in range(num_days)]]
+    day_factor /= day_factor.mean()
+
+    mean = utilization * capacity * np.outer(day_factor, profile)
+    noise = rng.normal(1.0, 0.08, size=mean.shape)
+    return np.maximum(np.rint(mean * noise), 0).astype(np.int64)
+
+
+# Everything schedule2.main reads from the database, generated from `seed`
+def generate_scenario(num_csrs, num_days, seed=0, start_date=date(2024, 1, 1)):
+    rng = np.random.default_rng([seed, num_csrs, num_days])
+    shift_definitions = generate_shift_definitions(rng)
+    constraints = generate_constraints(rng)
+    demand = generate_demand(rng, num_csrs, num_days, shift_definitions, constraints, start_date)
+    return SimpleNamespace(num_csrs=num_csrs, num_days=num_days, seed=seed, start_date=start_date,
+                           shift_definitions=shift_definitions, constraints=constraints, demand=demand)
+
+
+# The constraints with the days off of the whole horizon, for solving it as one model the way
+# schedule2 does when it does not roll the horizon. Works on the scenario and on the ORM row.
+def horizon_constraints(constraints, start_date, num_days):
+    from utils.decomposition import plain_constraints
+    from utils.rolling import days_off_in_horizon
+
+    days_off = days_off_in_horizon(constraints.exact_days_off_per_month, start_date, num_days)
+    constraints = plain_constraints(constraints) if hasattr(constraints, '__table__') else SimpleNamespace(**vars(constraints))
+    constraints.exact_days_off_per_month = days_off
+    return constraints
@@ -1,13 +1,19 @@
+import io
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.colors import LinearSegmentedColormap
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import ShiftDefinition
-from config import DATABASE_URL
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from utils.db import session_scope
+from utils.demand_store import get_demand_table
+from utils.evaluator import ScheduleEvaluator, covered_periods
+from utils.persistence import load_run_schedule
+from models import init_db
+from utility import SCHEDULE_CSV, load_runs, load_schedule_csv, load_shift_definitions
+
+# Create the missing tables and indexes, once per server process
+init_db()
 
 st.set_page_config(initial_sidebar_state="collapsed")
 
@@ -22,88 +28,205 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Set up the database connection
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
-
-# Fetch shift definitions from the database
-shift_definitions = session.query(ShiftDefinition).all()
-shifts = {str(sd.name): sd.periods for sd in shift_definitions}  # Ensure shift names are strings
-
-# Load the schedule data from the CSV file
-schedule_df = pd.read_csv('csr_schedule.csv', index_col=0)
+time_labels = [f'{hour:02}:{minute:02}' for hour in range(9, 21) for minute in (0, 30)]
+shift_columns = [f"{9 + i//2:02}:{(i%2)*30:02}-{9 + (i+1)//2:02}:{((i+1)%2)*30:02}" for i in range(24)]
+# Colours of the whole-team roster by shift type, the last one for days without a known shift
+type_colors = {"Morning": "gold", "Afternoon": "darkorange", "Night": "navy", "Leave": "lightgray"}
+unknown_color = "white"
+
+# Shift definitions as (shift_def_ids, names, types, (shifts x periods) periods), from the
+# cached rows of utility.py
+def shift_definition_arrays():
+    rows = load_shift_definitions()
+    return (np.array([shift_def_id for shift_def_id, _, _, _ in rows], dtype=np.int64),
+            [name for _, name, _, _ in rows],
+            [shift_type for _, _, shift_type, _ in rows],
+            np.array([periods for _, _, _, periods in rows], dtype=np.uint8).reshape(len(rows), len(time_labels)))
+
+# Row of every shift_def_id in the shift definition arrays, unknown ids and -1 map to the
+# extra last row, so a (csrs x days) matrix of ids is turned into rows in one indexing step
+def shift_rows(shift_def_ids, matrix):
+    lookup = np.full(max(int(shift_def_ids.max(initial=0)), int(matrix.max(initial=0))) + 2, len(shift_def_ids))
+    lookup[shift_def_ids] = np.arange(len(shift_def_ids))
+    return lookup[matrix]
+
+# Schedule of one version as (row labels, day labels, start date, (csrs x days) rows of the
+# shift definitions). version is a run_id, or the modification time of csr_schedule.csv to
+# read that file, so a new file is a new key.
+@st.cache_data(max_entries=8)
+def load_schedule(version):
+    shift_def_ids, names, _, _ = shift_definition_arrays()
+    if isinstance(version, float):
+        schedule_df = load_schedule_csv()
+        id_of = pd.Series(shift_def_ids, index=names)
+        id_of = id_of[~id_of.index.duplicated()]
+        matrix = (id_of.reindex(schedule_df.to_numpy().astype(str).ravel()).fillna(-1).to_numpy(dtype=np.int64)
+                  .reshape(schedule_df.shape))
+        return schedule_df.index.astype(str).tolist(), schedule_df.columns.tolist(), None, shift_rows(shift_def_ids, matrix)
+    with session_scope() as session:
+        csr_ids, dates, matrix = load_run_schedule(session, version)
+    start_date = dates[0] if dates else None
+    return ([f"CSR {csr_id}" for csr_id in csr_ids], [day.isoformat() for day in dates], start_date,
+            shift_rows(shift_def_ids, matrix))
+
+# Periods covered per definition row, with an all-zero row for unknown shifts
+def coverage_rows():
+    _, _, _, periods = shift_definition_arrays()
+    return np.vstack([periods, np.zeros((1, periods.shape[1]), dtype=periods.dtype)]).astype(np.int64)
+
+# Staffing of the whole team against the demand of the run's dates, per day and period:
+# (covered, lack, overstaffing), lack and overstaffing None without a start date (CSV)
+@st.cache_data(max_entries=8)
+def team_staffing(version):
+    _, days, start_date, rows = load_schedule(version)
+    coverage = coverage_rows()
+    if start_date is None:
+        return covered_periods(rows, coverage), None, None
+    with session_scope() as session:
+        demand = get_demand_table(session).matrix(start_date, len(days))
+    evaluator = ScheduleEvaluator(rows, coverage, demand)
+    return evaluator.covered, evaluator.lack, evaluator.overstaffing
+
+def _png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+def _label_axes(ax, x_labels, y_labels, max_ticks=40):
+    x_step = max(1, len(x_labels) // max_ticks)
+    y_step = max(1, len(y_labels) // max_ticks)
+    ax.set_xticks(range(0, len(x_labels), x_step), x_labels[::x_step], rotation=45, ha="right")
+    ax.set_yticks(range(0, len(y_labels), y_step), y_labels[::y_step])
+
+# Worked periods of one CSR per day, as a PNG
+@st.cache_data(max_entries=64)
+def csr_heatmap(version, row):
+    labels, days, _, rows = load_schedule(version)
+    worked = coverage_rows()[rows[row]]
+    fig = Figure(figsize=(15, min(max(4, 0.3 * len(days)), 40)))
+    ax = fig.subplots()
+    ax.imshow(worked, cmap=ListedColormap(["gray", "green"]), vmin=0, vmax=1, aspect="auto", interpolation="nearest")
+    ax.set_xticks(np.arange(-0.5, worked.shape[1]), minor=True)
+    ax.set_yticks(np.arange(-0.5, worked.shape[0]), minor=True)
+    ax.grid(which="minor", color="white", linewidth=0.5)
+    ax.tick_params(which="minor", length=0)
+    _label_axes(ax, time_labels, days)
+    ax.set_title(f'Shift Schedule for {labels[row]}')
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Day')
+    return _png(fig)
+
+# Whole team: shift type of every CSR and day, staffed periods and lack per day, as PNGs
+@st.cache_data(max_entries=8)
+def team_figures(version):
+    labels, days, _, rows = load_schedule(version)
+    _, _, types, _ = shift_definition_arrays()
+    covered, lack, _ = team_staffing(version)
+    type_names = list(type_colors)
+    type_of_row = np.array([type_names.index(t) if t in type_colors else len(type_names) for t in types]
+                           + [len(type_names)])
+
+    roster = Figure(figsize=(15, min(max(4, 0.02 * len(labels)), 30)))
+    ax = roster.subplots()
+    ax.imshow(type_of_row[rows], cmap=ListedColormap(list(type_colors.values()) + [unknown_color]),
+              vmin=0, vmax=len(type_names), aspect="auto", interpolation="nearest")
+    _label_axes(ax, days, labels)
+    ax.set_title(f"Shift type per CSR and day ({', '.join(f'{t}: {c}' for t, c in type_colors.items())})")
+
+    figures = [_png(roster)]
+    for values, title, cmap in ((covered, "CSRs working per period", "Greens"), (lack, "Lack per period", "Reds")):
+        if values is None:
+            continue
+        fig = Figure(figsize=(15, min(max(4, 0.3 * len(days)), 40)))
+        ax = fig.subplots()
+        image = ax.imshow(values, cmap=cmap, aspect="auto", interpolation="nearest")
+        fig.colorbar(image, ax=ax)
+        _label_axes(ax, time_labels, days)
+        ax.set_title(title)
+        figures.append(_png(fig))
+    return figures
+
+# The schedule with shift names, as CSV
+@st.cache_data(max_entries=8)
+def schedule_csv(version):
+    labels, days, _, rows = load_schedule(version)
+    _, names, _, _ = shift_definition_arrays()
+    names = np.array(names + [""], dtype=object)
+    return pd.DataFrame(names[rows], index=labels, columns=days).to_csv().encode('utf-8')
 
 # Set up the Streamlit app
 st.title("CSR Schedule Viewer")
 
-# Create a selectbox for selecting a CSR with an initial empty option
-csr_list = [""] + schedule_df.index.tolist()
-selected_csr = st.selectbox("Select a CSR:", csr_list)
-
-if selected_csr:
-    # Display the schedule for the selected CSR in a table format
-    st.subheader(f"Schedule for {selected_csr}")
-    st.dataframe(schedule_df.loc[selected_csr].to_frame().T)
-
-    # Function to generate a visual representation of the shifts
-    def generate_shift_heatmap(csr_schedule):
-        # Create a DataFrame to hold the shift schedule
-        days = csr_schedule.index.tolist()
-        heatmap_data = []
-
-        for day in days:
-            shift_name = str(csr_schedule[day])  # Convert to string to ensure correct lookup
-            if shift_name not in shifts:
-                st.error(f"Shift Name {shift_name} not found in shifts dictionary")
-                return
-            shift_pattern = shifts[shift_name]
-            heatmap_data.append(shift_pattern)
-
-        time_labels = [f'{hour:02}:{minute:02}' for hour in range(9, 21) for minute in (0, 30)]
-        heatmap_df = pd.DataFrame(heatmap_data, index=days, columns=time_labels)
-
-        # Create a custom colormap
-        cmap = LinearSegmentedColormap.from_list("custom_cmap", ["gray", "green"], N=2)
-
-        plt.figure(figsize=(15, 10))
-        sns.heatmap(heatmap_df, cmap=cmap, cbar=False, linewidths=.5)
-        plt.title(f'Shift Schedule for {selected_csr}')
-        plt.xlabel('Time')
-        plt.ylabel('Day')
-        plt.xticks(rotation=45)
-        plt.yticks(rotation=0)
-        st.pyplot(plt)
-
-    # Display the shift schedule in a heatmap
-    generate_shift_heatmap(schedule_df.loc[selected_csr])
+# Schedule versions: the stored runs, then csr_schedule.csv when it exists
+runs = load_runs()
+versions = list(runs)
+if os.path.exists(SCHEDULE_CSV):
+    versions.append(os.path.getmtime(SCHEDULE_CSV))
+if not versions:
+    st.info("There is no schedule yet.")
+    st.stop()
+
+version_col, reload_col = st.columns([6, 1])
+with version_col:
+    version = st.selectbox("Schedule version:", versions,
+                           format_func=lambda version: runs.get(version, f"Last generated ({SCHEDULE_CSV})"))
+with reload_col:
+    if st.button("Reload"):
+        # Shift overrides change a stored version in place
+        st.cache_data.clear()
+        st.rerun()
+
+labels, days, start_date, rows = load_schedule(version)
+whole_team = st.toggle("Whole team", value=False)
+
+if whole_team:
+    covered, lack, overstaffing = team_staffing(version)
+    st.subheader(f"Whole team ({len(labels)} CSRs, {len(days)} days)")
+    if lack is not None:
+        lack_col, over_col, days_col = st.columns(3)
+        lack_col.metric("Total lack", f"{int(lack.sum())}")
+        over_col.metric("Overstaffed periods", f"{int(overstaffing.sum())}")
+        days_col.metric("Days with lack", f"{int((lack.sum(axis=1) > 0).sum())} of {len(days)}")
+    for figure in team_figures(version):
+        st.image(figure)
+else:
+    # Create a selectbox for selecting a CSR with an initial empty option
+    selected_csr = st.selectbox("Select a CSR:", [""] + labels)
+    if selected_csr:
+        row = labels.index(selected_csr)
+        _, names, _, _ = shift_definition_arrays()
+        names = np.array(names + ["?"], dtype=object)
+
+        # Display the schedule for the selected CSR in a table format
+        st.subheader(f"Schedule for {selected_csr}")
+        st.dataframe(pd.DataFrame([names[rows[row]]], index=[selected_csr], columns=days))
+        unknown = int((rows[row] == len(names) - 1).sum())
+        if unknown:
+            st.error(f"{unknown} days have a shift that is not in the shift definitions")
+
+        # Display the shift schedule in a heatmap
+        st.image(csr_heatmap(version, row))
 
 # Option to download the schedule as a CSV file
-csv = schedule_df.to_csv().encode('utf-8')
 st.download_button(
     label="Download full schedule as CSV",
-    data=csv,
+    data=schedule_csv(version),
     file_name='csr_schedule.csv',
     mime='text/csv',
 )
 
 # Shift Definitions Table at the end of the page
-shift_columns = ["Shift Name"] + [f"{9 + i//2:02}:{(i%2)*30:02}-{9 + (i+1)//2:02}:{((i+1)%2)*30:02}" for i in range(24)]
-shift_data = []
-for shift_name, periods in shifts.items():
-    shift_data.append([shift_name] + periods)
-
-shift_definitions_df = pd.DataFrame(shift_data, columns=shift_columns)
-
-# Function to apply custom styles and hide values
-def color_work_periods(val):
-    if val == 1:
-        return 'background-color: green; color: transparent'
-    else:
-        return 'background-color: transparent; color: transparent'
-
-# Apply styles to the DataFrame using Styler
-styled_shift_definitions_df = shift_definitions_df.style.map(color_work_periods, subset=shift_columns[1:])
+_, names, _, periods = shift_definition_arrays()
+shift_definitions_df = pd.DataFrame(periods, columns=shift_columns)
+shift_definitions_df.insert(0, "Shift Name", names)
+
+# Green for worked periods with the values hidden, styled for the whole table at once
+def color_work_periods(df):
+    return pd.DataFrame(np.where(df.to_numpy() == 1, 'background-color: green; color: transparent',
+                                 'background-color: transparent; color: transparent'),
+                        index=df.index, columns=df.columns)
+
+styled_shift_definitions_df = shift_definitions_df.style.apply(color_work_periods, axis=None, subset=shift_columns)
 
 # Display the styled table at the end of the page
 st.markdown("### Shift Definitions Table")
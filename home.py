@@ -1,5 +1,9 @@
 import streamlit as st
-import pandas as pd
+from models import init_db
+from utility import load_latest_schedule, load_schedule_csv
+
+# Create the missing tables and indexes, once per server process
+init_db()
 
 # Home Page Content
 st.title("Welcome to the Scheduling App")
@@ -15,9 +19,17 @@ st.markdown("- **Demand Management:** Set and manage demand for shifts.")
 st.markdown("- **Constraint Management:** Edit constraints for shifts.")
 st.markdown("More features will be added soon!")
 
-# Load the CSR schedule from the CSV file
-schedule_df = pd.read_csv('csr_schedule.csv', index_col=0)
+# The latest stored schedule version, otherwise the CSR schedule from the CSV file written by
+# schedule2.py, parsed again only when the file changed
+schedule_df, version = load_latest_schedule()
+if schedule_df is None:
+    schedule_df = load_schedule_csv()
 
 # Display the CSR schedule at the bottom of the page
 st.markdown("### Current Shift Schedule for CSRs")
-st.dataframe(schedule_df)
+if version is not None:
+    st.caption(version)
+if schedule_df is None:
+    st.info("No schedule has been generated yet.")
+else:
+    st.dataframe(schedule_df)
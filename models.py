@@ -1,15 +1,45 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, JSON, ForeignKey
+from datetime import date, datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, JSON, ForeignKey, Text, Index, func
+from sqlalchemy import inspect, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn, CreateIndex
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.types import TypeDecorator
 
-# Load database URL from config
-from config import DATABASE_URL
+# Engine for the database in config.DATABASE_URL
+from utils.db import get_engine
 
 # Create an engine and base
-engine = create_engine(DATABASE_URL)
+engine = get_engine()
 Base = declarative_base()
 
+# List of integers: a native ARRAY(Integer) on PostgreSQL and a JSON array on other databases
+class IntegerArray(TypeDecorator):
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(ARRAY(Integer))
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        # Accept any sequence of integers, including NumPy arrays
+        return [int(v) for v in value] if value is not None else None
+
+# Date that also accepts ISO "YYYY-MM-DD" strings, which PostgreSQL casts itself but SQLite does not
+class IsoDate(TypeDecorator):
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+        if isinstance(value, datetime):
+            return value.date()
+        return value
+
 # Define the Users model
 class User(Base):
     __tablename__ = 'users'
@@ -17,6 +47,7 @@ class User(Base):
     name = Column(String)                        # Optional (defaults to nullable=True)
     email = Column(String)                       # Optional (defaults to nullable=True)
     role = Column(String)                        # Optional (defaults to nullable=True)
+    team = Column(String)                        # Team, site or queue, CSRs of different teams are scheduled separately
 
 # Define Shift Definitions model
 class ShiftDefinition(Base):
@@ -32,7 +63,32 @@ class Shift(Base):
     shift_id = Column(Integer, primary_key=True)
     csr_id = Column(Integer, ForeignKey('users.user_id'))
     shift_def_id = Column(Integer, ForeignKey('shift_definitions.shift_def_id'))
-    date = Column(Date)
+    date = Column(IsoDate)
+    run_id = Column(Integer, ForeignKey('schedule_runs.run_id'), index=True)  # Solver run that produced the shift
+
+# Schedule of a CSR over a date range, and all assignments on a date
+Index('ix_shifts_csr_id_date', Shift.csr_id, Shift.date)
+Index('ix_shifts_date', Shift.date)
+
+# Define the ScheduleRun model: one row per schedule2.main run, the run_id is the schedule version
+class ScheduleRun(Base):
+    __tablename__ = 'schedule_runs'
+    run_id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime)
+    mode = Column(String)            # "individual", "aggregated", "decomposed", "rolling" or "legacy"
+    status = Column(String)          # "OPTIMAL", "FEASIBLE", "INFEASIBLE" or "NOT_SOLVED"
+    result = Column(String)          # Result string returned by schedule2.main
+    objective = Column(Float)
+    best_bound = Column(Float)
+    gap = Column(Float)
+    total_lack = Column(Float)
+    start_date = Column(Date)        # Date of day 1 of the schedule
+    num_days = Column(Integer)
+    num_csrs = Column(Integer)
+    timings = Column(JSON)           # Seconds spent per phase, e.g. {"load": 0.1, "solve": 12.3}
+    stats = Column(JSON)             # Model size, solver statistics and peak memory of the run
+    params = Column(JSON)            # Solver settings of the run
+    input_key = Column(String, index=True)  # Solution cache key of the inputs
 
 # Define the Requests model
 class Request(Base):
@@ -41,9 +97,13 @@ class Request(Base):
     csr_id = Column(Integer, ForeignKey('users.user_id'))
     shift_def_id = Column(Integer, ForeignKey('shift_definitions.shift_def_id'))  # Requested shift definition
     status = Column(String)
-    requested_date = Column(Date)
+    requested_date = Column(IsoDate)
     notes = Column(String)
 
+# Requests of a date range by status, and the requests of a CSR
+Index('ix_requests_requested_date_status', Request.requested_date, Request.status)
+Index('ix_requests_csr_id', Request.csr_id)
+
 # Define the Constraint model
 class Constraint(Base):
     __tablename__ = 'constraints'
@@ -78,9 +138,81 @@ class Constraint(Base):
 class Demand(Base):
     __tablename__ = 'demands'
     id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False)
-    demand = Column(ARRAY(Integer), nullable=False)  # Array of 24 integers
+    date = Column(IsoDate, nullable=False)
+    demand = Column(IntegerArray, nullable=False)  # Array of 24 integers
+    team = Column(String)  # Team, site or queue the demand belongs to, None for demand shared by everyone
+
+# One demand row per date and team. The team goes through coalesce() because a unique index
+# treats NULLs as distinct, and the shared demand has no team.
+Index('uq_demands_date_team', Demand.date, func.coalesce(Demand.team, ''), unique=True)
+
+# Define the schedule generation Job model
+class Job(Base):
+    __tablename__ = 'jobs'
+    job_id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False)  # "queued", "running", "done" or "failed"
+    params = Column(JSON)                    # Arguments passed to schedule2.main
+    result = Column(String)                  # Result string returned by schedule2.main
+    error = Column(Text)                     # Traceback of a failed job
+    submitted_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+_initialized = False
+
+# Add the mapped columns missing from tables created by an older version of the models, which
+# create_all leaves alone. Added as nullable without a default, rows written before keep NULL.
+def _add_missing_columns():
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            added = Column(column.name, column.type, nullable=True)
+            definition = CreateColumn(added).compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+            print(f"Added column {table.name}.{column.name}")
+
+# Shifts stored before schedule versions existed have no run_id, which the run-scoped queries never
+# match. Gather them into one "legacy" run so they stay visible as a schedule version.
+def _adopt_legacy_shifts():
+    with engine.begin() as connection:
+        first, last, num_csrs = connection.execute(
+            select(func.min(Shift.date), func.max(Shift.date), func.count(Shift.csr_id.distinct()))
+            .where(Shift.run_id.is_(None))
+        ).one()
+        if first is None:
+            return
+        run_id = connection.execute(
+            insert(ScheduleRun).values(created_at=datetime.now(), mode="legacy", status="FEASIBLE",
+                                       start_date=first, num_days=(last - first).days + 1, num_csrs=num_csrs)
+        ).inserted_primary_key[0]
+        connection.execute(update(Shift).where(Shift.run_id.is_(None)).values(run_id=run_id))
+    print(f"Stored the shifts without a schedule version as version {run_id}")
 
+# Create the missing tables and indexes, once per process. Called by the entry points (app.py,
+# the Streamlit scripts, schedule2.py and the benchmarks) rather than on import, so the job and
+# solver worker processes that import the models do not run DDL.
+def init_db():
+    global _initialized
+    if _initialized:
+        return
+    Base.metadata.create_all(engine)
+    _add_missing_columns()
+    _adopt_legacy_shifts()
 
-# Create all tables
-Base.metadata.create_all(engine)
\ No newline at end of file
+    # create_all skips the indexes of tables that already exist, create the ones added since.
+    # IF NOT EXISTS rather than checkfirst, which cannot see expression indexes on SQLite.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as connection:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+            except IntegrityError as e:
+                print(f"Index {index.name} not created, remove the duplicate rows first: {e.orig}")
+    _initialized = True
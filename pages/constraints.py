@@ -1,18 +1,10 @@
 import streamlit as st
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Constraint
-from config import DATABASE_URL
-from utility import generate_schedule  # Import the utility function
+from models import Constraint, init_db
+from utils.db import session_scope
+from utility import generate_schedule, invalidate, load_constraints, schedule_month_input, show_schedule_jobs  # Import the utility functions
 
-# Set up the database connection
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
-
-# Function to load the constraint data from the database
-def load_constraints():
-    return session.query(Constraint).first()
+# Create the missing tables and indexes, once per server process
+init_db()
 
 # Function to initialize or get session state values
 def get_state_value(key, default_value):
@@ -20,9 +12,9 @@ def get_state_value(key, default_value):
         st.session_state[key] = default_value
     return st.session_state[key]
 
-# Load the original constraints
+# Load the original constraints, a dict of the column values (cached, see utility.py)
 if 'original_constraints' not in st.session_state:
-    st.session_state.original_constraints = load_constraints()
+    st.session_state.original_constraints = load_constraints() or {}
 
 # If the cancel button was pressed, reset values and rerun the script before rendering the inputs
 if st.session_state.get('cancel_pressed', False):
@@ -35,7 +27,7 @@ if st.session_state.get('cancel_pressed', False):
         "max_afternoon_shifts_in_period", "min_night_shifts", "max_night_shifts",
         "min_night_shifts_in_period", "max_night_shifts_in_period"
     ]:
-        st.session_state[field] = str(getattr(constraint, field, 0))
+        st.session_state[field] = str(constraint.get(field, 0))
     st.session_state.cancel_pressed = False
     st.rerun()
 
@@ -46,7 +38,7 @@ st.subheader("Edit the Constraints for Scheduling")
 # Display input fields for each constraint
 def create_input(label, key):
     constraint = st.session_state.original_constraints
-    default_value = getattr(constraint, key, 0)
+    default_value = constraint.get(key, 0)
     return st.text_input(label, value=get_state_value(key, str(default_value)), key=key)
 
 # General Days Off Constraints
@@ -84,31 +76,30 @@ save_button, cancel_button = st.columns([1, 9])  # Reduced the width of the canc
 with save_button:
     if st.button("Save"):
         try:
-            # Fetch the constraint from the database
-            constraint = session.query(Constraint).first()
-            if not constraint:
-                constraint = Constraint()
-                session.add(constraint)
-
-            # Update the constraint fields
-            for field in [
-                "min_days_off", "max_days_off", "min_days_off_in_period", "max_days_off_in_period",
-                "exact_days_off_per_month", "min_morning_shifts", "max_morning_shifts",
-                "min_morning_shifts_in_period", "max_morning_shifts_in_period",
-                "min_afternoon_shifts", "max_afternoon_shifts", "min_afternoon_shifts_in_period",
-                "max_afternoon_shifts_in_period", "min_night_shifts", "max_night_shifts",
-                "min_night_shifts_in_period", "max_night_shifts_in_period"
-            ]:
-                setattr(constraint, field, int(st.session_state[field]))
-
-            # Commit the changes to the database
-            session.commit()
-
-            # Refresh the constraint in the session
-            session.refresh(constraint)
+            with session_scope() as session:
+                # Fetch the constraint from the database
+                constraint = session.query(Constraint).first()
+                if not constraint:
+                    constraint = Constraint()
+                    session.add(constraint)
+
+                # Update the constraint fields
+                for field in [
+                    "min_days_off", "max_days_off", "min_days_off_in_period", "max_days_off_in_period",
+                    "exact_days_off_per_month", "min_morning_shifts", "max_morning_shifts",
+                    "min_morning_shifts_in_period", "max_morning_shifts_in_period",
+                    "min_afternoon_shifts", "max_afternoon_shifts", "min_afternoon_shifts_in_period",
+                    "max_afternoon_shifts_in_period", "min_night_shifts", "max_night_shifts",
+                    "min_night_shifts_in_period", "max_night_shifts_in_period"
+                ]:
+                    setattr(constraint, field, int(st.session_state[field]))
+
+                # Commit the changes to the database
+                session.commit()
 
             # Update the original constraints in the session state
-            st.session_state.original_constraints = constraint
+            invalidate('constraints')
+            st.session_state.original_constraints = load_constraints() or {}
         except Exception as e:
             st.error(f"An error occurred while saving changes: {e}")
         else:
@@ -121,7 +112,9 @@ with cancel_button:
 
 # Add the "Generate New Schedule" button
 st.markdown("---")
+start_date, num_days = schedule_month_input()
 if st.button("Generate New Schedule"):
-    generate_schedule()
+    generate_schedule(start_date, num_days)
+show_schedule_jobs()
 
 #good version
\ No newline at end of file
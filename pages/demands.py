@@ -1,60 +1,90 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Demand
-from config import DATABASE_URL
-from utility import generate_schedule  # Import the utility function
-
-# Set up the database connection
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
-
-# Function to load the demand data from the database
-def load_demand_data():
-    demand_records = session.query(Demand).all()
-    data = []
-    dates = []
-    for record in demand_records:
-        data.append(record.demand)
-        dates.append(record.date.strftime("%Y-%m-%d"))
-    
-    time_periods = [f"{9 + i//2:02}:{(i%2)*30:02}-{9 + (i+1)//2:02}:{((i+1)%2)*30:02}" for i in range(24)]
-    demand_df = pd.DataFrame(data, index=dates, columns=time_periods)
-    demand_df = demand_df.sort_index()  # Sort by dates
-    return demand_df
-
-# Load the original demand data
-if 'original_demand_df' not in st.session_state:
-    st.session_state.original_demand_df = load_demand_data()
+from models import Demand, init_db
+from utils.bulk import upsert_rows
+from utils.db import session_scope
+from utils.demand_store import get_demand_table
+from utility import generate_schedule, invalidate, show_draft, show_schedule_jobs  # Import the utility functions
 
-# Initialize a key for the data editor
-if 'data_editor_key' not in st.session_state:
-    st.session_state.data_editor_key = 0
+# Create the missing tables and indexes, once per server process
+init_db()
+
+time_periods = [f"{9 + i//2:02}:{(i%2)*30:02}-{9 + (i+1)//2:02}:{((i+1)%2)*30:02}" for i in range(24)]
+
+# Function to load the demand data of one team from start to end (inclusive) from the shared
+# demand table. Returns the demand table with the dates as index and the Demand ids of its rows.
+def load_demand_data(demand_table, team, start, end):
+    positions = demand_table.select(start, end, team)
+    dates = pd.DatetimeIndex(demand_table.dates[positions]).strftime("%Y-%m-%d")
+    demand_df = pd.DataFrame(demand_table.values[positions], index=dates, columns=time_periods)
+    demand_ids = pd.Series(demand_table.ids[positions], index=dates)
+    return demand_df, demand_ids
+
+with session_scope() as session:
+    demand_table = get_demand_table(session)
+
+# Teams that have demand and the months from the first to the last demand date
+teams = sorted(set(demand_table.teams), key=lambda team: (team is not None, team or ""))
+months = []
+if demand_table.first_date is not None:
+    months = list(pd.period_range(demand_table.first_date, demand_table.last_date, freq="M"))
 
 # Set up the Streamlit app
 st.title("Manage CSR Demands")
 st.subheader("Edit Demands for Specific Days and Periods")
 
+if not months:
+    st.info("There is no demand to edit yet.")
+    st.stop()
+
+# Which demand to edit: one month, or a range of months in one table
+team = teams[0]
+if len(teams) > 1:
+    team = st.selectbox("Team", teams, format_func=lambda team: team if team is not None else "Shared demand")
+multi_month = st.toggle("Edit several months", value=False)
+if multi_month:
+    first_month, last_month = st.select_slider("Months", options=months, value=(months[0], months[-1]),
+                                               format_func=lambda month: month.strftime("%b %Y"))
+else:
+    first_month = last_month = st.selectbox("Month", months, format_func=lambda month: month.strftime("%B %Y"))
+selection = (team, first_month, last_month)
+
+# Load the original demand data of the selection, again only when the selection changes
+if st.session_state.get('demand_selection') != selection:
+    st.session_state.original_demand_df, st.session_state.demand_ids = load_demand_data(
+        demand_table, team, first_month.start_time.date(), last_month.end_time.date())
+    st.session_state.demand_selection = selection
+
+# Initialize a key for the data editor
+if 'data_editor_key' not in st.session_state:
+    st.session_state.data_editor_key = 0
+
 # Display the demand table with direct editing
 edited_df = st.data_editor(
     st.session_state.original_demand_df,
     hide_index=False,
+    height=min(35 * (len(st.session_state.original_demand_df) + 1) + 3, 600),
     key=f"demand_table_{st.session_state.data_editor_key}"
 )
 
+# Days with at least one edited period
+original_df = st.session_state.original_demand_df
+changed = (edited_df.ne(original_df) & ~(edited_df.isna() & original_df.isna())).any(axis=1).to_numpy()
+if changed.any():
+    st.caption(f"{int(changed.sum())} of {len(changed)} days changed")
+
 # Buttons to save or cancel changes
 save_col, cancel_col, _ = st.columns([1, 1, 6.5])
 
 with save_col:
-    if st.button("Save"):
-        # Update the database with the new values
-        for date, row in edited_df.iterrows():
-            demand_record = session.query(Demand).filter_by(date=date).first()
-            if demand_record:
-                demand_record.demand = row.tolist()
-        session.commit()
+    if st.button("Save", disabled=not changed.any()):
+        # Write only the changed days, in one bulk update
+        changed_df = edited_df[changed].fillna(0)
+        ids = st.session_state.demand_ids[changed_df.index]
+        rows = {date: {'demand': [int(v) for v in row]} for date, row in zip(changed_df.index, changed_df.to_numpy())}
+        with session_scope() as session:
+            upsert_rows(session, Demand, Demand.id, rows, dict(ids.items()))
+        invalidate('demands')
         # Update the original data in session state
         st.session_state.original_demand_df = edited_df.copy()
         # Increment the key to force a refresh
@@ -67,7 +97,15 @@ with cancel_col:
         st.session_state.data_editor_key += 1
         st.rerun()
 
-# Add the "Generate New Schedule" button
+# Rough staffing result of the edited demand, before it is saved
+st.markdown("---")
+if st.button("Quick Draft"):
+    show_draft(edited_df)
+
+# Add the "Generate New Schedule" button, for the months being edited
 st.markdown("---")
+schedule_start = first_month.start_time.date()
+schedule_days = (last_month.end_time.date() - schedule_start).days + 1
 if st.button("Generate New Schedule"):
-    generate_schedule()
+    generate_schedule(schedule_start, schedule_days)
+show_schedule_jobs()
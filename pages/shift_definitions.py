@@ -1,30 +1,28 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import ShiftDefinition
-from config import DATABASE_URL
-from utility import generate_schedule  # Import the utility function
+from models import ShiftDefinition, init_db
+from sqlalchemy.exc import IntegrityError
+from utils.db import session_scope
+from utils.persistence import referenced_shift_definitions
+from utility import generate_schedule, invalidate, load_shift_definitions, schedule_month_input, show_schedule_jobs  # Import the utility functions
 
-# Set up the database connection
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
+# Create the missing tables and indexes, once per server process
+init_db()
 
-# Fetch shift definitions from the database
-shift_definitions = session.query(ShiftDefinition).all()
+# Fetch shift definitions (cached, see utility.py)
+shift_definitions = load_shift_definitions()
 
-# Create a DataFrame for shift definitions
+# Create a DataFrame for shift definitions, indexed by shift_def_id
 data = []
-for shift in shift_definitions:
-    row = [False, shift.name, shift.type] + shift.periods
+for shift_def_id, name, shift_type, periods in shift_definitions:
+    row = [False, name, shift_type] + periods
     data.append(row)
 
 # Create time period labels
 time_periods = [f"{9 + i//2:02}:{(i%2)*30:02}-{9 + (i+1)//2:02}:{((i+1)%2)*30:02}" for i in range(24)]
 columns = ["Select", "Shift Name", "Shift Type"] + time_periods
 
-shift_df = pd.DataFrame(data, columns=columns)
+shift_df = pd.DataFrame(data, columns=columns, index=[shift_def_id for shift_def_id, *_ in shift_definitions])
 
 # Set up the Streamlit app
 st.title("Manager's Shift Definitions")
@@ -74,14 +72,28 @@ edited_df = st.data_editor(
 
 # Delete selected rows
 if st.button("Delete Selected"):
-    selected_indices = edited_df[edited_df["Select"] == True].index.tolist()
-    if selected_indices:
-        for index in selected_indices:
-            shift_to_delete = session.query(ShiftDefinition).filter_by(name=edited_df.loc[index, "Shift Name"]).first()
-            if shift_to_delete:
-                session.delete(shift_to_delete)
-                session.commit()
-        st.rerun()
+    selected_ids = [int(shift_def_id) for shift_def_id in edited_df[edited_df["Select"] == True].index]
+    if selected_ids:
+        with session_scope() as session:
+            # Stored schedules and requests refer to the shift definitions they use
+            in_use = referenced_shift_definitions(session, selected_ids)
+            deleted = False
+            if in_use:
+                names = ", ".join(str(shift_df.loc[shift_def_id, "Shift Name"]) for shift_def_id in sorted(in_use))
+                st.error(f"Cannot delete shifts used by stored schedules or requests: {names}")
+            else:
+                try:
+                    (session.query(ShiftDefinition)
+                     .filter(ShiftDefinition.shift_def_id.in_(selected_ids))
+                     .delete(synchronize_session=False))
+                    session.commit()
+                    deleted = True
+                except IntegrityError:
+                    session.rollback()
+                    st.error("Cannot delete the selected shifts, other rows refer to them.")
+        if deleted:
+            invalidate('shift_definitions')
+            st.rerun()
 
 # Add new shift definition
 if st.button("Add New Shift"):
@@ -117,8 +129,10 @@ if st.session_state.get('show_form', False):
             type=new_shift_type,
             periods=periods
         )
-        session.add(new_shift)
-        session.commit()
+        with session_scope() as session:
+            session.add(new_shift)
+            session.commit()
+        invalidate('shift_definitions')
         st.session_state.show_form = False  # Close the form immediately
         st.rerun()
 
@@ -132,5 +146,7 @@ if st.session_state.get('show_form', False):
 
 # Add the "Generate New Schedule" button
 st.markdown("---")
+start_date, num_days = schedule_month_input()
 if st.button("Generate New Schedule"):
-    generate_schedule()
+    generate_schedule(start_date, num_days)
+show_schedule_jobs()
@@ -0,0 +1,41 @@
+from flask import Blueprint, jsonify, request
+from models import ScheduleRun
+from utils.analytics import cached_run_analytics
+from utils.db import db_session, remove_session
+from utils.persistence import latest_run
+
+analytics_bp = Blueprint('analytics', __name__)
+
+# One session per request, closed when the request ends
+session = db_session
+analytics_bp.teardown_request(remove_session)
+
+def _analytics_response(run_id):
+    result, version = cached_run_analytics(session, run_id)
+    if result is None:
+        return jsonify({'error': 'The run has no schedule'}), 404
+    # ?per_period=false and ?per_csr=false leave out the large parts for dashboards polling the totals
+    fields = [field for field in ('per_period', 'per_csr') if request.args.get(field, 'true').lower() == 'false']
+    if fields:
+        result = {key: value for key, value in result.items() if key not in fields}
+        version += "-" + "-".join(fields)
+    response = jsonify(result)
+    # Unchanged results are answered with 304 Not Modified to clients sending If-None-Match
+    response.set_etag(version)
+    return response.make_conditional(request)
+
+# Coverage, lack, overstaffing and utilization of a stored schedule against the current
+# demand: totals, per day and period ("per_period", days x periods lists) and per CSR
+# ("per_csr"). See utils/analytics.py.
+@analytics_bp.route('/analytics/runs/<int:id>', methods=['GET'])
+def get_run_analytics(id):
+    if not session.query(ScheduleRun).get(id):
+        return jsonify({'error': 'Run not found'}), 404
+    return _analytics_response(id)
+
+@analytics_bp.route('/analytics/latest', methods=['GET'])
+def get_latest_analytics():
+    run = latest_run(session)
+    if not run:
+        return jsonify({'error': 'No schedule has been generated yet'}), 404
+    return _analytics_response(run.run_id)
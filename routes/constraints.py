@@ -1,14 +1,12 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy.orm import sessionmaker
 from models import Constraint
-from utils.db import get_engine, get_session
+from utils.db import db_session, remove_session
 
 constraints_bp = Blueprint('constraints', __name__)
 
-# Set up the database session
-engine = get_engine()
-DBSession = sessionmaker(bind=engine)
-session = get_session()
+# One session per request, closed when the request ends
+session = db_session
+constraints_bp.teardown_request(remove_session)
 
 @constraints_bp.route('/constraints', methods=['GET'])
 def get_constraints():
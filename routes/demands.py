@@ -1,23 +1,58 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy.orm import sessionmaker 
+from sqlalchemy.exc import IntegrityError
 from models import Demand
-from utils.db import get_engine, get_session
+from utils.bulk import bulk_response, bulk_rows, row_date, upsert_rows, validate_rows
+from utils.db import db_session, remove_session
+from utils.demand_store import ALL_TEAMS, get_demand_table, invalidate_demand
+from utils.model_builder import NUM_PERIODS
+from utils.pagination import date_arg, filter_date_range, list_response
 
 demands_bp = Blueprint('demands', __name__)
 
-# Set up the database session
-engine = get_engine()
-DBSession = sessionmaker(bind=engine)
-session = get_session()
+# One session per request, closed when the request ends
+session = db_session
+demands_bp.teardown_request(remove_session)
 
+def demand_to_dict(demand):
+    return {
+        'id': demand.id,
+        'date': demand.date.isoformat(),
+        'demand': demand.demand,
+        'team': demand.team
+    }
+
+# Paginated list, see utils/pagination.py for ?limit=, ?after= and ?format=ndjson.
+# Optional filters: ?team=, ?start_date=YYYY-MM-DD, ?end_date=YYYY-MM-DD
 @demands_bp.route('/demands', methods=['GET'])
 def get_demands():
-    demands = session.query(Demand).all()
-    return jsonify([{
-        'id': d.id,
-        'date': d.date.isoformat(),
-        'demand': d.demand
-    } for d in demands])
+    query = session.query(Demand)
+    team = request.args.get('team')
+    if team is not None:
+        query = query.filter(Demand.team == team)
+    try:
+        query = filter_date_range(query, Demand.date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return list_response(query, Demand.id, demand_to_dict)
+
+# Demand of a date range as a matrix, from the in-process demand table:
+# ?start_date=YYYY-MM-DD (default the first demand date), ?end_date=YYYY-MM-DD (default the
+# last), ?team= for one team, otherwise the sum over the teams. Returns
+# {"start_date": ..., "end_date": ..., "demand": [[24 integers] per day]}, zeros on days without demand.
+@demands_bp.route('/demands/matrix', methods=['GET'])
+def get_demand_matrix():
+    table = get_demand_table(session)
+    try:
+        start_date = date_arg('start_date') or table.first_date
+        end_date = date_arg('end_date') or table.last_date
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start_date is None or end_date is None or end_date < start_date:
+        return jsonify({'start_date': None, 'end_date': None, 'demand': []})
+    team = request.args.get('team', ALL_TEAMS)
+    matrix = table.matrix(start_date, (end_date - start_date).days + 1, team)
+    return jsonify({'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                    'demand': matrix.tolist()})
 
 @demands_bp.route('/demands/<int:id>', methods=['GET'])
 def get_demand(id):
@@ -25,23 +60,56 @@ def get_demand(id):
     if not demand:
         return jsonify({'error': 'Demand not found'}), 404
 
-    return jsonify({
-        'id': demand.id,
-        'date': demand.date.isoformat(),
-        'demand': demand.demand
-    })
+    return jsonify(demand_to_dict(demand))
 
 @demands_bp.route('/demands', methods=['POST'])
 def add_demand():
     data = request.json
     new_demand = Demand(
         date=data.get('date'),
-        demand=data.get('demand')
+        demand=data.get('demand'),
+        team=data.get('team')
     )
     session.add(new_demand)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return jsonify({'error': 'There is already demand for this date and team'}), 409
+    invalidate_demand()
     return jsonify({'message': 'Demand added successfully'}), 201
 
+def _parse_demand(row):
+    demand = row.get('demand')
+    if (not isinstance(demand, list) or len(demand) != NUM_PERIODS
+            or not all(isinstance(v, int) and not isinstance(v, bool) and v >= 0 for v in demand)):
+        raise ValueError(f"demand must be a list of {NUM_PERIODS} non-negative integers")
+    team = row.get('team')
+    if team is not None and not isinstance(team, str):
+        raise ValueError("team must be a string")
+    return {'date': row_date(row, 'date'), 'demand': demand, 'team': team}
+
+# Upsert many days at once: [{"date": "2024-01-01", "demand": [24 integers], "team": "A"}, ...]
+# The demand of an existing (date, team) row is replaced, other rows are added, all in one
+# transaction. Invalid rows are reported in "errors" by their index and the rest is applied.
+@demands_bp.route('/demands/bulk', methods=['POST'])
+def bulk_demands():
+    rows = bulk_rows()
+    if rows is None:
+        return jsonify({'error': 'Expected a JSON array of demand rows'}), 400
+    valid, errors = validate_rows(rows, _parse_demand, lambda values: (values['date'], values['team']))
+    existing = {}
+    if valid:
+        dates = [day for day, _ in valid]
+        matches = (session.query(Demand.id, Demand.date, Demand.team)
+                   .filter(Demand.date.between(min(dates), max(dates)))
+                   .order_by(Demand.id))
+        for id, day, team in matches:
+            existing.setdefault((day, team), id)
+    inserted, updated = upsert_rows(session, Demand, Demand.id, valid, existing)
+    invalidate_demand()
+    return bulk_response(inserted, updated, errors)
+
 @demands_bp.route('/demands/<int:id>', methods=['PUT'])
 def update_demand(id):
     data = request.json
@@ -51,8 +119,14 @@ def update_demand(id):
 
     demand.date = data.get('date', demand.date)
     demand.demand = data.get('demand', demand.demand)
+    demand.team = data.get('team', demand.team)
 
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return jsonify({'error': 'There is already demand for this date and team'}), 409
+    invalidate_demand()
     return jsonify({'message': 'Demand updated successfully'}), 200
 
 @demands_bp.route('/demands/<int:id>', methods=['DELETE'])
@@ -63,4 +137,5 @@ def delete_demand(id):
 
     session.delete(demand)
     session.commit()
+    invalidate_demand()
     return jsonify({'message': 'Demand deleted successfully'}), 200
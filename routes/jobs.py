@@ -0,0 +1,73 @@
+from datetime import date
+
+from flask import Blueprint, jsonify, request
+from config import SOLVER_MODE
+from utils.db import db_session, remove_session
+from utils.jobs import JOB_STATUSES, get_job, job_to_dict, list_jobs, submit_job
+from utils.solvers import BACKENDS, SolverSettings
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# One session per request, closed when the request ends
+session = db_session
+jobs_bp.teardown_request(remove_session)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Checks of the optional solver fields of a job, with the expected value for the error message
+_SOLVER_FIELD_CHECKS = {
+    'threads': (lambda value: _is_number(value) and isinstance(value, int) and value >= 1, "a positive integer"),
+    'time_limit': (lambda value: _is_number(value) and value > 0, "a positive number of seconds"),
+    'gap_rel': (lambda value: _is_number(value) and value >= 0, "a number >= 0"),
+    'seed': (lambda value: _is_number(value) and isinstance(value, int) and value >= 0, "an integer >= 0"),
+}
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    status = request.args.get('status')
+    if status is not None and status not in JOB_STATUSES:
+        return jsonify({'error': f"Unknown status, expected one of {', '.join(JOB_STATUSES)}"}), 400
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify([job_to_dict(job) for job in list_jobs(session, status=status, limit=limit)])
+
+@jobs_bp.route('/jobs/<int:id>', methods=['GET'])
+def get_job_status(id):
+    job = get_job(session, id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+# Queue a schedule generation run. All fields are optional:
+# {"mode": "auto"|"individual"|"aggregated"|"decomposed"|"rolling", "warm_start": "csv"|"shifts"|"heuristic",
+#  "start_date": "2024-01-01" (default the first of next month), "num_days": 90,
+#  "backend": "cbc"|"highs"|"cpsat", "threads": 4, "time_limit": 60, "gap_rel": 0.01, "seed": 1}
+@jobs_bp.route('/jobs', methods=['POST'])
+def add_job():
+    data = request.json or {}
+    mode = data.get('mode', SOLVER_MODE)
+    if mode not in ("auto", "individual", "aggregated", "decomposed", "rolling"):
+        return jsonify({'error': 'mode must be "auto", "individual", "aggregated", "decomposed" or "rolling"'}), 400
+    if data.get('warm_start') not in (None, "csv", "shifts", "heuristic"):
+        return jsonify({'error': 'warm_start must be "csv", "shifts" or "heuristic"'}), 400
+    try:
+        start_date = date.fromisoformat(data['start_date']) if data.get('start_date') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start_date must be a YYYY-MM-DD date'}), 400
+    num_days = data.get('num_days')
+    if num_days is not None and (not isinstance(num_days, int) or num_days < 1):
+        return jsonify({'error': 'num_days must be a positive integer'}), 400
+
+    settings = None
+    solver_fields = ('backend', 'threads', 'time_limit', 'gap_rel', 'seed')
+    if any(field in data for field in solver_fields):
+        if data.get('backend', "cbc") not in BACKENDS:
+            return jsonify({'error': f"backend must be one of {', '.join(BACKENDS)}"}), 400
+        for field, (check, expected) in _SOLVER_FIELD_CHECKS.items():
+            if data.get(field) is not None and not check(data[field]):
+                return jsonify({'error': f"{field} must be {expected}"}), 400
+        settings = SolverSettings(**{field: data[field] for field in solver_fields if field in data})
+
+    job_id = submit_job(session, mode=mode, settings=settings, warm_start=data.get('warm_start'),
+                        start_date=start_date, num_days=num_days)
+    return jsonify({'message': 'Job queued', 'job_id': job_id}), 202
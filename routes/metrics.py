@@ -0,0 +1,64 @@
+import numpy as np
+from flask import Blueprint, jsonify, request
+from models import ScheduleRun
+from utils.db import db_session, remove_session
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# One session per request, closed when the request ends
+session = db_session
+metrics_bp.teardown_request(remove_session)
+
+def _recent_runs():
+    query = session.query(ScheduleRun)
+    mode = request.args.get('mode')
+    if mode is not None:
+        query = query.filter(ScheduleRun.mode == mode)
+    limit = request.args.get('limit', 100, type=int)
+    return query.order_by(ScheduleRun.run_id.desc()).limit(limit).all()
+
+# Timings, model size, solver statistics and peak memory per run, oldest first for charting.
+# Optional filters: ?mode=individual&limit=100
+@metrics_bp.route('/metrics/runs', methods=['GET'])
+def get_run_metrics():
+    return jsonify([{
+        'run_id': run.run_id,
+        'created_at': run.created_at.isoformat() if run.created_at else None,
+        'mode': run.mode,
+        'status': run.status,
+        'num_csrs': run.num_csrs,
+        'num_days': run.num_days,
+        'total_lack': run.total_lack,
+        'timings': run.timings or {},
+        'stats': run.stats or {}
+    } for run in reversed(_recent_runs())])
+
+# Per mode: number of runs, mean / median / 95th percentile seconds per phase and the
+# largest peak memory over the same runs as /metrics/runs
+@metrics_bp.route('/metrics/summary', methods=['GET'])
+def get_metrics_summary():
+    by_mode = {}
+    for run in _recent_runs():
+        by_mode.setdefault(run.mode, []).append(run)
+
+    summary = {}
+    for mode, runs in by_mode.items():
+        phases = sorted({phase for run in runs for phase in (run.timings or {})})
+        timings = {}
+        for phase in phases:
+            values = np.array([run.timings[phase] for run in runs if (run.timings or {}).get(phase) is not None])
+            timings[phase] = {
+                'mean': float(values.mean()),
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+                'max': float(values.max())
+            }
+        peaks = [(run.stats or {}).get('peak_rss_mb') for run in runs]
+        solver_peaks = [(run.stats or {}).get('solver_peak_rss_mb') for run in runs]
+        summary[mode] = {
+            'runs': len(runs),
+            'timings': timings,
+            'peak_rss_mb': max((peak for peak in peaks if peak is not None), default=None),
+            'solver_peak_rss_mb': max((peak for peak in solver_peaks if peak is not None), default=None)
+        }
+    return jsonify(summary)
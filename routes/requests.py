@@ -1,26 +1,61 @@
+import calendar
+from datetime import date
+
 from flask import Blueprint, jsonify, request
-from sqlalchemy.orm import sessionmaker
-from models import Request
-from utils.db import get_engine, get_session
+from models import Request, ShiftDefinition, User
+from utils.bulk import bulk_response, bulk_rows, row_date, row_int, upsert_rows, validate_rows
+from utils.db import db_session, remove_session
+from utils.pagination import filter_date_range, list_response
 
 requests_bp = Blueprint('requests', __name__)
 
-# Set up the database session
-engine = get_engine()
-DBSession = sessionmaker(bind=engine)
-session = get_session()
+# One session per request, closed when the request ends
+session = db_session
+requests_bp.teardown_request(remove_session)
 
+def request_to_dict(request_obj):
+    return {
+        'request_id': request_obj.request_id,
+        'csr_id': request_obj.csr_id,
+        'shift_def_id': request_obj.shift_def_id,
+        'status': request_obj.status,
+        'requested_date': request_obj.requested_date.isoformat(),
+        'notes': request_obj.notes
+    }
+
+# Paginated list, see utils/pagination.py for ?limit=, ?after= and ?format=ndjson.
+# Optional filters: ?csr_id=, ?status=, ?start_date=YYYY-MM-DD, ?end_date=YYYY-MM-DD (requested_date)
 @requests_bp.route('/requests', methods=['GET'])
 def get_requests():
-    requests = session.query(Request).all()
-    return jsonify([{
-        'request_id': r.request_id,
-        'csr_id': r.csr_id,
-        'shift_def_id': r.shift_def_id,
-        'status': r.status,
-        'requested_date': r.requested_date.isoformat(),
-        'notes': r.notes
-    } for r in requests])
+    query = session.query(Request)
+    csr_id = request.args.get('csr_id', type=int)
+    if csr_id is not None:
+        query = query.filter(Request.csr_id == csr_id)
+    status = request.args.get('status')
+    if status is not None:
+        query = query.filter(Request.status == status)
+    try:
+        query = filter_date_range(query, Request.requested_date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return list_response(query, Request.request_id, request_to_dict)
+
+# Requests of one month with one status, by default the pending ones:
+# ?month=YYYY-MM (required), ?status=. Ordered by requested_date, uses the
+# (requested_date, status) index.
+@requests_bp.route('/requests/pending', methods=['GET'])
+def get_pending_requests():
+    try:
+        year, month = (int(part) for part in request.args.get('month', '').split('-'))
+        first = date(year, month, 1)
+    except ValueError:
+        return jsonify({'error': 'month must be a YYYY-MM month'}), 400
+    last = first.replace(day=calendar.monthrange(year, month)[1])
+    status = request.args.get('status', 'pending')
+    query = (session.query(Request)
+             .filter(Request.requested_date.between(first, last), Request.status == status)
+             .order_by(Request.requested_date, Request.request_id))
+    return jsonify([request_to_dict(request_obj) for request_obj in query])
 
 @requests_bp.route('/requests/<int:id>', methods=['GET'])
 def get_request(id):
@@ -28,14 +63,7 @@ def get_request(id):
     if not request_obj:
         return jsonify({'error': 'Request not found'}), 404
 
-    return jsonify({
-        'request_id': request_obj.request_id,
-        'csr_id': request_obj.csr_id,
-        'shift_def_id': request_obj.shift_def_id,
-        'status': request_obj.status,
-        'requested_date': request_obj.requested_date.isoformat(),
-        'notes': request_obj.notes
-    })
+    return jsonify(request_to_dict(request_obj))
 
 @requests_bp.route('/requests', methods=['POST'])
 def add_request():
@@ -51,6 +79,47 @@ def add_request():
     session.commit()
     return jsonify({'message': 'Request added successfully'}), 201
 
+# Add or update many requests at once: [{"csr_id": 1, "requested_date": "2024-01-01",
+# "shift_def_id": 3, "status": "pending", "notes": "..."}, ...]. Rows with a "request_id"
+# update that request, the others are added, all in one transaction. Invalid rows are
+# reported in "errors" by their index and the rest is applied.
+@requests_bp.route('/requests/bulk', methods=['POST'])
+def bulk_requests():
+    rows = bulk_rows()
+    if rows is None:
+        return jsonify({'error': 'Expected a JSON array of request rows'}), 400
+
+    # Ids the rows may refer to, checked for the whole batch with one query each
+    def ids(name):
+        return [row.get(name) for row in rows if isinstance(row, dict) and isinstance(row.get(name), int)]
+    known_requests = {id for id, in session.query(Request.request_id).filter(Request.request_id.in_(ids('request_id')))}
+    known_csrs = {id for id, in session.query(User.user_id).filter(User.user_id.in_(ids('csr_id')))}
+    known_shifts = {id for id, in session.query(ShiftDefinition.shift_def_id)}
+
+    def parse(row):
+        values = {
+            'request_id': row_int(row, 'request_id', required=False, valid=known_requests),
+            'csr_id': row_int(row, 'csr_id', valid=known_csrs),
+            'requested_date': row_date(row, 'requested_date'),
+        }
+        # Optional fields are only written when given, like in update_request
+        if 'shift_def_id' in row:
+            values['shift_def_id'] = row_int(row, 'shift_def_id', required=False, valid=known_shifts)
+        for name in ('status', 'notes'):
+            if name in row:
+                if row[name] is not None and not isinstance(row[name], str):
+                    raise ValueError(f"{name} must be a string")
+                values[name] = row[name]
+        return values
+    # New requests have no key, so they are keyed by their position in the request
+    positions = iter(range(len(rows)))
+    valid, errors = validate_rows(rows, parse, lambda values: values['request_id'] or ('new', next(positions)))
+    for values in valid.values():
+        values.pop('request_id')
+    existing = {key: key for key in valid if isinstance(key, int)}
+    inserted, updated = upsert_rows(session, Request, Request.request_id, valid, existing)
+    return bulk_response(inserted, updated, errors)
+
 @requests_bp.route('/requests/<int:id>', methods=['PUT'])
 def update_request(id):
     data = request.json
@@ -0,0 +1,42 @@
+from flask import Blueprint, jsonify, request
+from models import ScheduleRun
+from utils.db import db_session, remove_session
+from utils.persistence import latest_run, list_runs, load_run_schedule, run_to_dict
+
+runs_bp = Blueprint('runs', __name__)
+
+# One session per request, closed when the request ends
+session = db_session
+runs_bp.teardown_request(remove_session)
+
+@runs_bp.route('/runs', methods=['GET'])
+def get_runs():
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify([run_to_dict(run) for run in list_runs(session, limit=limit)])
+
+@runs_bp.route('/runs/<int:id>', methods=['GET'])
+def get_run(id):
+    run = session.query(ScheduleRun).get(id)
+    if not run:
+        return jsonify({'error': 'Run not found'}), 404
+    return jsonify(run_to_dict(run))
+
+# Schedule of one run as {"dates": [...], "schedule": {csr_id: [shift_def_id per date]}}
+@runs_bp.route('/runs/<int:id>/schedule', methods=['GET'])
+def get_run_schedule(id):
+    run = session.query(ScheduleRun).get(id)
+    if not run:
+        return jsonify({'error': 'Run not found'}), 404
+    csr_ids, dates, schedule = load_run_schedule(session, id)
+    return jsonify({
+        'run_id': id,
+        'dates': [d.isoformat() for d in dates],
+        'schedule': {str(csr_id): row.tolist() for csr_id, row in zip(csr_ids, schedule)}
+    })
+
+@runs_bp.route('/runs/latest', methods=['GET'])
+def get_latest_run():
+    run = latest_run(session)
+    if not run:
+        return jsonify({'error': 'No schedule has been generated yet'}), 404
+    return jsonify(run_to_dict(run))
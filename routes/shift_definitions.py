@@ -1,14 +1,14 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import IntegrityError
 from models import ShiftDefinition
-from utils.db import get_engine, get_session
+from utils.db import db_session, remove_session
+from utils.persistence import referenced_shift_definitions
 
 shift_definitions_bp = Blueprint('shift_definitions', __name__)
 
-# Set up the database session
-engine = get_engine()
-DBSession = sessionmaker(bind=engine)
-session = get_session()
+# One session per request, closed when the request ends
+session = db_session
+shift_definitions_bp.teardown_request(remove_session)
 
 @shift_definitions_bp.route('/shift_definitions', methods=['GET'])
 def get_shift_definitions():
@@ -51,9 +51,15 @@ def delete_shift_definition(id):
     shift_definition = session.query(ShiftDefinition).get(id)
     if not shift_definition:
         return jsonify({'error': 'Shift definition not found'}), 404
+    if referenced_shift_definitions(session, [id]):
+        return jsonify({'error': 'Shift definition is used by stored schedules or requests'}), 409
 
     session.delete(shift_definition)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return jsonify({'error': 'Shift definition is used by other rows'}), 409
     return jsonify({'message': 'Shift definition deleted successfully'}), 200
 
 @shift_definitions_bp.route('/shift_definitions/<int:id>', methods=['GET'])
@@ -1,24 +1,83 @@
+from datetime import date
+
 from flask import Blueprint, jsonify, request
-from sqlalchemy.orm import sessionmaker
-from models import Shift
-from utils.db import get_engine, get_session
+from models import Shift, ShiftDefinition, User
+from utils.analytics import invalidate_analytics
+from utils.bulk import bulk_response, bulk_rows, row_date, row_int, upsert_rows, validate_rows
+from utils.db import db_session, remove_session
+from utils.pagination import filter_date_range, list_response
+from utils.persistence import latest_run
 
 shifts_bp = Blueprint('shifts', __name__)
 
-# Set up the database session
-engine = get_engine()
-DBSession = sessionmaker(bind=engine)
-session = get_session()
+# One session per request, closed when the request ends
+session = db_session
+shifts_bp.teardown_request(remove_session)
+
+def shift_to_dict(shift):
+    return {
+        'shift_id': shift.shift_id,
+        'csr_id': shift.csr_id,
+        'shift_def_id': shift.shift_def_id,
+        'date': shift.date.isoformat(),
+        'run_id': shift.run_id
+    }
 
+# Paginated list, see utils/pagination.py for ?limit=, ?after= and ?format=ndjson.
+# Optional filters: ?run_id=, ?csr_id=, ?start_date=YYYY-MM-DD, ?end_date=YYYY-MM-DD
 @shifts_bp.route('/shifts', methods=['GET'])
 def get_shifts():
-    shifts = session.query(Shift).all()
-    return jsonify([{
-        'shift_id': s.shift_id,
-        'csr_id': s.csr_id,
-        'shift_def_id': s.shift_def_id,
-        'date': s.date.isoformat()
-    } for s in shifts])
+    query = session.query(Shift)
+    # Only the shifts of one schedule version
+    run_id = request.args.get('run_id', type=int)
+    if run_id is not None:
+        query = query.filter(Shift.run_id == run_id)
+    csr_id = request.args.get('csr_id', type=int)
+    if csr_id is not None:
+        query = query.filter(Shift.csr_id == csr_id)
+    try:
+        query = filter_date_range(query, Shift.date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return list_response(query, Shift.shift_id, shift_to_dict)
+
+# Run of ?run_id=, by default the latest run, as (run_id, None) or (None, error response)
+def _run_id_arg():
+    run_id = request.args.get('run_id', type=int)
+    if run_id is not None:
+        return run_id, None
+    run = latest_run(session)
+    if run is None:
+        return None, (jsonify({'error': 'No schedule run'}), 404)
+    return run.run_id, None
+
+# Schedule of one CSR in ?run_id= (default the latest run), ordered by date.
+# Optional ?start_date=YYYY-MM-DD and ?end_date=YYYY-MM-DD, uses the (csr_id, date) index.
+@shifts_bp.route('/shifts/csr/<int:csr_id>', methods=['GET'])
+def get_csr_shifts(csr_id):
+    run_id, error = _run_id_arg()
+    if error:
+        return error
+    query = session.query(Shift).filter(Shift.csr_id == csr_id, Shift.run_id == run_id)
+    try:
+        query = filter_date_range(query, Shift.date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify([shift_to_dict(shift) for shift in query.order_by(Shift.date)])
+
+# All assignments on one date in ?run_id= (default the latest run), ordered by CSR.
+# Uses the (date) index.
+@shifts_bp.route('/shifts/date/<day>', methods=['GET'])
+def get_date_shifts(day):
+    try:
+        day = date.fromisoformat(day)
+    except ValueError:
+        return jsonify({'error': 'date must be a YYYY-MM-DD date'}), 400
+    run_id, error = _run_id_arg()
+    if error:
+        return error
+    query = session.query(Shift).filter(Shift.date == day, Shift.run_id == run_id).order_by(Shift.csr_id)
+    return jsonify([shift_to_dict(shift) for shift in query])
 
 @shifts_bp.route('/shifts/<int:id>', methods=['GET'])
 def get_shift(id):
@@ -26,14 +85,48 @@ def get_shift(id):
     if not shift:
         return jsonify({'error': 'Shift not found'}), 404
 
-    return jsonify({
-        'shift_id': shift.shift_id,
-        'csr_id': shift.csr_id,
-        'shift_def_id': shift.shift_def_id,
-        'date': shift.date.isoformat()
-    })
+    return jsonify(shift_to_dict(shift))
+
+# Manager overrides of one schedule version: [{"csr_id": 1, "date": "2024-01-01", "shift_def_id": 3}, ...]
+# The shift of a CSR on a date is replaced or added in the run given by ?run_id=, by default
+# the latest run, all in one transaction. Invalid rows are reported in "errors" by their
+# index and the rest is applied.
+@shifts_bp.route('/shifts/bulk', methods=['POST'])
+def bulk_shifts():
+    rows = bulk_rows()
+    if rows is None:
+        return jsonify({'error': 'Expected a JSON array of shift rows'}), 400
+    run_id, error = _run_id_arg()
+    if error:
+        return error
 
+    # Ids the rows may refer to, checked for the whole batch with one query each
+    csr_ids = {row.get('csr_id') for row in rows if isinstance(row, dict)}
+    known_csrs = {id for id, in session.query(User.user_id).filter(User.user_id.in_(
+        [id for id in csr_ids if isinstance(id, int)]))}
+    known_shifts = {id for id, in session.query(ShiftDefinition.shift_def_id)}
 
+    def parse(row):
+        return {
+            'csr_id': row_int(row, 'csr_id', valid=known_csrs),
+            'date': row_date(row, 'date'),
+            'shift_def_id': row_int(row, 'shift_def_id', valid=known_shifts),
+            'run_id': run_id,
+        }
+    valid, errors = validate_rows(rows, parse, lambda values: (values['csr_id'], values['date']))
+    existing = {}
+    if valid:
+        dates = [day for _, day in valid]
+        matches = (session.query(Shift.shift_id, Shift.csr_id, Shift.date)
+                   .filter(Shift.run_id == run_id,
+                           Shift.csr_id.in_({csr_id for csr_id, _ in valid}),
+                           Shift.date.between(min(dates), max(dates)))
+                   .order_by(Shift.shift_id))
+        for id, csr_id, day in matches:
+            existing.setdefault((csr_id, day), id)
+    inserted, updated = upsert_rows(session, Shift, Shift.shift_id, valid, existing)
+    invalidate_analytics(run_id)
+    return bulk_response(inserted, updated, errors)
 
 @shifts_bp.route('/shifts/<int:id>', methods=['PUT'])
 def update_shift(id):
@@ -47,6 +140,7 @@ def update_shift(id):
     shift.date = data.get('date', shift.date)
 
     session.commit()
+    invalidate_analytics(shift.run_id)
     return jsonify({'message': 'Shift updated successfully'}), 200
 
 @shifts_bp.route('/shifts/<int:id>', methods=['DELETE'])
@@ -55,6 +149,8 @@ def delete_shift(id):
     if not shift:
         return jsonify({'error': 'Shift not found'}), 404
 
+    run_id = shift.run_id
     session.delete(shift)
     session.commit()
+    invalidate_analytics(run_id)
     return jsonify({'message': 'Shift deleted successfully'}), 200
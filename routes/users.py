@@ -1,24 +1,33 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy.orm import sessionmaker
 from models import User
-from utils.db import get_engine, get_session
+from utils.db import db_session, remove_session
+from utils.pagination import list_response
 
 users_bp = Blueprint('users', __name__)
 
-# Set up the database session
-engine = get_engine()
-DBSession = sessionmaker(bind=engine)
-session = get_session()
+# One session per request, closed when the request ends
+session = db_session
+users_bp.teardown_request(remove_session)
 
+def user_to_dict(user):
+    return {
+        'user_id': user.user_id,
+        'name': user.name,
+        'email': user.email,
+        'role': user.role,
+        'team': user.team
+    }
+
+# Paginated list, see utils/pagination.py for ?limit=, ?after= and ?format=ndjson.
+# Optional filters: ?role=, ?team=
 @users_bp.route('/users', methods=['GET'])
 def get_users():
-    users = session.query(User).all()
-    return jsonify([{
-        'user_id': u.user_id,
-        'name': u.name,
-        'email': u.email,
-        'role': u.role
-    } for u in users])
+    query = session.query(User)
+    for field in ('role', 'team'):
+        value = request.args.get(field)
+        if value is not None:
+            query = query.filter(getattr(User, field) == value)
+    return list_response(query, User.user_id, user_to_dict)
 
 @users_bp.route('/users/<int:id>', methods=['GET'])
 def get_user(id):
@@ -26,20 +35,25 @@ def get_user(id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    return jsonify({
-        'user_id': user.user_id,
-        'name': user.name,
-        'email': user.email,
-        'role': user.role
-    })
+    return jsonify(user_to_dict(user))
+
+# A team is a non-empty string, or null for CSRs without a team
+def _team_error(team):
+    if team is not None and (not isinstance(team, str) or not team.strip()):
+        return jsonify({'error': 'team must be a non-empty string or null'}), 400
+    return None
 
 @users_bp.route('/users', methods=['POST'])
 def add_user():
     data = request.json
+    error = _team_error(data.get('team'))
+    if error:
+        return error
     new_user = User(
         name=data.get('name'),
         email=data.get('email'),
-        role=data.get('role')
+        role=data.get('role'),
+        team=data.get('team')
     )
     session.add(new_user)
     session.commit()
@@ -55,6 +69,12 @@ def update_user(id):
     user.name = data.get('name', user.name)
     user.email = data.get('email', user.email)
     user.role = data.get('role', user.role)
+    # "team": null takes the CSR out of its team
+    if 'team' in data:
+        error = _team_error(data['team'])
+        if error:
+            return error
+        user.team = data['team']
 
     session.commit()
     return jsonify({'message': 'User updated successfully'}), 200
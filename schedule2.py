@@ -1,191 +1,107 @@
-import pulp
-import numpy as np
-import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import ShiftDefinition, Demand, Constraint
-from config import DATABASE_URL
-
-def main():
-    # Set up the database connection
-    engine = create_engine(DATABASE_URL)
-    Session = sessionmaker(bind=engine)
-    session = Session()
-
-    # Number of CSRs
-    num_csrs = 40
-
-    # Fetch shift definitions, demand records, and constraints from the database
-    shift_definitions = session.query(ShiftDefinition).all()
-    demand_records = session.query(Demand).all()
-    constraints = session.query(Constraint).first()  # Assuming there's only one set of constraints
-
-    # Define the shifts from the ShiftDefinition table
-    shifts = {sd.shift_def_id: sd.periods for sd in shift_definitions}
-
-    # Define the demand from the Demand table
-    demand = {dr.date.day: dr.demand for dr in demand_records}
-
-    # Initialize the problem
-    prob = pulp.LpProblem("CSR_Scheduling", pulp.LpMinimize)
-
-    # Map shift_def_id to continuous indices
-    shift_id_to_index = {shift_def.shift_def_id: idx for idx, shift_def in enumerate(shift_definitions)}
-
-    # Define decision variables
-    # x[i][j][k] = 1 if CSR i is assigned to shift j on day k, 0 otherwise
-    x = [[[pulp.LpVariable(f"x_{i}_{j}_{k}", cat='Binary') for k in range(31)] for j in shift_id_to_index.values()] for i in range(num_csrs)]
-
-    # Define auxiliary variables for lack amount
-    lack = [[pulp.LpVariable(f"lack_{k}_{t}", lowBound=0, cat='Continuous') for t in range(24)] for k in range(31)]
-
-    # Define the objective function
-    # Minimize the total lack amount
-    prob += pulp.lpSum([lack[k][t] for k in range(31) for t in range(24)])
-
-    # Add constraints for the lack amount
-    for k in range(31):
-        for t in range(24):
-            prob += lack[k][t] >= demand[k+1][t] - pulp.lpSum([x[i][shift_id_to_index[j]][k] * shifts[j][t] for i in range(num_csrs) for j in shifts.keys()])
-
-    # Constraint 1: Each CSR is assigned to exactly one shift per day
-    for i in range(num_csrs):
-        for k in range(31):
-            prob += pulp.lpSum([x[i][j][k] for j in shift_id_to_index.values()]) == 1
-
-    # Constraint 2: Each CSR gets exactly 8 days off per month
-    leave_shift_index = shift_id_to_index[min(shift_id_to_index.keys())]  # Assuming the first shift definition is for 'leave'
-    for i in range(num_csrs):
-        prob += pulp.lpSum([x[i][leave_shift_index][k] for k in range(31)]) == constraints.exact_days_off_per_month
-
-    # Define shift types based on the shift definitions
-    morning_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Morning"]
-    afternoon_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Afternoon"]
-    night_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Night"]
-    leave_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Leave"]
-
-    # Convert to indices
-    morning_shifts_indices = [shift_id_to_index[id] for id in morning_shifts]
-    afternoon_shifts_indices = [shift_id_to_index[id] for id in afternoon_shifts]
-    night_shifts_indices = [shift_id_to_index[id] for id in night_shifts]
-    leave_shift_index = shift_id_to_index[leave_shifts[0]]  # Assuming there's only one leave shift
-
-    # Assume 31 days for now
-    num_days = 31
-
-    # Constraint 3: At most one night shift in every seven consecutive days
-    for i in range(num_csrs):
-        for k in range(num_days - constraints.max_night_shifts_in_period + 1):
-            prob += pulp.lpSum([x[i][j][k + m] for j in night_shifts_indices for m in range(constraints.max_night_shifts_in_period) if k + m < num_days]) <= constraints.max_night_shifts
-
-    # Constraint 4: At most two afternoon shifts in every seven consecutive days
-    for i in range(num_csrs):
-        for k in range(num_days - constraints.max_afternoon_shifts_in_period + 1):
-            prob += pulp.lpSum([x[i][j][k + m] for j in afternoon_shifts_indices for m in range(constraints.max_afternoon_shifts_in_period) if k + m < num_days]) <= constraints.max_afternoon_shifts
-
-    # Constraint 5: At least one day off in every seven consecutive working days
-    for i in range(num_csrs):
-        for k in range(num_days - constraints.max_days_off_in_period + 1):
-            prob += pulp.lpSum([x[i][j][k + m] for j in shift_id_to_index.values() if j != leave_shift_index for m in range(constraints.max_days_off_in_period) if k + m < num_days]) <= (constraints.max_days_off_in_period - 1)
-
-    # Create index_to_shift_name mapping
-    index_to_shift_name = {idx: shift_definitions[idx].name for idx in range(len(shift_definitions))}
-
-    # Number of unique shifts
-    num_shifts = len(shift_definitions)
-
-    # Solve the optimization problem
-    prob.solve()
-
-    # Print the status of the solution
 # schedule2.py
 
-import pulp
+import argparse
+import calendar
+from dataclasses import asdict, replace
+from datetime import date, timedelta
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import ShiftDefinition, Demand, Constraint
-from config import DATABASE_URL
+from models import ShiftDefinition, Constraint, User, init_db
+from utils.aggregated import solve_two_stage
+from utils.db import get_session
+from utils.demand_store import get_demand_table
+from utils.decomposition import build_groups, plain_constraints, solve_decomposed
+from utils.extraction import extract_solution
+from utils.heuristic import heuristic_schedule
+from utils.model_builder import build_coverage_matrix, build_model, leave_shift_index, shift_type_indices
+from utils.rolling import days_off_in_horizon, month_windows, solve_rolling
+from utils.persistence import find_run, load_schedule_db, save_run
+from utils.profiling import RunProfile
+from utils.solution_cache import cache_key, get_solution, put_solution
+from utils.solvers import BACKENDS, SolverSettings, solve
+from utils.warm_start import load_schedule_csv, repair_schedule
+from config import (AGGREGATE_ABOVE_CSRS, CSR_ROLE, DEFAULT_NUM_CSRS, HEURISTIC_MAX_STALL, HEURISTIC_TIME_LIMIT,
+                    SOLVER_BACKEND, SOLVER_GAP_REL, SOLVER_MODE, SOLVER_MSG, SOLVER_SEED, SOLVER_THREADS,
+                    SOLVER_TIME_LIMIT, WARM_START)
+
+# mode is "individual" for the per-CSR model, "aggregated" for the two-stage solve, "decomposed"
+# to solve every team in its own process (rolling each team month by month over a horizon
+# longer than a month), "rolling" to solve a long horizon month by month for the whole workforce,
+# or "auto" to decompose when there is more than one team, otherwise roll over horizons longer
+# than a month and use the two-stage solve above AGGREGATE_ABOVE_CSRS CSRs.
+# The horizon is num_days days from start_date. start_date defaults to the first day of the
+# next month, the one a roster is usually planned for, and num_days to the rest of the month.
+# settings picks the solver backend and its limits, defaulting to the SOLVER_* values in config.py.
+# warm_start is None, "csv" (start from csr_schedule.csv), "shifts" (start from the shifts table)
+# or "heuristic" (start from a greedy + local search draft).
+# use_cache returns the stored schedule when the inputs and settings have been solved before.
+# persist stores the run and its shifts in the database as a new schedule version.
+# output is the CSV file the schedule is written to, None to only store it as a run (the
+# background jobs, which may run at the same time and would overwrite each other's file).
+def main(mode=SOLVER_MODE, settings=None, warm_start=WARM_START, use_cache=True, persist=True,
+         start_date=None, num_days=None, output='csr_schedule.csv'):
+    if settings is None:
+        settings = SolverSettings(backend=SOLVER_BACKEND, threads=SOLVER_THREADS, time_limit=SOLVER_TIME_LIMIT,
+                                  gap_rel=SOLVER_GAP_REL, seed=SOLVER_SEED, msg=SOLVER_MSG)
+
+    # Per-phase timings, model size, solver statistics and peak memory of this run
+    profile = RunProfile()
+    profile.begin("load")
 
-def main():
     # Set up the database connection
-    engine = create_engine(DATABASE_URL)
-    Session = sessionmaker(bind=engine)
-    session = Session()
-
-    # Number of CSRs
-    num_csrs = 40
-
-    # Fetch shift definitions, demand records, and constraints from the database
+    session = get_session()
+
+    # The workforce: every user with the CSR role, in user_id order
+    users = session.query(User.user_id, User.team).filter(User.role == CSR_ROLE).order_by(User.user_id).all()
+    csr_ids = [user.user_id for user in users]
+    csr_teams = [user.team for user in users]
+    if not csr_ids:
+        print(f"No users with role {CSR_ROLE!r}, scheduling {DEFAULT_NUM_CSRS} unnamed CSRs.")
+        csr_ids = list(range(1, DEFAULT_NUM_CSRS + 1))
+        csr_teams = [None] * DEFAULT_NUM_CSRS
+    num_csrs = len(csr_ids)
+
+    # The planning horizon
+    if start_date is None:
+        start_date = (date.today().replace(day=28) + timedelta(days=4)).replace(day=1)
+    if num_days is None:
+        num_days = calendar.monthrange(start_date.year, start_date.month)[1] - start_date.day + 1
+    # Only the demand of the horizon, read afresh, a run has to see the demand as it is now
+    demand_table = get_demand_table(session, fresh=True, start=start_date,
+                                    end=start_date + timedelta(days=num_days - 1))
+
+    # Fetch shift definitions and constraints from the database
     shift_definitions = session.query(ShiftDefinition).all()
-    demand_records = session.query(Demand).all()
     constraints = session.query(Constraint).first()  # Assuming there's only one set of constraints
 
-    # Define the shifts from the ShiftDefinition table
-    shifts = {sd.shift_def_id: sd.periods for sd in shift_definitions}
-
-    # Define the demand from the Demand table
-    demand = {dr.date.day: dr.demand for dr in demand_records}
-
-    # Initialize the problem
-    prob = pulp.LpProblem("CSR_Scheduling", pulp.LpMinimize)
-
-    # Map shift_def_id to continuous indices
-    shift_id_to_index = {shift_def.shift_def_id: idx for idx, shift_def in enumerate(shift_definitions)}
-
-    # Define decision variables
-    x = [[[pulp.LpVariable(f"x_{i}_{j}_{k}", cat='Binary') for k in range(31)] for j in shift_id_to_index.values()] for i in range(num_csrs)]
-
-    # Define auxiliary variables for lack amount
-    lack = [[pulp.LpVariable(f"lack_{k}_{t}", lowBound=0, cat='Continuous') for t in range(24)] for k in range(31)]
-
-    # Define the objective function
-    prob += pulp.lpSum([lack[k][t] for k in range(31) for t in range(24)])
-
-    # Add constraints for the lack amount
-    for k in range(31):
-        for t in range(24):
-            prob += lack[k][t] >= demand[k+1][t] - pulp.lpSum([x[i][shift_id_to_index[j]][k] * shifts[j][t] for i in range(num_csrs) for j in shifts.keys()])
-
-    # Constraint 1: Each CSR is assigned to exactly one shift per day
-    for i in range(num_csrs):
-        for k in range(31):
-            prob += pulp.lpSum([x[i][j][k] for j in shift_id_to_index.values()]) == 1
+    # Demand (days x periods) of the horizon per team, and summed over the teams
+    demand_by_team = demand_table.matrices_by_team(start_date, num_days)
+    demand_matrix = demand_table.matrix(start_date, num_days)
+
+    multi_month = len(month_windows(start_date, num_days)) > 1
+    multi_team = len(set(csr_teams) | set(demand_by_team)) > 1
+    if mode == "auto":
+        if multi_team:
+            mode = "decomposed"
+        elif multi_month:
+            mode = "rolling"
+        else:
+            mode = "aggregated" if num_csrs > AGGREGATE_ABOVE_CSRS else "individual"
+    elif mode == "rolling" and multi_team:
+        print("Warning: the rolling mode solves the summed demand of all teams, teams are ignored. "
+              "Use the decomposed mode to roll every team separately.")
+    # Solved month by month: the days off are scaled per window and there is no warm start
+    rolled = mode == "rolling" or (mode == "decomposed" and multi_month)
+    profile.end("load")
 
-    # Constraint 2: Each CSR gets exactly 8 days off per month
-    leave_shift_index = shift_id_to_index[min(shift_id_to_index.keys())]
-    for i in range(num_csrs):
-        prob += pulp.lpSum([x[i][leave_shift_index][k] for k in range(31)]) == constraints.exact_days_off_per_month
+    # Coverage (shifts x periods) matrix
+    coverage = build_coverage_matrix(shift_definitions)
 
     # Define shift types based on the shift definitions
-    morning_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Morning"]
-    afternoon_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Afternoon"]
-    night_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Night"]
-    leave_shifts = [shift.shift_def_id for shift in shift_definitions if shift.type == "Leave"]
-
-    # Convert to indices
-    morning_shifts_indices = [shift_id_to_index[id] for id in morning_shifts]
-    afternoon_shifts_indices = [shift_id_to_index[id] for id in afternoon_shifts]
-    night_shifts_indices = [shift_id_to_index[id] for id in night_shifts]
-    leave_shift_index = shift_id_to_index[leave_shifts[0]]
-
-    num_days = 31
-
-    # Constraint 3: At most one night shift in every seven consecutive days
-    for i in range(num_csrs):
-        for k in range(num_days - constraints.max_night_shifts_in_period + 1):
-            prob += pulp.lpSum([x[i][j][k + m] for j in night_shifts_indices for m in range(constraints.max_night_shifts_in_period) if k + m < num_days]) <= constraints.max_night_shifts
-
-    # Constraint 4: At most two afternoon shifts in every seven consecutive days
-    for i in range(num_csrs):
-        for k in range(num_days - constraints.max_afternoon_shifts_in_period + 1):
-            prob += pulp.lpSum([x[i][j][k + m] for j in afternoon_shifts_indices for m in range(constraints.max_afternoon_shifts_in_period) if k + m < num_days]) <= constraints.max_afternoon_shifts
-
-    # Constraint 5: At least one day off in every seven consecutive working days
-    for i in range(num_csrs):
-        for k in range(num_days - constraints.max_days_off_in_period + 1):
-            prob += pulp.lpSum([x[i][j][k + m] for j in shift_id_to_index.values() if j != leave_shift_index for m in range(constraints.max_days_off_in_period) if k + m < num_days]) <= (constraints.max_days_off_in_period - 1)
+    type_indices = shift_type_indices(shift_definitions)
+    night_shifts_indices = type_indices.get("Night", [])
+    afternoon_shifts_indices = type_indices.get("Afternoon", [])
+    leave_index = leave_shift_index(shift_definitions)
 
     # Create index_to_shift_name mapping
     index_to_shift_name = {idx: shift_definitions[idx].name for idx in range(len(shift_definitions))}
@@ -193,61 +109,196 @@ def main():
     # Number of unique shifts
     num_shifts = len(shift_definitions)
 
-    # Solve the optimization problem
-    prob.solve()
+    # Look for a stored solution of exactly these inputs and settings
+    key = None
+    cached = None
+    if use_cache:
+        with profile.phase("cache"):
+            key = cache_key(shift_definitions, demand_by_team, constraints, list(zip(csr_ids, csr_teams)),
+                            start_date, num_days, mode, settings, warm_start)
+            cached = get_solution(key)
+
+    # Days off of the horizon, so a partial month is feasible: scaled to the part of every month
+    # it covers, unless the horizon is rolled, which scales them per window itself
+    if not rolled:
+        days_off = days_off_in_horizon(constraints.exact_days_off_per_month, start_date, num_days)
+        if days_off != constraints.exact_days_off_per_month:
+            print(f"Horizon of {num_days} days: {days_off} days off per CSR.")
+            constraints = plain_constraints(constraints)
+            constraints.exact_days_off_per_month = days_off
+
+    # Previous schedule, repaired against the current constraints, or a heuristic draft as the
+    # starting solution
+    warm_schedule = None
+    if cached is None and warm_start == "heuristic" and not rolled:
+        with profile.phase("warm_start"):
+            warm_schedule, _ = heuristic_schedule(coverage, demand_matrix, num_csrs, leave_index,
+                                                  night_shifts_indices, afternoon_shifts_indices, constraints,
+                                                  HEURISTIC_TIME_LIMIT, max_stall=HEURISTIC_MAX_STALL)
+    elif cached is None and warm_start is not None and not rolled:
+        with profile.phase("warm_start"):
+            if warm_start == "csv":
+                previous = load_schedule_csv('csr_schedule.csv', shift_definitions)
+            else:
+                previous = load_schedule_db(session, shift_definitions, csr_ids)
+            if previous is not None and previous.size:
+                warm_schedule = repair_schedule(previous, num_csrs, num_days, num_shifts, leave_index,
+                                                night_shifts_indices, afternoon_shifts_indices, constraints)
+                if warm_schedule is None:
+                    print("Previous schedule cannot be repaired to fit the constraints, solving from scratch.")
+
+    # "solve" is the whole solve step; the other modes build their models inside it, so only
+    # the individual model has separate "build" and "extract" phases
+    profile.begin("solve")
+    failed_teams = {}
+    if cached is not None:
+        print("Inputs unchanged since a previous run, using the cached schedule.")
+        solve_result, schedule, lack_values = cached
+    elif mode == "rolling":
+        # One calendar month at a time, earlier months fixed
+        solve_result, schedule, lack_values = solve_rolling(coverage, demand_matrix, start_date, num_csrs, leave_index,
+                                                            night_shifts_indices, afternoon_shifts_indices,
+                                                            constraints, settings)
+    elif mode == "decomposed":
+        # One worker process per team, the schedules are merged afterwards
+        groups = build_groups(csr_teams, demand_by_team, num_days, coverage.shape[1])
+        solve_result, schedule, lack_values, scheduled_rows, failed_teams = solve_decomposed(
+            groups, coverage, leave_index, night_shifts_indices, afternoon_shifts_indices, constraints, settings,
+            AGGREGATE_ABOVE_CSRS, warm_schedule, start_date=start_date)
+        for team, error in failed_teams.items():
+            print(f"Team {team} could not be scheduled, its demand is counted as lack: {error}")
+        # CSRs of failed teams are left out of the schedule
+        csr_ids = [csr_ids[row] for row in scheduled_rows]
+        num_csrs = len(csr_ids)
+    elif mode == "aggregated":
+        # Two-stage solve: daily shift counts first, then individual rosters
+        solve_result, schedule, lack_values = solve_two_stage(coverage, demand_matrix, num_csrs, leave_index,
+                                                              night_shifts_indices, afternoon_shifts_indices,
+                                                              constraints, settings, warm_schedule)
+    else:
+        # Build the sparse model (lack, one shift per day, days off and sliding-window constraints)
+        with profile.phase("build"):
+            prob, x, lack = build_model(coverage, demand_matrix, num_csrs, leave_index,
+                                        night_shifts_indices, afternoon_shifts_indices, constraints, warm_schedule)
+        if warm_schedule is not None:
+            settings = replace(settings, warm_start=True)
+
+        # Solve the optimization problem
+        solve_result = solve(prob, settings)
+
+        if solve_result.has_solution:
+            # Extract the results into a schedule array and a lack matrix
+            with profile.phase("extract"):
+                schedule, lack_values = extract_solution(x, lack)
+        del prob, x, lack
+    profile.end("solve")
+
+    if key is not None and cached is None and solve_result.has_solution and not failed_teams:
+        with profile.phase("cache"):
+            put_solution(key, solve_result, schedule, lack_values)
+    if cached is None:
+        if solve_result.solve_time is not None:
+            profile.timings['solver'] = solve_result.solve_time
+        profile.record_solve(solve_result)
 
-    # Get the status of the solution
-    status = pulp.LpStatus[prob.status]
+    # Print the status of the solution
+    status = solve_result.status
     print(f"Status: {status}")
+    if solve_result.gap is not None:
+        print(f"Objective: {solve_result.objective}, best bound: {solve_result.best_bound}, gap: {solve_result.gap:.4%}")
 
-    if status == 'Optimal':
+    if solve_result.has_solution:
         # Check if all demands are met
-        demand_met = True
-        total_lack = 0
         tolerance = 1e-6  # Small tolerance to account for floating-point errors
-        for k in range(31):
-            for t in range(24):
-                lack_value = pulp.value(lack[k][t])
-                if lack_value > tolerance:
-                    demand_met = False
-                    total_lack += lack_value
-                    print(f"Unmet demand on day {k+1}, hour {t}: {lack_value}")
-
-        if demand_met:
+        unmet = lack_values > tolerance
+        demand_met = not unmet.any()
+        total_lack = float(lack_values[unmet].sum())
+        for k, t in np.argwhere(unmet):
+            print(f"Unmet demand on day {k+1}, hour {t}: {lack_values[k, t]}")
+
+        if status == "FEASIBLE":
+            # The solver stopped on its time or gap limit, keep the best schedule found so far
+            gap = solve_result.gap if solve_result.gap is not None else ""
+            result = f"FEASIBLE:{total_lack}:{gap}"
+            print(f"Warning: Solver limit reached. Best schedule found has total lack {total_lack} (gap: {gap}).")
+        elif demand_met:
             result = "OPTIMAL"
             print("Success: Optimal solution found with all demands met.")
         else:
             result = f"SUBOPTIMAL:{total_lack}"
             print(f"Warning: Suboptimal solution. Not all demands are met. Total lack: {total_lack}")
 
-        # Extract the results into a schedule array
-        schedule = np.zeros((num_csrs, 31), dtype=int)
-
-        for i in range(num_csrs):
-            for j in range(num_shifts):
-                for k in range(31):
-                    if pulp.value(x[i][j][k]) == 1:
-                        schedule[i][k] = j
-
         # Convert the indices to shift names
-        schedule_names = np.array([[index_to_shift_name[shift] for shift in csr] for csr in schedule])
+        schedule_names = np.array([index_to_shift_name[idx] for idx in range(num_shifts)], dtype=object)[schedule]
 
         # Create a DataFrame for the schedule
-        schedule_df = pd.DataFrame(schedule_names, columns=[f'Day {k}' for k in range(1, 32)])
-        schedule_df.index = [f'CSR {i+1}' for i in range(num_csrs)]
+        schedule_df = pd.DataFrame(schedule_names, columns=[f'Day {k}' for k in range(1, num_days + 1)])
+        schedule_df.index = [f'CSR {csr_id}' for csr_id in csr_ids]
 
         # Print the schedule for verification
         print(schedule_df)
 
         # Save the schedule to a CSV file
-        schedule_df.to_csv('csr_schedule.csv', index=True)
-        print("Schedule saved to 'csr_schedule.csv'")
+        if output is not None:
+            with profile.phase("write"):
+                schedule_df.to_csv(output, index=True)
+            print(f"Schedule saved to '{output}'")
+    elif status == "NOT_SOLVED":
+        result = "NOT_SOLVED"
+        print("No solution found within the solver limits.")
     else:
         result = "INFEASIBLE"
         print("No feasible solution found.")
+    if failed_teams and not solve_result.has_solution:
+        # "INFEASIBLE:<teams>" / "NOT_SOLVED:<teams>" name the teams that could not be scheduled
+        teams = ", ".join(str(team) for team in failed_teams)
+        result = f"{result}:{teams}"
+        print(f"Teams that could not be scheduled: {teams}")
+
+    run_id = None
+    if persist:
+        # A cache hit whose run is already stored keeps pointing at that schedule version
+        existing = find_run(session, key) if cached is not None else None
+        if existing is not None:
+            run_id = existing.run_id
+            print(f"Schedule version {existing.run_id} is unchanged.")
+        else:
+            # The stored profile ends before the shifts are written, the log line includes them
+            profile.finish()
+            with profile.phase("persist"):
+                run_id = save_run(session, schedule if solve_result.has_solution else None,
+                                  csr_ids, [sd.shift_def_id for sd in shift_definitions],
+                                  start_date, solve_result, mode, result=result,
+                                  total_lack=total_lack if solve_result.has_solution else None,
+                                  timings=dict(profile.timings), stats=dict(profile.stats), input_key=key,
+                                  params={**asdict(settings), 'failed_teams': [str(team) for team in failed_teams]})
+            print(f"Saved as schedule version {run_id}.")
+    session.close()
+
+    profile.finish()
+    profile.log(run_id=run_id, mode=mode, result=result, cached=cached is not None, num_csrs=num_csrs,
+                num_days=num_days)
 
     return result
 
 if __name__ == '__main__':
-    result = main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["auto", "individual", "aggregated", "decomposed", "rolling"],
+                        default=SOLVER_MODE)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None, help="first day, YYYY-MM-DD, default the first of next month")
+    parser.add_argument("--days", type=int, default=None, help="horizon length in days")
+    parser.add_argument("--backend", choices=BACKENDS, default=SOLVER_BACKEND)
+    parser.add_argument("--threads", type=int, default=SOLVER_THREADS)
+    parser.add_argument("--time-limit", type=float, default=SOLVER_TIME_LIMIT, help="seconds")
+    parser.add_argument("--gap", type=float, default=SOLVER_GAP_REL, help="relative MIP gap")
+    parser.add_argument("--seed", type=int, default=SOLVER_SEED)
+    parser.add_argument("--no-cache", action="store_true", help="always solve, ignoring cached schedules")
+    parser.add_argument("--warm-start", choices=["csv", "shifts", "heuristic"], default=WARM_START,
+                        help="start from the previous schedule or a heuristic draft")
+    args = parser.parse_args()
+    init_db()
+    settings = SolverSettings(backend=args.backend, threads=args.threads, time_limit=args.time_limit,
+                              gap_rel=args.gap, seed=args.seed, msg=SOLVER_MSG)
+    result = main(mode=args.mode, settings=settings, warm_start=args.warm_start, use_cache=not args.no_cache,
+                  start_date=args.start_date, num_days=args.days)
     print(f"Result: {result}")
\ No newline at end of file
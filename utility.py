@@ -1,23 +1,224 @@
 # utility.py
+import calendar
+import os
+import time
+from datetime import date
+import pandas as pd
 import streamlit as st
-from schedule2 import main as generate_schedule_main
+from config import CSR_ROLE, DEFAULT_NUM_CSRS, HEURISTIC_MAX_STALL, HEURISTIC_TIME_LIMIT, UI_CACHE_TTL
+from models import Constraint, ShiftDefinition, User
+from utils.db import session_scope
+from utils.demand_store import invalidate_demand
+from utils.heuristic import heuristic_schedule
+from utils.jobs import get_job, submit_job
+from utils.model_builder import build_coverage_matrix, leave_shift_index, shift_type_indices
+from utils.persistence import latest_run, list_runs, load_run_schedule
 
-def generate_schedule():
+# Seconds between two status checks of the running schedule jobs
+POLL_SECONDS = 2
+
+SCHEDULE_CSV = 'csr_schedule.csv'
+
+# Cached reads shared by the pages. The results are plain values, kept for UI_CACHE_TTL
+# seconds; a page that writes a table calls invalidate() with its name, so a rerun with
+# nothing changed does not query the database.
+
+# Shift definitions as (shift_def_id, name, type, periods) tuples, by shift_def_id
+@st.cache_data(ttl=UI_CACHE_TTL, show_spinner=False)
+def load_shift_definitions():
+    with session_scope() as session:
+        return [(sd.shift_def_id, str(sd.name), sd.type, list(sd.periods))
+                for sd in session.query(ShiftDefinition).order_by(ShiftDefinition.shift_def_id)]
+
+# Column values of the Constraint row, None when there is none
+@st.cache_data(ttl=UI_CACHE_TTL, show_spinner=False)
+def load_constraints():
+    with session_scope() as session:
+        constraint = session.query(Constraint).first()
+        if constraint is None:
+            return None
+        return {column.name: getattr(constraint, column.name) for column in Constraint.__table__.columns}
+
+@st.cache_data(ttl=UI_CACHE_TTL, show_spinner=False)
+def load_num_csrs():
+    with session_scope() as session:
+        return session.query(User).filter(User.role == CSR_ROLE).count()
+
+# Stored schedule versions that have a schedule as {run_id: label}, newest first
+@st.cache_data(ttl=UI_CACHE_TTL, show_spinner=False)
+def load_runs():
+    with session_scope() as session:
+        return {run.run_id: f"Version {run.run_id} ({run.created_at:%Y-%m-%d %H:%M}, {run.mode})"
+                for run in list_runs(session) if run.status in ("OPTIMAL", "FEASIBLE")}
+
+# Latest stored schedule as a DataFrame of shift names, one row per CSR and one column per
+# date, with the label of its version. (None, None) when no run has a schedule.
+@st.cache_data(ttl=UI_CACHE_TTL, show_spinner=False)
+def load_latest_schedule():
+    with session_scope() as session:
+        run = latest_run(session)
+        if run is None:
+            return None, None
+        csr_ids, dates, matrix = load_run_schedule(session, run.run_id)
+        label = f"Version {run.run_id} ({run.created_at:%Y-%m-%d %H:%M}, {run.mode})"
+    names = {shift_def_id: name for shift_def_id, name, _, _ in load_shift_definitions()}
+    schedule = [[names.get(shift_def_id, "") for shift_def_id in row] for row in matrix.tolist()]
+    return pd.DataFrame(schedule, index=[f"CSR {csr_id}" for csr_id in csr_ids],
+                        columns=[day.isoformat() for day in dates]), label
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _read_schedule_csv(path, modified):
+    return pd.read_csv(path, index_col=0)
+
+# csr_schedule.csv as a DataFrame, parsed again only when the file changed. None without a file.
+def load_schedule_csv(path=SCHEDULE_CSV):
+    if not os.path.exists(path):
+        return None
+    return _read_schedule_csv(path, os.path.getmtime(path))
+
+# Cached reads per table
+_CACHED_QUERIES = {
+    'shift_definitions': [load_shift_definitions],
+    'constraints': [load_constraints],
+    'users': [load_num_csrs],
+    'schedule_runs': [load_runs, load_latest_schedule],
+}
+
+# Drop the cached results of the tables a page has written
+def invalidate(*tables):
+    for table in tables:
+        for query in _CACHED_QUERIES.get(table, []):
+            query.clear()
+        if table == 'demands':
+            invalidate_demand()
+
+# Detached ShiftDefinition and Constraint objects of the cached rows, for the model helpers
+def shift_definition_objects():
+    return [ShiftDefinition(shift_def_id=shift_def_id, name=name, type=type, periods=periods)
+            for shift_def_id, name, type, periods in load_shift_definitions()]
+
+def constraint_object():
+    values = load_constraints()
+    return Constraint(**values) if values is not None else None
+
+# Show the result string returned by schedule2.main
+def show_result(result):
+    if result == "OPTIMAL":
+        st.success("Schedule generated successfully with all demands met!")
+    elif result.startswith("SUBOPTIMAL"):
+        total_lack = float(result.split(":")[1])
+        st.warning(f"Schedule generated with unmet demands. Total lack: {total_lack}. Please review constraints and demands.")
+    elif result.startswith("FEASIBLE"):
+        _, total_lack, gap = result.split(":")
+        gap_text = f" (optimality gap {float(gap):.2%})" if gap else ""
+        st.warning(f"The solver hit its time limit. Showing the best schedule found so far{gap_text}. Total lack: {float(total_lack)}.")
+    elif result.startswith("NOT_SOLVED"):
+        st.error("No schedule was found within the solver time limit. Try a longer time limit or a larger MIP gap.")
+    elif result.startswith("INFEASIBLE"):
+        st.error("Failed to generate a feasible schedule. Please review constraints and demands.")
+    else:
+        st.error("Unexpected result from schedule generation.")
+    if result.startswith(("NOT_SOLVED:", "INFEASIBLE:")):
+        st.error(f"Teams that could not be scheduled: {result.split(':', 1)[1]}")
+    if result.split(":")[0] in ("OPTIMAL", "SUBOPTIMAL", "FEASIBLE"):
+        st.info("The schedule has been saved as a new schedule version, see the schedule viewer.")
+
+# Month to generate a schedule for, picked from this month and the next twelve with the next
+# month preselected. Returns (start_date, num_days) of that month for generate_schedule().
+def schedule_month_input(key="schedule_month"):
+    first = date.today().replace(day=1)
+    months = [(pd.Timestamp(first) + pd.DateOffset(months=n)).date() for n in range(13)]
+    month = st.selectbox("Month to schedule", months, index=1, key=key, format_func=lambda month: f"{month:%B %Y}")
+    return month, calendar.monthrange(month.year, month.month)[1]
+
+# Queue a schedule run of num_days days from start_date in the background job runner instead
+# of solving in the script thread. The job ids are kept in the browser session, so every
+# manager only follows their own runs.
+def generate_schedule(start_date, num_days):
     try:
-        result = generate_schedule_main()  # Call the main function from schedule2.py
-        
-        if result == "OPTIMAL":
-            st.success("Schedule generated successfully with all demands met!")
-        elif result.startswith("SUBOPTIMAL"):
-            total_lack = float(result.split(":")[1])
-            st.warning(f"Schedule generated with unmet demands. Total lack: {total_lack}. Please review constraints and demands.")
-        elif result == "INFEASIBLE":
-            st.error("Failed to generate a feasible schedule. Please review constraints and demands.")
-        else:
-            st.error("Unexpected result from schedule generation.")
-        
-        # You might want to add a link to download the CSV file here
-        st.info("The schedule has been saved as 'csr_schedule.csv'.")
-        
+        with session_scope() as session:
+            job_id = submit_job(session, start_date=start_date, num_days=num_days)
     except Exception as e:
-        st.error(f"Failed to generate schedule: {e}")
\ No newline at end of file
+        st.error(f"Failed to queue schedule generation: {e}")
+        return
+    st.session_state.setdefault('schedule_jobs', []).append(job_id)
+
+# Status of the schedule jobs of this session as {job_id: (status, started_at, finished_at,
+# result, error)}. Finished jobs do not change any more, they are kept in the session state
+# and only the queued and running ones are read from the database.
+def _schedule_job_states():
+    finished = st.session_state.setdefault('finished_jobs', {})
+    states = {job_id: state for job_id, state in finished.items() if state is not None}
+    pending = [job_id for job_id in st.session_state.get('schedule_jobs', []) if job_id not in finished]
+    if pending:
+        with session_scope() as session:
+            for job_id in pending:
+                job = get_job(session, job_id)
+                if job is None:
+                    # Deleted, nothing left to follow
+                    finished[job_id] = None
+                    continue
+                states[job_id] = (job.status, job.started_at, job.finished_at, job.result, job.error)
+                if job.status in ("done", "failed"):
+                    finished[job_id] = states[job_id]
+                    # A new schedule version exists
+                    invalidate('schedule_runs')
+    return states
+
+def _render_schedule_jobs():
+    states = _schedule_job_states()
+    for job_id in reversed(st.session_state.get('schedule_jobs', [])):
+        if job_id not in states:
+            continue
+        status, started_at, finished_at, result, error = states[job_id]
+        if status == "queued":
+            st.info(f"Schedule job {job_id} is queued.")
+        elif status == "running":
+            st.info(f"Schedule job {job_id} is running since {started_at:%H:%M:%S}...")
+        elif status == "failed":
+            st.error(f"Schedule job {job_id} failed: {error.strip().splitlines()[-1]}")
+        else:
+            st.markdown(f"**Schedule job {job_id}** finished at {finished_at:%H:%M:%S}")
+            show_result(result)
+
+# Show the status of the schedule jobs of this session and refresh it until they are finished
+def show_schedule_jobs():
+    if hasattr(st, "fragment"):
+        # Only this part of the page is re-run on every poll
+        st.fragment(run_every=POLL_SECONDS)(_render_schedule_jobs)()
+        return
+    _render_schedule_jobs()
+    finished = st.session_state.get('finished_jobs', {})
+    if any(job_id not in finished for job_id in st.session_state.get('schedule_jobs', [])):
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
+# Quick heuristic draft of the month of the first row of demand_df (dates as index, the 24
+# periods as columns), so the effect of demand edits shows before they are saved and solved
+def show_draft(demand_df):
+    if demand_df.empty:
+        st.info("There is no demand to draft a schedule for.")
+        return
+    demand_df = demand_df.groupby(level=0).sum()
+    dates = pd.to_datetime(demand_df.index)
+    start = dates.min().replace(day=1)
+    num_days = calendar.monthrange(start.year, start.month)[1]
+    days = (dates - start).days.to_numpy()
+    in_month = days < num_days
+    demand = pd.DataFrame(0, index=range(num_days), columns=demand_df.columns)
+    demand.iloc[days[in_month]] = demand_df.to_numpy()[in_month]
+
+    shift_definitions = shift_definition_objects()
+    constraints = constraint_object()
+    num_csrs = load_num_csrs() or DEFAULT_NUM_CSRS
+    type_indices = shift_type_indices(shift_definitions)
+    _, lack_values = heuristic_schedule(build_coverage_matrix(shift_definitions), demand.to_numpy(), num_csrs,
+                                        leave_shift_index(shift_definitions), type_indices.get("Night", []),
+                                        type_indices.get("Afternoon", []), constraints, HEURISTIC_TIME_LIMIT,
+                                        max_stall=HEURISTIC_MAX_STALL)
+
+    st.markdown(f"**Draft for {start:%B %Y}** ({num_csrs} CSRs, not optimized)")
+    st.metric("Total lack", f"{lack_values.sum():.0f}")
+    lack_per_day = pd.Series(lack_values.sum(axis=1),
+                             index=[f"{start + pd.Timedelta(days=k):%Y-%m-%d}" for k in range(num_days)])
+    st.bar_chart(lack_per_day)
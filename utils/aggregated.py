@@ -0,0 +1,237 @@
+from dataclasses import replace
+
+import numpy as np
+import pulp
+
+from utils.extraction import extract_solution, integer_values, variable_values
+from utils.model_builder import add_roster_constraints, build_assignment_variables, build_model
+from utils.solvers import SolverSettings, solve
+from utils.warm_start import set_initial_counts
+
+
+# Stage 1: integer model of how many CSRs work shift j on day k.
+# The per-CSR rules are aggregated over the whole team, so this is a relaxation of the
+# individual model without the CSR symmetry.
+def build_aggregate_model(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices, constraints):
+    num_shifts, num_periods = coverage.shape
+    num_days = demand.shape[0]
+
+    prob = pulp.LpProblem("CSR_Scheduling_Aggregate", pulp.LpMinimize)
+
+    # y[j, k] = number of CSRs assigned to shift j on day k
+    y = np.empty((num_shifts, num_days), dtype=object)
+    for j in range(num_shifts):
+        for k in range(num_days):
+            y[j, k] = pulp.LpVariable(f"y_{j}_{k}", lowBound=0, upBound=num_csrs, cat='Integer')
+
+    lack = np.empty((num_days, num_periods), dtype=object)
+    for k in range(num_days):
+        for t in range(num_periods):
+            lack[k, t] = pulp.LpVariable(f"lack_{k}_{t}", lowBound=0, cat='Continuous')
+
+    prob += pulp.LpAffineExpression([(v, 1) for v in lack.ravel()])
+
+    # Lack constraints
+    batch = {}
+    for t in range(num_periods):
+        covering = np.flatnonzero(coverage[:, t])
+        coefs = coverage[covering, t].tolist()
+        for k in range(num_days):
+            expr = pulp.LpAffineExpression(zip(y[covering, k], coefs))
+            expr[lack[k, t]] = 1
+            batch[f"lack_{k}_{t}"] = pulp.LpConstraint(expr, pulp.LpConstraintGE, rhs=int(demand[k, t]))
+    prob.extend(batch)
+
+    # Every CSR works exactly one shift (or leave) per day
+    batch = {}
+    for k in range(num_days):
+        expr = pulp.LpAffineExpression([(v, 1) for v in y[:, k]])
+        batch[f"headcount_{k}"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=num_csrs)
+    prob.extend(batch)
+
+    # Total days off over the month
+    expr = pulp.LpAffineExpression([(v, 1) for v in y[leave_index, :]])
+    prob += pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=num_csrs * constraints.exact_days_off_per_month,
+                              name="days_off")
+
+    # Sliding-window rules summed over the team
+    working_indices = [j for j in range(num_shifts) if j != leave_index]
+    for prefix, indices, window, limit in [
+        ("night", night_indices, constraints.max_night_shifts_in_period, constraints.max_night_shifts),
+        ("afternoon", afternoon_indices, constraints.max_afternoon_shifts_in_period, constraints.max_afternoon_shifts),
+        ("working", working_indices, constraints.max_days_off_in_period, constraints.max_days_off_in_period - 1),
+    ]:
+        if not indices or not window:
+            continue
+        batch = {}
+        for k in range(num_days - window + 1):
+            expr = pulp.LpAffineExpression([(v, 1) for v in y[indices, k:k + window].ravel()])
+            batch[f"{prefix}_{k}"] = pulp.LpConstraint(expr, pulp.LpConstraintLE, rhs=num_csrs * limit)
+        prob.extend(batch)
+
+    return prob, y, lack
+
+
+# Window rules as (shift indices, window length, limit) triples
+def _window_rules(num_shifts, leave_index, night_indices, afternoon_indices, constraints):
+    working_indices = [j for j in range(num_shifts) if j != leave_index]
+    rules = [
+        (list(night_indices), constraints.max_night_shifts_in_period, constraints.max_night_shifts),
+        (list(afternoon_indices), constraints.max_afternoon_shifts_in_period, constraints.max_afternoon_shifts),
+        (working_indices, constraints.max_days_off_in_period, constraints.max_days_off_in_period - 1),
+    ]
+    return [(indices, window, limit) for indices, window, limit in rules if indices and window]
+
+
+# One roster that fits inside the residual counts and leaves counts the remaining
+# CSRs can still cover under the aggregated window limits. Returns None if there is none.
+def _next_pattern(residual, remaining, leave_index, rules, constraints, settings):
+    num_shifts, num_days = residual.shape
+    prob = pulp.LpProblem("CSR_Pattern", pulp.LpMinimize)
+
+    p = np.empty((num_shifts, num_days), dtype=object)
+    for j in range(num_shifts):
+        for k in range(num_days):
+            p[j, k] = pulp.LpVariable(f"p_{j}_{k}", lowBound=0, upBound=min(1, int(residual[j, k])), cat='Integer')
+
+    # Prefer the shifts with the largest residual counts and the windows closest to their
+    # limit, so that what is left keeps the shape of the original counts
+    objective = {v: -float(residual[j, k]) / remaining for (j, k), v in np.ndenumerate(p)}
+
+    batch = {}
+    for k in range(num_days):
+        expr = pulp.LpAffineExpression([(v, 1) for v in p[:, k]])
+        batch[f"one_shift_{k}"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=1)
+    expr = pulp.LpAffineExpression([(v, 1) for v in p[leave_index, :]])
+    batch["days_off"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=constraints.exact_days_off_per_month)
+    for n, (indices, window, limit) in enumerate(rules):
+        for k in range(num_days - window + 1):
+            terms = [(v, 1) for v in p[indices, k:k + window].ravel()]
+            batch[f"own_{n}_{k}"] = pulp.LpConstraint(pulp.LpAffineExpression(terms), pulp.LpConstraintLE, rhs=limit)
+            # What is left in the window must fit the remaining CSRs
+            total = int(residual[indices, k:k + window].sum())
+            for v, _ in terms:
+                objective[v] -= total / (remaining * limit)
+            batch[f"rest_{n}_{k}"] = pulp.LpConstraint(pulp.LpAffineExpression(terms), pulp.LpConstraintGE,
+                                                       rhs=total - (remaining - 1) * limit)
+    prob.extend(batch)
+    prob += pulp.LpAffineExpression(objective)
+
+    if not solve(prob, settings).has_solution:
+        return None
+    return integer_values(p)
+
+
+# How many of the remaining CSRs can follow `pattern` before the residual counts break
+# the aggregated window limits
+def _pattern_multiplicity(residual, remaining, pattern, rules):
+    num_days = residual.shape[1]
+    m = min(remaining, int(residual[pattern.astype(bool)].min()))
+    for indices, window, limit in rules:
+        for k in range(num_days - window + 1):
+            total = residual[indices, k:k + window].sum()
+            taken = pattern[indices, k:k + window].sum()
+            if taken < limit:
+                m = min(m, int((remaining * limit - total) // (limit - taken)))
+    return max(m, 1)
+
+
+# Exact split of the residual counts over a small group of CSRs
+def _split_exactly(residual, remaining, leave_index, night_indices, afternoon_indices, constraints, settings):
+    num_shifts, num_days = residual.shape
+    prob = pulp.LpProblem("CSR_Split", pulp.LpMinimize)
+    x = build_assignment_variables(remaining, num_shifts, num_days)
+    prob += pulp.LpAffineExpression()
+    add_roster_constraints(prob, x, leave_index, night_indices, afternoon_indices, constraints)
+    batch = {}
+    for j in range(num_shifts):
+        for k in range(num_days):
+            expr = pulp.LpAffineExpression([(v, 1) for v in x[:, j, k]])
+            batch[f"count_{j}_{k}"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=int(residual[j, k]))
+    prob.extend(batch)
+
+    if not solve(prob, settings).has_solution:
+        return None
+    return np.nan_to_num(variable_values(x), nan=0.0).argmax(axis=1)
+
+
+# Stage 2: split the daily shift counts into individual rosters.
+# Rosters are peeled off one pattern at a time: each pattern is a small MIP over a single
+# CSR that keeps the rest of the counts coverable by the remaining CSRs, and is repeated
+# for as many CSRs as the counts allow. Because the aggregated limits are not sufficient
+# on their own, the last `tail` CSRs are split with an exact model instead.
+# Returns a (csrs x days) matrix of shift indices, or None when the counts cannot be split.
+def disaggregate(counts, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                 settings=None, tail=10):
+    num_shifts, num_days = counts.shape
+    # The pattern models are tiny, run them quietly and without limits
+    settings = replace(settings or SolverSettings(), time_limit=None, gap_rel=None, msg=False, warm_start=False)
+    rules = _window_rules(num_shifts, leave_index, night_indices, afternoon_indices, constraints)
+
+    residual = counts.copy()
+    remaining = num_csrs
+    groups = []
+    target = tail
+    while remaining > tail:
+        pattern = _next_pattern(residual, remaining, leave_index, rules, constraints, settings)
+        if pattern is None:
+            # Stuck: give the exact split the last `tail` peeled CSRs as well
+            target = remaining + tail
+            break
+        m = min(_pattern_multiplicity(residual, remaining, pattern, rules), remaining - tail)
+        residual -= m * pattern
+        remaining -= m
+        groups.append((pattern.argmax(axis=0), m))
+
+    rows = [roster for roster, m in groups for _ in range(m)]
+    while groups and remaining < target:
+        roster, m = groups[-1]
+        back = min(m, target - remaining)
+        for _ in range(back):
+            rows.pop()
+        residual[roster, np.arange(num_days)] += back
+        remaining += back
+        groups[-1] = (roster, m - back)
+        if groups[-1][1] == 0:
+            groups.pop()
+    if remaining:
+        rest = _split_exactly(residual, remaining, leave_index, night_indices, afternoon_indices, constraints, settings)
+        if rest is None:
+            return None
+        rows.extend(rest)
+    return np.array(rows, dtype=np.int64)
+
+
+# Two-stage solve: aggregate counts first, then individual rosters.
+# warm_schedule is an optional valid (csrs x days) schedule used as the starting solution.
+# Returns the SolveResult of the model that decided the lack, the (csrs x days) schedule of
+# shift indices and the (days x periods) lack matrix; the schedule is None when no solution
+# was found.
+def solve_two_stage(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                    settings=None, warm_schedule=None):
+    settings = replace(settings or SolverSettings(), warm_start=warm_schedule is not None)
+    prob, y, lack = build_aggregate_model(coverage, demand, num_csrs, leave_index,
+                                          night_indices, afternoon_indices, constraints)
+    if warm_schedule is not None:
+        set_initial_counts(y, lack, warm_schedule, coverage, demand)
+    result = solve(prob, settings)
+    if not result.has_solution:
+        return result, None, None
+
+    counts = integer_values(y)
+    schedule = disaggregate(counts, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                            settings=settings)
+
+    if schedule is None:
+        # The aggregate answer cannot be split, fall back to the full individual model
+        prob, x, lack = build_model(coverage, demand, num_csrs, leave_index,
+                                    night_indices, afternoon_indices, constraints, warm_schedule)
+        result = solve(prob, settings)
+        if not result.has_solution:
+            return result, None, None
+        schedule, _ = extract_solution(x, lack)
+
+    # Lack of the final roster
+    staffed = coverage[schedule].sum(axis=0)
+    lack_values = np.maximum(demand - staffed, 0).astype(float)
+    return result, schedule, lack_values
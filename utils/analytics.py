@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL
+from models import ShiftDefinition
+from utils.demand_store import get_demand_table
+from utils.model_builder import NUM_PERIODS
+from utils.persistence import load_run_schedule
+
+
+# (csrs x days x shifts) one-hot tensor of a (csrs x days) schedule of shift indices
+def one_hot(schedule, num_shifts):
+    return schedule[..., None] == np.arange(num_shifts)
+
+
+# Staffing of a schedule against demand. schedule is (csrs x days) shift indices, coverage
+# the (shifts x periods) 0/1 matrix and demand (days x periods). The coverage tensor is the
+# one-hot (csrs x days x shifts) schedule times coverage; it is contracted over the CSRs for
+# the per-period figures and over days and periods for the per-CSR ones, so the full
+# (csrs x days x periods) tensor is never built. Returns a dict of arrays:
+#     coverage, lack, overstaffing      (days x periods) CSRs working, missing, in excess
+#     utilization                       (days x periods) share of the working CSRs that meet
+#                                       demand, min(coverage, demand) / coverage, 1 when nobody works
+#     csr_working_days, csr_worked_periods, csr_utilization    per CSR, utilization being the
+#                                       mean utilization over the periods the CSR works
+def staffing_analytics(schedule, coverage, demand, leave_index=None):
+    onehot = one_hot(schedule, coverage.shape[0])
+    covered = onehot.sum(axis=0) @ coverage
+    lack = np.maximum(demand - covered, 0)
+    overstaffing = np.maximum(covered - demand, 0)
+    utilization = np.divide(np.minimum(covered, demand), covered, out=np.ones(covered.shape), where=covered > 0)
+
+    shifts_per_csr = onehot.sum(axis=1)
+    worked_periods = shifts_per_csr @ coverage.sum(axis=1)
+    working = coverage.sum(axis=1) > 0
+    if leave_index is not None:
+        working[leave_index] = False
+    # Sum of the utilization of the periods each CSR works on, per day and shift
+    useful = np.einsum('cds,ds->c', onehot, utilization @ coverage.T)
+    return {
+        'coverage': covered,
+        'lack': lack,
+        'overstaffing': overstaffing,
+        'utilization': utilization,
+        'csr_working_days': shifts_per_csr @ working,
+        'csr_worked_periods': worked_periods,
+        'csr_utilization': np.divide(useful, worked_periods, out=np.zeros(len(worked_periods)),
+                                     where=worked_periods > 0),
+    }
+
+
+# Analytics of a stored run against the current shift definitions and the demand table, as a
+# JSON-ready dict with totals, the per-period matrices (days x periods) and one entry per CSR.
+# Shifts of unknown shift definitions count as days off. None when the run has no shifts.
+def run_analytics(session, run_id, demand_table):
+    csr_ids, dates, shift_def_ids = load_run_schedule(session, run_id)
+    if not csr_ids:
+        return None
+    shift_definitions = session.query(ShiftDefinition).order_by(ShiftDefinition.shift_def_id).all()
+    # Row of each shift_def_id in coverage, with a last all-zero row for missing and unknown shifts
+    known_ids = np.array([sd.shift_def_id for sd in shift_definitions], dtype=np.int64)
+    coverage = np.array([sd.periods for sd in shift_definitions], dtype=np.int64).reshape(len(known_ids), NUM_PERIODS)
+    coverage = np.vstack([coverage, np.zeros((1, NUM_PERIODS), dtype=np.int64)])
+    lookup = np.full(max(int(known_ids.max(initial=0)), int(shift_def_ids.max(initial=0))) + 2, len(known_ids))
+    lookup[known_ids] = np.arange(len(known_ids))
+    leave = [idx for idx, sd in enumerate(shift_definitions) if sd.type == "Leave"]
+
+    demand = demand_table.matrix(dates[0], len(dates))
+    result = staffing_analytics(lookup[shift_def_ids], coverage, demand, leave[0] if leave else None)
+    total_covered = int(result['coverage'].sum())
+    return {
+        'run_id': run_id,
+        'start_date': dates[0].isoformat(),
+        'num_days': len(dates),
+        'num_csrs': len(csr_ids),
+        'totals': {
+            'demand': int(demand.sum()),
+            'coverage': total_covered,
+            'lack': int(result['lack'].sum()),
+            'overstaffing': int(result['overstaffing'].sum()),
+            'utilization': float(np.minimum(result['coverage'], demand).sum() / total_covered) if total_covered else None,
+        },
+        'per_period': {
+            'coverage': result['coverage'].tolist(),
+            'lack': result['lack'].tolist(),
+            'overstaffing': result['overstaffing'].tolist(),
+            'utilization': np.round(result['utilization'], 4).tolist(),
+        },
+        'per_csr': [{'csr_id': csr_id, 'working_days': int(days), 'worked_periods': int(periods),
+                     'utilization': round(float(utilization), 4)}
+                    for csr_id, days, periods, utilization in zip(csr_ids, result['csr_working_days'].tolist(),
+                                                                 result['csr_worked_periods'].tolist(),
+                                                                 result['csr_utilization'].tolist())],
+    }
+
+
+# Analytics by run_id as (demand table, computed at, result), least recently used first
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+# run_analytics from an in-process LRU cache of ANALYTICS_CACHE_SIZE runs. An entry is computed
+# again when the demand table was reloaded, after ANALYTICS_CACHE_TTL seconds, or after
+# invalidate_analytics(). Returns (result, version), version changing whenever the result
+# was computed again, e.g. for an ETag.
+def cached_run_analytics(session, run_id):
+    demand_table = get_demand_table(session)
+    with _lock:
+        entry = _cache.get(run_id)
+        if entry is not None and entry[0] is demand_table and time.monotonic() - entry[1] <= ANALYTICS_CACHE_TTL:
+            _cache.move_to_end(run_id)
+            return entry[2], f"{run_id}-{entry[1]:.6f}"
+    result = run_analytics(session, run_id, demand_table)
+    computed_at = time.monotonic()
+    with _lock:
+        _cache[run_id] = (demand_table, computed_at, result)
+        _cache.move_to_end(run_id)
+        while len(_cache) > ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result, f"{run_id}-{computed_at:.6f}"
+
+
+# Drop the cached analytics of one run, or of every run, after shifts were written
+def invalidate_analytics(run_id=None):
+    with _lock:
+        if run_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(run_id, None)
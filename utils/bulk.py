@@ -0,0 +1,75 @@
+from datetime import date
+
+from flask import jsonify, request
+from sqlalchemy import insert, update
+
+
+# Field of a bulk row as a date, raises ValueError when it is missing or malformed
+def row_date(row, name):
+    try:
+        return date.fromisoformat(row[name])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+
+# Field of a bulk row as an integer, None when it is missing and not required. Raises
+# ValueError otherwise, or when the value is not in `valid`, e.g. the existing ids.
+def row_int(row, name, required=True, valid=None):
+    value = row.get(name)
+    if value is None:
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"{name} must be an integer")
+    if valid is not None and value not in valid:
+        raise ValueError(f"unknown {name} {value}")
+    return value
+
+
+# JSON array body of a bulk request, None when the body is not an array
+def bulk_rows():
+    rows = request.get_json(silent=True)
+    return rows if isinstance(rows, list) else None
+
+
+# Check every row of a bulk request with parse(row), which returns the column values of the
+# row or raises ValueError. Returns the values of the valid rows by their natural key key(values),
+# a later row with the same key replacing an earlier one, and the errors as
+# [{"index": position in the request, "error": message}].
+def validate_rows(rows, parse, key):
+    valid = {}
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("row must be an object")
+            values = parse(row)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        valid[key(values)] = values
+    return valid, errors
+
+
+# Write the validated rows of a bulk request in one transaction: rows whose key is in
+# `existing` (key -> primary key) are updated, the others inserted, each with one executemany
+# statement whatever the number of rows. Returns (inserted, updated).
+def upsert_rows(session, model, primary_key, valid, existing):
+    inserts = [values for key, values in valid.items() if key not in existing]
+    updates = [{**values, primary_key.key: existing[key]} for key, values in valid.items() if key in existing]
+    try:
+        if inserts:
+            session.execute(insert(model), inserts)
+        if updates:
+            session.execute(update(model), updates)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(inserts), len(updates)
+
+
+# Response of a bulk endpoint, 200 even when some rows were rejected
+def bulk_response(inserted, updated, errors):
+    return jsonify({'inserted': inserted, 'updated': updated, 'errors': errors}), 200
@@ -1,11 +1,64 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from config import DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT
 
+_engine = None
+_session_factory = None
+
+# Extra create_engine arguments for the database in `url`
+def _engine_options(url):
+    url = make_url(url)
+    pool_options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+    }
+    if url.get_backend_name() != "sqlite":
+        # Replace connections the database server has dropped
+        return {**pool_options, 'pool_pre_ping': True}
+    # SQLite connections are shared with the Flask and Streamlit worker threads
+    options = {'connect_args': {'check_same_thread': False}}
+    if url.database in (None, "", ":memory:"):
+        # An in-memory database lives in its connection, keep a single one for the whole process
+        options['poolclass'] = StaticPool
+        return options
+    return {**options, **pool_options}
+
+# One engine per process, so every module (and an in-memory database) shares the same pool
 def get_engine():
-    return create_engine(DATABASE_URL)
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+    return _engine
 
+# A new session on the shared engine; the caller closes it
 def get_session():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    return Session()
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(bind=get_engine())
+    return _session_factory()
+
+# Session of the current thread for the Flask blueprints. Each request gets its own session,
+# removed by remove_session when the request ends, e.g.
+#     session = db_session
+#     bp.teardown_request(remove_session)
+db_session = scoped_session(get_session)
+
+def remove_session(exception=None):
+    db_session.remove()
+
+# Session for one block of work, e.g. one Streamlit page run:
+#     with session_scope() as session:
+#         ...
+# The session is closed at the end of the block, rolling back anything not committed.
+@contextmanager
+def session_scope():
+    session = get_session()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, replace
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.aggregated import solve_two_stage
+from utils.extraction import extract_solution
+from utils.model_builder import build_model
+from utils.profiling import sum_model_sizes
+from utils.rolling import month_windows, solve_rolling
+from utils.solvers import SolveResult, SolverSettings, relative_gap, solve
+
+# Attempts per group when its worker process dies (e.g. killed for running out of memory)
+MAX_ATTEMPTS = 2
+
+
+# One independent part of the workforce: the CSRs of a team with the demand of that team
+@dataclass
+class Group:
+    team: str
+    rows: list    # rows of the CSRs in the full csr_ids list
+    demand: np.ndarray
+
+
+# The Constraint fields as a plain object, so workers do not need the ORM models
+def plain_constraints(constraints):
+    return SimpleNamespace(**{column.name: getattr(constraints, column.name)
+                              for column in constraints.__table__.columns})
+
+
+# Split the CSRs and the demand by team. csr_teams holds the team of every CSR, demand_by_team
+# maps a team to its (days x periods) demand. CSRs and demand without a team form the None
+# group, and teams with demand but no CSRs get a group without rows, which is all lack.
+def build_groups(csr_teams, demand_by_team, num_days, num_periods):
+    rows_by_team = {}
+    for row, team in enumerate(csr_teams):
+        rows_by_team.setdefault(team, []).append(row)
+    teams = sorted(set(rows_by_team) | set(demand_by_team), key=lambda team: (team is None, str(team)))
+    return [Group(team, rows_by_team.get(team, []),
+                  demand_by_team.get(team, np.zeros((num_days, num_periods), dtype=np.int64)))
+            for team in teams]
+
+
+# Runs inside a worker process. Solves one group with the individual model, or with the
+# two-stage solve above `aggregate_above` CSRs, and returns (result, schedule, lack_values).
+# A horizon from start_date that spans more than one calendar month is solved month by month
+# with solve_rolling instead, without a warm start.
+def solve_group(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                settings, aggregate_above, warm_schedule=None, start_date=None):
+    if num_csrs == 0:
+        return SolveResult("OPTIMAL", float(demand.sum()), float(demand.sum()), 0.0), \
+            np.empty((0, demand.shape[0]), dtype=np.int32), demand.astype(float)
+    if start_date is not None and len(month_windows(start_date, demand.shape[0])) > 1:
+        return solve_rolling(coverage, demand, start_date, num_csrs, leave_index, night_indices, afternoon_indices,
+                             constraints, settings)
+    if num_csrs > aggregate_above:
+        return solve_two_stage(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices,
+                               constraints, settings, warm_schedule)
+
+    prob, x, lack = build_model(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices,
+                                constraints, warm_schedule)
+    result = solve(prob, replace(settings, warm_start=warm_schedule is not None))
+    if not result.has_solution:
+        return result, None, None
+    schedule, lack_values = extract_solution(x, lack)
+    return result, schedule, lack_values
+
+
+# Combine the group results into one: the objective and bound are sums, the status is the
+# weakest of the groups
+def _merge_results(results):
+    if any(result.status == "INFEASIBLE" for result in results):
+        return SolveResult("INFEASIBLE")
+    if not all(result.has_solution for result in results):
+        return SolveResult("NOT_SOLVED")
+    objective = sum(result.objective or 0.0 for result in results)
+    bounds = [result.best_bound for result in results]
+    best_bound = sum(bounds) if all(bound is not None for bound in bounds) else None
+    status = "OPTIMAL" if all(result.status == "OPTIMAL" for result in results) else "FEASIBLE"
+    gap = relative_gap(objective, best_bound)
+    nodes = [result.nodes for result in results if result.nodes is not None]
+    return SolveResult(status, objective, best_bound, gap, sum(nodes) if nodes else None,
+                       solve_time=max(r.solve_time or 0.0 for r in results),
+                       model_size=sum_model_sizes(result.model_size for result in results))
+
+
+# Solve every group in its own worker process and merge the rosters into one schedule.
+# A group whose solve fails or whose worker dies is reported in `failed` (team -> error)
+# and its CSRs are left out of the schedule, with the demand of the team counted as lack;
+# the other groups are not affected.
+# start_date is the first day of the horizon; a group whose horizon spans more than one
+# calendar month is then rolled month by month in its worker (see solve_group).
+# Returns (SolveResult, schedule, lack_values, scheduled_rows, failed): the schedule rows
+# follow scheduled_rows, the rows of the full csr_ids list that got a roster.
+def solve_decomposed(groups, coverage, leave_index, night_indices, afternoon_indices, constraints, settings=None,
+                     aggregate_above=200, warm_schedule=None, max_workers=None, start_date=None):
+    settings = settings or SolverSettings()
+    max_workers = max_workers or os.cpu_count()
+    if settings.threads is None:
+        # The groups already use every core, one solver thread each avoids oversubscription
+        settings = replace(settings, threads=1)
+    constraints = plain_constraints(constraints) if hasattr(constraints, '__table__') else constraints
+
+    outcomes = {}
+    failed = {}
+    pending = list(range(len(groups)))
+    for attempt in range(MAX_ATTEMPTS):
+        if not pending:
+            break
+        crashed = []
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pending)), mp_context=context) as executor:
+            futures = {}
+            for g in pending:
+                group = groups[g]
+                group_warm = warm_schedule[group.rows] if warm_schedule is not None else None
+                futures[g] = executor.submit(solve_group, coverage, group.demand, len(group.rows), leave_index,
+                                             night_indices, afternoon_indices, constraints, settings,
+                                             aggregate_above, group_warm, start_date)
+            for g, future in futures.items():
+                try:
+                    outcomes[g] = future.result()
+                except BrokenProcessPool:
+                    crashed.append(g)
+                    failed[groups[g].team] = "worker process died"
+                except Exception:
+                    failed[groups[g].team] = traceback.format_exc()
+        pending = crashed
+        for g in crashed:
+            if attempt + 1 < MAX_ATTEMPTS:
+                del failed[groups[g].team]
+
+    num_days, num_periods = groups[0].demand.shape if groups else (0, 0)
+    lack_values = np.zeros((num_days, num_periods))
+    results = []
+    scheduled_rows = []
+    rosters = []
+    infeasible = set()
+    for g, group in enumerate(groups):
+        result, schedule, group_lack = outcomes.get(g, (None, None, None))
+        if result is not None and not result.has_solution and group.team not in failed:
+            failed[group.team] = f"no schedule found ({result.status})"
+            if result.status == "INFEASIBLE":
+                infeasible.add(group.team)
+        if group.team in failed:
+            lack_values += group.demand
+            continue
+        results.append(result)
+        lack_values += group_lack
+        scheduled_rows.extend(group.rows)
+        rosters.append(schedule)
+
+    if not results:
+        # Infeasible when that is why every team failed, so the cause is not taken for a limit
+        status = "INFEASIBLE" if failed and infeasible == set(failed) else "NOT_SOLVED"
+        return SolveResult(status), None, None, [], failed
+    merged = _merge_results(results)
+    # Rows in the order of the full csr_ids list
+    order = np.argsort(scheduled_rows, kind="stable")
+    schedule = np.concatenate(rosters)[order] if rosters else np.empty((0, num_days), dtype=np.int32)
+    return merged, schedule, lack_values, sorted(scheduled_rows), failed
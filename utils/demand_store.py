@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+from config import DEMAND_CACHE_MAX_AGE, DEMAND_CACHE_RANGES
+from models import Demand
+from utils.model_builder import NUM_PERIODS
+
+# Team argument that selects the demand of every team, as None is the team of shared demand
+ALL_TEAMS = object()
+
+
+# Demand rows as arrays sorted by date: ids, dates (datetime64[D]), teams and the
+# (rows x periods) demand values. Date ranges are found by binary search on the dates.
+class DemandTable:
+    def __init__(self, ids, dates, teams, values):
+        self.ids = ids
+        self.dates = dates
+        self.teams = teams
+        self.values = values
+
+    # Read the Demand rows with start <= date <= end with one range query on the date index,
+    # every row when start and end are None
+    @classmethod
+    def load(cls, session, start=None, end=None):
+        query = session.query(Demand.id, Demand.date, Demand.team, Demand.demand)
+        if start is not None or end is not None:
+            query = query.filter(Demand.date.between(start, end))
+        rows = query.order_by(Demand.date, Demand.id).all()
+        return cls(np.array([row.id for row in rows], dtype=np.int64),
+                   np.array([row.date for row in rows], dtype="datetime64[D]"),
+                   np.array([row.team for row in rows], dtype=object),
+                   np.array([row.demand for row in rows], dtype=np.int64).reshape(len(rows), NUM_PERIODS))
+
+    @property
+    def first_date(self):
+        return self.dates[0].item() if len(self.dates) else None
+
+    @property
+    def last_date(self):
+        return self.dates[-1].item() if len(self.dates) else None
+
+    # Positions of the rows with start_date <= date <= end_date, of one team unless ALL_TEAMS
+    def select(self, start_date, end_date, team=ALL_TEAMS):
+        first = np.searchsorted(self.dates, np.datetime64(start_date, "D"), side="left")
+        last = np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right")
+        positions = np.arange(first, last)
+        if team is not ALL_TEAMS:
+            positions = positions[(self.teams[first:last] == team).astype(bool)]
+        return positions
+
+    # (num_days x periods) demand from start_date on, summed over the teams unless one is given.
+    # Days without demand are zero.
+    def matrix(self, start_date, num_days, team=ALL_TEAMS):
+        positions = self.select(start_date, start_date + timedelta(days=num_days - 1), team)
+        matrix = np.zeros((num_days, NUM_PERIODS), dtype=np.int64)
+        days = (self.dates[positions] - np.datetime64(start_date, "D")).astype(np.int64)
+        np.add.at(matrix, days, self.values[positions])
+        return matrix
+
+    # matrix() of every team that has demand from start_date on, by team
+    def matrices_by_team(self, start_date, num_days):
+        positions = self.select(start_date, start_date + timedelta(days=num_days - 1))
+        teams = set(self.teams[positions])
+        return {team: self.matrix(start_date, num_days, team) for team in teams}
+
+
+# Process-wide copies of the table by (start, end) as (table, loaded at), least recently used
+# first, (None, None) being the whole table. Dropped by invalidate_demand() or DEMAND_CACHE_MAX_AGE.
+_tables = OrderedDict()
+_lock = threading.Lock()
+
+
+# The demand table from start to end (inclusive), the whole table when both are None, from the
+# in-process copy of that range unless it is older than max_age seconds or fresh=True. Up to
+# DEMAND_CACHE_RANGES ranges are kept. Writers in this process call invalidate_demand(); max_age
+# bounds how long a change made by another process can go unseen.
+def get_demand_table(session, fresh=False, max_age=DEMAND_CACHE_MAX_AGE, start=None, end=None):
+    key = (start, end)
+    with _lock:
+        entry = _tables.get(key)
+        expired = entry is not None and max_age is not None and time.monotonic() - entry[1] > max_age
+        if fresh or entry is None or expired:
+            entry = (DemandTable.load(session, start, end), time.monotonic())
+            _tables[key] = entry
+        _tables.move_to_end(key)
+        while len(_tables) > DEMAND_CACHE_RANGES:
+            _tables.popitem(last=False)
+        return entry[0]
+
+
+# Drop the in-process copies after demand rows were written
+def invalidate_demand():
+    with _lock:
+        _tables.clear()
@@ -0,0 +1,104 @@
+import numpy as np
+
+
+# Staffing per day and period of a (csrs x days) schedule of shift indices: the number of
+# CSRs on each shift per day, times the coverage matrix. Needs memory for days x shifts
+# instead of csrs x days x periods.
+def covered_periods(schedule, coverage):
+    num_shifts = coverage.shape[0]
+    num_days = schedule.shape[1]
+    slots = np.arange(num_days) * num_shifts + np.asarray(schedule) % num_shifts
+    counts = np.bincount(slots.ravel(), minlength=num_days * num_shifts).reshape(num_days, num_shifts)
+    return counts @ coverage
+
+
+# Staffing against demand of a (csrs x days) schedule of shift indices, kept up to date one
+# assignment at a time. Besides the per-day, per-period coverage and lack it keeps, for every
+# CSR, the number of leave, night and afternoon days in each sliding window of the Constraint
+# row, so a change is checked and applied in O(periods + window) instead of re-evaluating the
+# whole schedule. The schedule array is updated in place by assign().
+class ScheduleEvaluator:
+    def __init__(self, schedule, coverage, demand, leave_index=None, night_indices=(), afternoon_indices=(),
+                 constraints=None):
+        self.schedule = schedule
+        self.coverage = coverage
+        self.demand = demand
+        self.covered = covered_periods(schedule, coverage)
+        self.lack = np.maximum(demand - self.covered, 0)
+        self.total_lack = int(self.lack.sum())
+
+        # Window rules as (flags per shift, window, limit, at_least, counts per CSR and window start)
+        self.rules = []
+        if constraints is not None:
+            num_shifts = coverage.shape[0]
+            self._add_rule(np.arange(num_shifts) == leave_index, constraints.max_days_off_in_period, 1, True)
+            self._add_rule(np.isin(np.arange(num_shifts), night_indices), constraints.max_night_shifts_in_period,
+                           constraints.max_night_shifts, False)
+            self._add_rule(np.isin(np.arange(num_shifts), afternoon_indices),
+                           constraints.max_afternoon_shifts_in_period, constraints.max_afternoon_shifts, False)
+
+    def _add_rule(self, flags, window, limit, at_least):
+        num_days = self.schedule.shape[1]
+        if not window or not flags.any() or num_days < window:
+            return
+        cumulative = np.pad(np.cumsum(flags[self.schedule], axis=1), ((0, 0), (1, 0)))
+        counts = cumulative[:, window:] - cumulative[:, :-window]
+        self.rules.append((flags, window, limit, at_least, counts))
+
+    # Period staffing above demand, per day and period
+    @property
+    def overstaffing(self):
+        return np.maximum(self.covered - self.demand, 0)
+
+    # Change of the total lack if CSR i worked shift j on day k
+    def lack_delta(self, i, k, j):
+        residual = self.demand[k] - self.covered[k] + self.coverage[self.schedule[i, k]]
+        return int(np.maximum(residual - self.coverage[j], 0).sum()) - int(self.lack[k].sum())
+
+    # lack_delta for every shift at once
+    def lack_deltas(self, i, k):
+        residual = self.demand[k] - self.covered[k] + self.coverage[self.schedule[i, k]]
+        return np.maximum(residual - self.coverage, 0).sum(axis=1) - int(self.lack[k].sum())
+
+    def _shift_counts(self, i, k, j):
+        for flags, window, _, _, counts in self.rules:
+            change = int(flags[j]) - int(flags[self.schedule[i, k]])
+            if change:
+                counts[i, max(0, k - window + 1):k + 1] += change
+
+    # True when the (day, shift) changes of CSR i keep every window rule. The counters are
+    # changed and restored, nothing is copied.
+    def allowed(self, i, changes):
+        previous = [(k, self.schedule[i, k]) for k, _ in changes]
+        for k, j in changes:
+            self._shift_counts(i, k, j)
+            self.schedule[i, k] = j
+        ok = True
+        for flags, window, limit, at_least, counts in self.rules:
+            for k, _ in changes:
+                affected = counts[i, max(0, k - window + 1):k + 1]
+                if (affected < limit).any() if at_least else (affected > limit).any():
+                    ok = False
+                    break
+            if not ok:
+                break
+        for k, j in reversed(previous):
+            self._shift_counts(i, k, j)
+            self.schedule[i, k] = j
+        return ok
+
+    # What if CSR i worked shift j on day k: (change of the total lack, whether the window rules hold)
+    def what_if(self, i, k, j):
+        return self.lack_delta(i, k, j), self.allowed(i, [(k, j)])
+
+    # Give CSR i shift j on day k
+    def assign(self, i, k, j):
+        old = self.schedule[i, k]
+        if old == j:
+            return
+        self._shift_counts(i, k, j)
+        self.covered[k] += self.coverage[j] - self.coverage[old]
+        day_lack = np.maximum(self.demand[k] - self.covered[k], 0)
+        self.total_lack += int(day_lack.sum()) - int(self.lack[k].sum())
+        self.lack[k] = day_lack
+        self.schedule[i, k] = j
@@ -0,0 +1,23 @@
+import numpy as np
+
+
+# Solution values of an object array of PuLP variables as a float array of the same shape,
+# read in one pass over varValue (NaN where the solver left a variable without a value)
+def variable_values(variables):
+    flat = variables.ravel()
+    values = np.fromiter((v.varValue if v.varValue is not None else np.nan for v in flat),
+                         dtype=np.float64, count=flat.size)
+    return values.reshape(variables.shape)
+
+
+# Compact solution of the individual model: a (csrs x days) int32 matrix of shift indices,
+# taken as the argmax over the shift axis of x, and the (days x periods) lack matrix
+def extract_solution(x, lack):
+    schedule = np.nan_to_num(variable_values(x), nan=0.0).argmax(axis=1).astype(np.int32)
+    lack_values = np.maximum(np.nan_to_num(variable_values(lack), nan=0.0), 0.0)
+    return schedule, lack_values
+
+
+# Rounded integer values, e.g. the shift counts of the aggregate model
+def integer_values(variables):
+    return np.rint(np.nan_to_num(variable_values(variables), nan=0.0)).astype(np.int64)
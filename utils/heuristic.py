@@ -0,0 +1,184 @@
+import math
+import time
+
+import numpy as np
+
+from utils.evaluator import ScheduleEvaluator
+
+
+# Number of leave days still needed in the last `remaining` days of the horizon by a CSR that
+# has worked `streak` days in a row, with at most max_streak working days in a row
+def _leave_needed(remaining, streak, max_streak):
+    room = max_streak - streak
+    return np.where(remaining > room, -(-(remaining - room) // (max_streak + 1)), 0)
+
+
+# Leave days per day of the horizon: the fewer the demand, the more CSRs are off
+def _leave_quota(demand, num_csrs, days_off):
+    num_days = demand.shape[0]
+    load = demand.sum(axis=1).astype(float)
+    working_days = num_csrs * (num_days - days_off)
+    working = load / load.sum() * working_days if load.sum() > 0 else np.full(num_days, working_days / num_days)
+    working = np.clip(working, 0, num_csrs)
+    # Round the running total, so the quotas add up to the total number of leave days
+    leave = np.diff(np.rint(np.cumsum(num_csrs - working)), prepend=0)
+    return np.clip(leave, 0, num_csrs).astype(int)
+
+
+class _Rules:
+    def __init__(self, num_shifts, leave_index, night_indices, afternoon_indices, constraints):
+        self.leave_index = leave_index
+        self.is_leave = np.arange(num_shifts) == leave_index
+        self.is_night = np.isin(np.arange(num_shifts), night_indices)
+        self.is_afternoon = np.isin(np.arange(num_shifts), afternoon_indices)
+        self.days_off = constraints.exact_days_off_per_month
+        self.leave_window = constraints.max_days_off_in_period
+        self.night_window = constraints.max_night_shifts_in_period
+        self.max_night = constraints.max_night_shifts
+        self.afternoon_window = constraints.max_afternoon_shifts_in_period
+        self.max_afternoon = constraints.max_afternoon_shifts
+
+
+# Greedy construction, one day at a time. The leave days are placed first: CSRs that must be
+# off to keep the days-off count or the working-streak rule feasible, then the most urgent
+# ones up to a daily quota that follows the demand. Every working CSR then takes the shift
+# that covers most of the remaining demand of the day among the shifts the night and
+# afternoon windows still allow.
+def greedy_schedule(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices, constraints, rng=None):
+    rng = rng if rng is not None else np.random.default_rng(0)
+    num_shifts = coverage.shape[0]
+    num_days = demand.shape[0]
+    rules = _Rules(num_shifts, leave_index, night_indices, afternoon_indices, constraints)
+    max_streak = rules.leave_window - 1 if rules.leave_window else num_days
+    working_shifts = ~rules.is_leave
+
+    schedule = np.full((num_csrs, num_days), leave_index, dtype=np.int32)
+    streak = np.zeros(num_csrs, dtype=np.int64)
+    left = np.full(num_csrs, rules.days_off, dtype=np.int64)
+    quota = _leave_quota(demand, num_csrs, rules.days_off)
+    for k in range(num_days):
+        remaining = num_days - k
+        forced = ((streak + 1 > max_streak) | (left >= remaining)
+                  | (_leave_needed(remaining - 1, streak + 1, max_streak) > left))
+        allowed = (left > 0) & (left - 1 >= _leave_needed(remaining - 1, 0, max_streak))
+        off = forced.copy()
+        optional = np.flatnonzero(allowed & ~forced)
+        extra = quota[k] - int(forced.sum())
+        if extra > 0 and len(optional):
+            urgency = left[optional] / remaining + streak[optional] / (max_streak + 1) + rng.random(len(optional)) * 1e-3
+            off[optional[np.argsort(-urgency)[:extra]]] = True
+        left -= off
+        streak = np.where(off, 0, streak + 1)
+
+        # Night and afternoon shifts already taken in the trailing windows
+        def room(is_type, window, limit):
+            if not window:
+                return np.ones(num_csrs, dtype=bool)
+            return is_type[schedule[:, max(0, k - window + 1):k]].sum(axis=1) < limit
+        night_ok = room(rules.is_night, rules.night_window, rules.max_night)
+        afternoon_ok = room(rules.is_afternoon, rules.afternoon_window, rules.max_afternoon)
+
+        residual = demand[k].astype(np.int64)
+        for i in rng.permutation(np.flatnonzero(~off)):
+            candidates = working_shifts & (~rules.is_night | night_ok[i]) & (~rules.is_afternoon | afternoon_ok[i])
+            if not candidates.any():
+                # Only night and afternoon shifts are defined and both windows are full
+                candidates = working_shifts
+            gain = np.minimum(coverage, np.maximum(residual, 0)).sum(axis=1)
+            j = int(np.flatnonzero(candidates)[np.argmax(gain[candidates])])
+            schedule[i, k] = j
+            residual -= coverage[j]
+    return schedule
+
+
+# Simulated annealing on the total lack. Two moves keep every roster valid: give a working
+# CSR another shift on one day, and move a day off of a CSR to one of their working days.
+# Stops after time_limit seconds, max_iterations moves or max_stall moves without a new best,
+# and returns the best schedule seen.
+def improve_schedule(schedule, coverage, demand, leave_index, night_indices, afternoon_indices, constraints,
+                     time_limit=1.0, max_iterations=None, rng=None, temperature=1.0, max_stall=None):
+    rng = rng if rng is not None else np.random.default_rng(0)
+    num_csrs, num_days = schedule.shape
+    if num_csrs == 0 or num_days == 0:
+        return schedule
+    evaluator = ScheduleEvaluator(schedule.copy(), coverage, demand, leave_index, night_indices, afternoon_indices,
+                                  constraints)
+    working_shifts = np.flatnonzero(np.arange(coverage.shape[0]) != leave_index)
+    best = evaluator.total_lack
+    best_schedule = schedule.copy()
+
+    start = time.perf_counter()
+    iteration = 0
+    last_improvement = 0
+    temp = temperature
+    while evaluator.total_lack > 0:
+        if max_iterations is not None and iteration >= max_iterations:
+            break
+        if max_stall is not None and iteration - last_improvement >= max_stall:
+            break
+        if iteration % 256 == 0:
+            elapsed = time.perf_counter() - start
+            if elapsed >= time_limit:
+                break
+            progress = elapsed / time_limit if time_limit else 1.0
+            if max_iterations:
+                progress = max(progress, iteration / max_iterations)
+            temp = temperature * (0.01 ** progress)
+        iteration += 1
+
+        # Up to three candidate moves, best first, as ([(day, shift), ...], change of the lack)
+        i = int(rng.integers(num_csrs))
+        roster = evaluator.schedule[i]
+        if rng.random() < 0.5:
+            # Another shift on a working day
+            k = int(rng.integers(num_days))
+            old = roster[k]
+            if old == leave_index:
+                continue
+            delta = evaluator.lack_deltas(i, k)[working_shifts]
+            moves = [([(k, int(working_shifts[n]))], int(delta[n]))
+                     for n in np.argsort(delta, kind='stable') if working_shifts[n] != old][:3]
+        else:
+            # A day off moved to a working day, the freed day gets one of the best shifts
+            offs = np.flatnonzero(roster == leave_index)
+            works = np.flatnonzero(roster != leave_index)
+            if not len(offs) or not len(works):
+                continue
+            k_off = int(offs[rng.integers(len(offs))])
+            k_work = int(works[rng.integers(len(works))])
+            delta_work = evaluator.lack_delta(i, k_work, leave_index)
+            delta_off = evaluator.lack_deltas(i, k_off)[working_shifts]
+            moves = [([(k_work, leave_index), (k_off, int(working_shifts[n]))], delta_work + int(delta_off[n]))
+                     for n in np.argsort(delta_off, kind='stable')[:3]]
+
+        for changes, delta in moves:
+            if delta > 0 and rng.random() >= math.exp(-delta / temp):
+                break
+            if not evaluator.allowed(i, changes):
+                continue
+            for k, j in changes:
+                evaluator.assign(i, k, j)
+            if evaluator.total_lack < best:
+                best = evaluator.total_lack
+                best_schedule[:] = evaluator.schedule
+                last_improvement = iteration
+            break
+    return best_schedule
+
+
+# Draft schedule in at most about time_limit seconds: greedy construction plus local search,
+# which stops early after max_stall moves without a better schedule.
+# The rosters follow the same Constraint rules as the MIP, so the draft can be handed to
+# build_model or solve_two_stage as a starting schedule.
+# Returns (schedule, lack_values) like extract_solution.
+def heuristic_schedule(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                       time_limit=1.0, seed=0, max_stall=None):
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    schedule = greedy_schedule(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices,
+                               constraints, rng)
+    remaining = max(time_limit - (time.perf_counter() - start), 0.0)
+    schedule = improve_schedule(schedule, coverage, demand, leave_index, night_indices, afternoon_indices,
+                                constraints, time_limit=remaining, rng=rng, max_stall=max_stall)
+    lack_values = np.maximum(demand - coverage[schedule].sum(axis=0), 0).astype(float)
+    return schedule, lack_values
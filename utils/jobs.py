@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import socket
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import date, datetime
+
+from config import JOB_WORKERS, SOLVER_MODE
+from models import Job
+from utils.db import get_session
+from utils.solvers import SolverSettings
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+# One pool per process, created on the first submit. The workers are spawned rather than
+# forked so they do not inherit the database connections of the web server.
+_executor = None
+
+
+def _get_executor(session):
+    global _executor
+    if _executor is None:
+        # Jobs of a runner that stopped before this one started will never finish
+        reset_stale_jobs(session)
+        _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+# Host and process id of the job runner queueing a job, kept in the job params
+def _owner():
+    return {'host': socket.gethostname(), 'pid': os.getpid()}
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Mark the jobs left queued or running by a job runner that no longer exists (the server was
+# restarted or crashed) as failed, so they do not stay pending forever. Jobs of runners that are
+# still alive on this host, and of other hosts, are left alone. Returns the number of jobs reset.
+def reset_stale_jobs(session):
+    host = socket.gethostname()
+    stale = []
+    for job in session.query(Job).filter(Job.status.in_(("queued", "running"))):
+        owner = (job.params or {}).get('owner') or {}
+        if owner.get('host', host) == host and not (owner.get('pid') and _process_alive(owner['pid'])):
+            stale.append(job.job_id)
+    if stale:
+        session.query(Job).filter(Job.job_id.in_(stale)).update(
+            {'status': "failed", 'error': "The job runner stopped before the job finished, submit it again.",
+             'finished_at': datetime.now()}, synchronize_session=False)
+        session.commit()
+    return len(stale)
+
+
+def _update_job(session, job_id, **values):
+    session.query(Job).filter(Job.job_id == job_id).update(values)
+    session.commit()
+
+
+# Runs inside a worker process: solve and record the outcome on the job row. The schedule is
+# stored as a new run only; no CSV is written, as jobs run side by side.
+def _run_job(job_id):
+    session = get_session()
+    try:
+        job = session.query(Job).get(job_id)
+        params = job.params or {}
+        _update_job(session, job_id, status="running", started_at=datetime.now())
+
+        # Imported here so the web server does not load the solver stack
+        from schedule2 import main as generate_schedule_main
+
+        settings = SolverSettings(**params['settings']) if params.get('settings') else None
+        start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else None
+        result = generate_schedule_main(mode=params.get('mode', SOLVER_MODE), settings=settings,
+                                        warm_start=params.get('warm_start'), start_date=start_date,
+                                        num_days=params.get('num_days'), output=None)
+        _update_job(session, job_id, status="done", result=result, finished_at=datetime.now())
+    except Exception:
+        session.rollback()
+        _update_job(session, job_id, status="failed", error=traceback.format_exc(), finished_at=datetime.now())
+    finally:
+        session.close()
+
+
+# Queue a schedule generation run and return its job_id straight away.
+# The arguments are those of schedule2.main; settings=None uses the SOLVER_* values in config.py.
+def submit_job(session, mode=SOLVER_MODE, settings=None, warm_start=None, start_date=None, num_days=None):
+    params = {
+        'mode': mode,
+        'settings': asdict(settings) if settings is not None else None,
+        'warm_start': warm_start,
+        'start_date': start_date.isoformat() if start_date is not None else None,
+        'num_days': num_days,
+        'owner': _owner(),
+    }
+    job = Job(status="queued", params=params, submitted_at=datetime.now())
+    session.add(job)
+    session.commit()
+    _get_executor(session).submit(_run_job, job.job_id)
+    return job.job_id
+
+
+# Poll a job; populate_existing re-reads the row the worker process is updating
+def get_job(session, job_id):
+    return session.query(Job).populate_existing().get(job_id)
+
+
+# Most recent jobs first, optionally only those with the given status
+def list_jobs(session, status=None, limit=50):
+    query = session.query(Job).populate_existing()
+    if status is not None:
+        query = query.filter(Job.status == status)
+    return query.order_by(Job.job_id.desc()).limit(limit).all()
+
+
+def job_to_dict(job):
+    return {
+        'job_id': job.job_id,
+        'status': job.status,
+        'params': job.params,
+        'result': job.result,
+        'error': job.error,
+        'submitted_at': job.submitted_at.isoformat() if job.submitted_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
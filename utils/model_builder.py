@@ -0,0 +1,179 @@
+import numpy as np
+import pulp
+
+# Number of 30-minute periods in a working day (09:00-21:00)
+NUM_PERIODS = 24
+
+
+# Turn the ShiftDefinition.periods lists into a (shifts x periods) 0/1 coverage matrix
+def build_coverage_matrix(shift_definitions):
+    coverage = np.array([sd.periods for sd in shift_definitions], dtype=np.int64)
+    return coverage.reshape(len(shift_definitions), -1)
+
+
+# Turn a {day: [24 demands]} mapping into a (days x periods) matrix, missing days count as zero demand
+def build_demand_matrix(demand, num_days, num_periods=NUM_PERIODS):
+    matrix = np.zeros((num_days, num_periods), dtype=np.int64)
+    for day, values in demand.items():
+        if 1 <= day <= num_days:
+            matrix[day - 1] = values
+    return matrix
+
+
+# Group the shift indices by their type ("Morning", "Afternoon", "Night", "Leave")
+def shift_type_indices(shift_definitions):
+    indices = {}
+    for idx, sd in enumerate(shift_definitions):
+        indices.setdefault(sd.type, []).append(idx)
+    return indices
+
+
+# Index of the leave shift: the first "Leave" typed shift, otherwise the lowest shift_def_id
+def leave_shift_index(shift_definitions):
+    for idx, sd in enumerate(shift_definitions):
+        if sd.type == "Leave":
+            return idx
+    return min(range(len(shift_definitions)), key=lambda idx: shift_definitions[idx].shift_def_id)
+
+
+# Sliding-window constraints: at most `limit` of `shift_indices` in every `window` consecutive
+# days, or at least `limit` of them with sense=pulp.LpConstraintGE.
+# history is an optional (csrs x h) matrix of the fixed shift indices of the h days before
+# day 0; windows that start in those days count them as constants.
+def _window_constraints(prefix, x, shift_indices, window, limit, sense=pulp.LpConstraintLE, history=None):
+    num_csrs, _, num_days = x.shape
+    batch = {}
+    if not shift_indices or not window:
+        return batch
+    h = min(history.shape[1], window - 1) if history is not None else 0
+    in_history = np.isin(history[:, history.shape[1] - h:], shift_indices) if h else None
+    for i in range(num_csrs):
+        for k in range(-h, num_days - window + 1):
+            terms = x[i, shift_indices, max(k, 0):k + window].ravel()
+            expr = pulp.LpAffineExpression([(v, 1) for v in terms])
+            fixed = int(in_history[i, h + k:].sum()) if k < 0 else 0
+            name = f"{prefix}_{i}_{k}" if k >= 0 else f"{prefix}_{i}_h{-k}"
+            batch[name] = pulp.LpConstraint(expr, sense, rhs=limit - fixed)
+    return batch
+
+
+# x[i, j, k] = 1 if CSR i is assigned to shift j on day k, 0 otherwise
+def build_assignment_variables(num_csrs, num_shifts, num_days):
+    x = np.empty((num_csrs, num_shifts, num_days), dtype=object)
+    for i in range(num_csrs):
+        for j in range(num_shifts):
+            for k in range(num_days):
+                x[i, j, k] = pulp.LpVariable(f"x_{i}_{j}_{k}", cat='Binary')
+    return x
+
+
+# Add the per-CSR roster rules from the Constraint row to `prob`, one batch per rule.
+# days_off overrides exact_days_off_per_month and only applies to the first days_off_days
+# days when given; history is passed on to the sliding-window rules.
+def add_roster_constraints(prob, x, leave_index, night_indices, afternoon_indices, constraints,
+                           days_off=None, days_off_days=None, history=None):
+    num_csrs, num_shifts, num_days = x.shape
+    if days_off is None:
+        days_off = constraints.exact_days_off_per_month
+
+    # Constraint 1: Each CSR is assigned to exactly one shift per day
+    batch = {}
+    for i in range(num_csrs):
+        for k in range(num_days):
+            expr = pulp.LpAffineExpression([(v, 1) for v in x[i, :, k]])
+            batch[f"one_shift_{i}_{k}"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=1)
+    prob.extend(batch)
+
+    # Constraint 2: Each CSR gets exactly the configured number of days off per month
+    batch = {}
+    for i in range(num_csrs):
+        expr = pulp.LpAffineExpression([(v, 1) for v in x[i, leave_index, :days_off_days]])
+        batch[f"days_off_{i}"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=days_off)
+    prob.extend(batch)
+
+    # Constraint 3: At most max_night_shifts night shifts in every window of consecutive days
+    prob.extend(_window_constraints("night", x, night_indices,
+                                    constraints.max_night_shifts_in_period, constraints.max_night_shifts,
+                                    history=history))
+
+    # Constraint 4: At most max_afternoon_shifts afternoon shifts in every window of consecutive days
+    prob.extend(_window_constraints("afternoon", x, afternoon_indices,
+                                    constraints.max_afternoon_shifts_in_period, constraints.max_afternoon_shifts,
+                                    history=history))
+
+    # Constraint 5: At least one day off in every window of consecutive working days.
+    # With exactly one shift per day, "at most window - 1 working days" is the same as
+    # "at least one leave day", which needs one term per day instead of one per working shift.
+    prob.extend(_window_constraints("working", x, [leave_index],
+                                    constraints.max_days_off_in_period, 1, sense=pulp.LpConstraintGE,
+                                    history=history))
+
+
+# Starting values for every variable of the individual model from a (csrs x days) schedule
+def _set_initial_values(x, staffed, lack, schedule, coverage, demand):
+    num_csrs, num_shifts, num_days = x.shape
+    one_hot = schedule[:, None, :] == np.arange(num_shifts)[None, :, None]
+    for (i, j, k), v in np.ndenumerate(x):
+        v.setInitialValue(int(one_hot[i, j, k]))
+    for (j, k), v in np.ndenumerate(staffed):
+        v.setInitialValue(int(one_hot[:, j, k].sum()))
+    lack_values = np.maximum(demand - coverage[schedule].sum(axis=0), 0)
+    for (k, t), v in np.ndenumerate(lack):
+        v.setInitialValue(int(lack_values[k, t]))
+
+
+# Build the CSR scheduling MIP.
+# The lack rows are written over per-shift staffing counts and every constraint family is
+# added to the problem as one batch, instead of one lpSum per cell. initial_schedule is an
+# optional valid (csrs x days) schedule of shift indices given to the solver as a start.
+# days_off, days_off_days and history are the rolling-horizon options of add_roster_constraints.
+# Returns the problem together with the x (csrs x shifts x days) and lack (days x periods)
+# variable arrays.
+def build_model(coverage, demand, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                initial_schedule=None, days_off=None, days_off_days=None, history=None):
+    num_shifts, num_periods = coverage.shape
+    num_days = demand.shape[0]
+
+    prob = pulp.LpProblem("CSR_Scheduling", pulp.LpMinimize)
+
+    x = build_assignment_variables(num_csrs, num_shifts, num_days)
+
+    # Auxiliary variables for the lack amount
+    lack = np.empty((num_days, num_periods), dtype=object)
+    for k in range(num_days):
+        for t in range(num_periods):
+            lack[k, t] = pulp.LpVariable(f"lack_{k}_{t}", lowBound=0, cat='Continuous')
+
+    # Minimize the total lack amount
+    prob += pulp.LpAffineExpression([(v, 1) for v in lack.ravel()])
+
+    # staffed[j, k] = number of CSRs on shift j on day k. The lack rows are written over these
+    # counts, so each row has one term per covering shift instead of one per CSR and shift.
+    staffed = np.empty((num_shifts, num_days), dtype=object)
+    batch = {}
+    for j in range(num_shifts):
+        for k in range(num_days):
+            staffed[j, k] = pulp.LpVariable(f"staffed_{j}_{k}", lowBound=0, upBound=num_csrs, cat='Continuous')
+            expr = pulp.LpAffineExpression([(v, 1) for v in x[:, j, k]])
+            expr[staffed[j, k]] = -1
+            batch[f"staffed_{j}_{k}"] = pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=0)
+    prob.extend(batch)
+
+    # Lack constraints: lack[k, t] + sum of CSRs covering period t on day k >= demand[k, t]
+    batch = {}
+    for t in range(num_periods):
+        covering = np.flatnonzero(coverage[:, t])
+        coefs = coverage[covering, t].tolist()
+        for k in range(num_days):
+            expr = pulp.LpAffineExpression(zip(staffed[covering, k], coefs))
+            expr[lack[k, t]] = 1
+            batch[f"lack_{k}_{t}"] = pulp.LpConstraint(expr, pulp.LpConstraintGE, rhs=int(demand[k, t]))
+    prob.extend(batch)
+
+    add_roster_constraints(prob, x, leave_index, night_indices, afternoon_indices, constraints,
+                           days_off, days_off_days, history)
+
+    if initial_schedule is not None:
+        _set_initial_values(x, staffed, lack, initial_schedule, coverage, demand)
+
+    return prob, x, lack
@@ -0,0 +1,69 @@
+import json
+from datetime import date
+from urllib.parse import urlencode
+
+from flask import Response, jsonify, request, stream_with_context
+
+# Rows per page when ?limit= is not given, and the most a client may ask for
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+# Rows fetched per query while streaming NDJSON
+STREAM_CHUNK_SIZE = 1000
+
+
+# Value of a YYYY-MM-DD query parameter, None when it is not given. Raises ValueError on a
+# malformed date.
+def date_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+
+# Restrict `query` to start_date <= column <= end_date from the query parameters
+def filter_date_range(query, column):
+    start_date = date_arg('start_date')
+    end_date = date_arg('end_date')
+    if start_date is not None:
+        query = query.filter(column >= start_date)
+    if end_date is not None:
+        query = query.filter(column <= end_date)
+    return query
+
+
+def _stream(query, key_column, to_dict, after):
+    while True:
+        page = query.filter(key_column > after) if after is not None else query
+        rows = page.limit(STREAM_CHUNK_SIZE).all()
+        if not rows:
+            return
+        yield "".join(json.dumps(to_dict(row)) + "\n" for row in rows)
+        after = getattr(rows[-1], key_column.key)
+
+
+# List response of `query` with keyset pagination on key_column, usually the primary key.
+# The body stays a JSON list of at most ?limit= rows after the ?after= cursor; when there are
+# more rows, the X-Next-Cursor header holds the cursor of the next page and the Link header
+# its URL. With ?format=ndjson every matching row after the cursor is streamed as one JSON
+# object per line, fetched STREAM_CHUNK_SIZE rows at a time.
+def list_response(query, key_column, to_dict):
+    after = request.args.get('after', type=int)
+    query = query.order_by(key_column)
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(_stream(query, key_column, to_dict, after)),
+                        mimetype='application/x-ndjson')
+
+    limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    if after is not None:
+        query = query.filter(key_column > after)
+    rows = query.limit(limit + 1).all()
+    response = jsonify([to_dict(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        cursor = getattr(rows[limit - 1], key_column.key)
+        next_args = {**request.args.to_dict(), 'after': cursor}
+        response.headers['X-Next-Cursor'] = str(cursor)
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return response
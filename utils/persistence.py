@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+from models import Request, ScheduleRun, Shift
+
+# Shift rows sent to the database per executemany call
+INSERT_BATCH_SIZE = 10000
+
+
+# Store one solver run as a new schedule version: a ScheduleRun row with the run metadata
+# and, when there is a schedule, all of its shifts in bulk executemany inserts within the
+# same transaction. schedule is a (csrs x days) matrix of shift indices, csr_ids and
+# shift_def_ids map its rows and indices to database ids. Returns the new run_id.
+def save_run(session, schedule, csr_ids, shift_def_ids, start_date, solve_result, mode, result=None,
+             total_lack=None, timings=None, params=None, input_key=None, stats=None):
+    run = ScheduleRun(
+        created_at=datetime.now(),
+        mode=mode,
+        status=solve_result.status,
+        result=result,
+        objective=solve_result.objective,
+        best_bound=solve_result.best_bound,
+        gap=solve_result.gap,
+        total_lack=float(total_lack) if total_lack is not None else None,
+        start_date=start_date,
+        num_days=schedule.shape[1] if schedule is not None else None,
+        num_csrs=schedule.shape[0] if schedule is not None else None,
+        timings=timings,
+        stats=stats,
+        params=params,
+        input_key=input_key,
+    )
+    try:
+        session.add(run)
+        session.flush()  # assigns run.run_id
+
+        if schedule is not None:
+            num_csrs, num_days = schedule.shape
+            csr_column = np.repeat(np.asarray(csr_ids), num_days).tolist()
+            shift_column = np.asarray(shift_def_ids)[schedule.ravel()].tolist()
+            dates = [start_date + timedelta(days=k) for k in range(num_days)] * num_csrs
+            rows = [{'csr_id': c, 'shift_def_id': s, 'date': d, 'run_id': run.run_id}
+                    for c, s, d in zip(csr_column, shift_column, dates)]
+            for i in range(0, len(rows), INSERT_BATCH_SIZE):
+                session.execute(insert(Shift), rows[i:i + INSERT_BATCH_SIZE])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return run.run_id
+
+
+# Latest run that produced a schedule, or None
+def latest_run(session):
+    return (session.query(ScheduleRun)
+            .filter(ScheduleRun.status.in_(("OPTIMAL", "FEASIBLE")))
+            .order_by(ScheduleRun.run_id.desc())
+            .first())
+
+
+# Latest stored run of the given solution cache key, or None
+def find_run(session, input_key):
+    return (session.query(ScheduleRun)
+            .filter(ScheduleRun.input_key == input_key, ScheduleRun.status.in_(("OPTIMAL", "FEASIBLE")))
+            .order_by(ScheduleRun.run_id.desc())
+            .first())
+
+
+# The shift_def_ids among shift_def_ids that stored shifts or requests refer to, which cannot be
+# deleted without those rows
+def referenced_shift_definitions(session, shift_def_ids):
+    referenced = set()
+    for model in (Shift, Request):
+        referenced.update(shift_def_id for shift_def_id, in (session.query(model.shift_def_id)
+                                                             .filter(model.shift_def_id.in_(shift_def_ids))
+                                                             .distinct()))
+    return referenced
+
+
+def list_runs(session, limit=50):
+    return session.query(ScheduleRun).order_by(ScheduleRun.run_id.desc()).limit(limit).all()
+
+
+# Shifts of one run as a (csrs x days) matrix of shift_def_ids, -1 where a day is missing.
+# Returns the csr_ids of the rows, the dates of the columns and the matrix.
+def load_run_schedule(session, run_id):
+    rows = (session.query(Shift.csr_id, Shift.shift_def_id, Shift.date)
+            .filter(Shift.run_id == run_id)
+            .all())
+    if not rows:
+        return [], [], np.empty((0, 0), dtype=np.int64)
+    csr_column, shift_column, date_column = zip(*rows)
+    csr_ids, csr_rows = np.unique(np.array(csr_column), return_inverse=True)
+    start = min(date_column)
+    day_columns = np.array([(d - start).days for d in date_column])
+    schedule = np.full((len(csr_ids), day_columns.max() + 1), -1, dtype=np.int64)
+    schedule[csr_rows, day_columns] = shift_column
+    dates = [start + timedelta(days=k) for k in range(schedule.shape[1])]
+    return csr_ids.tolist(), dates, schedule
+
+
+# Previous schedule for the warm start as shift indices: the latest stored run, one row per
+# CSR in csr_id order, -1 where the shift definition no longer exists. With csr_ids the rows
+# follow that list instead, and CSRs missing from the run get -1 everywhere. Returns None
+# when there is no run.
+def load_schedule_db(session, shift_definitions, csr_ids=None):
+    run = latest_run(session)
+    if run is None:
+        return None
+    run_csr_ids, _, shift_def_ids = load_run_schedule(session, run.run_id)
+    id_to_index = {sd.shift_def_id: idx for idx, sd in enumerate(shift_definitions)}
+    schedule = np.vectorize(lambda shift_def_id: id_to_index.get(shift_def_id, -1), otypes=[np.int64])(shift_def_ids)
+    if csr_ids is None or not run_csr_ids:
+        return schedule
+    row_of = {csr_id: i for i, csr_id in enumerate(run_csr_ids)}
+    aligned = np.full((len(csr_ids), schedule.shape[1]), -1, dtype=np.int64)
+    for i, csr_id in enumerate(csr_ids):
+        if csr_id in row_of:
+            aligned[i] = schedule[row_of[csr_id]]
+    return aligned
+
+
+def run_to_dict(run):
+    return {
+        'run_id': run.run_id,
+        'created_at': run.created_at.isoformat() if run.created_at else None,
+        'mode': run.mode,
+        'status': run.status,
+        'result': run.result,
+        'objective': run.objective,
+        'best_bound': run.best_bound,
+        'gap': run.gap,
+        'total_lack': run.total_lack,
+        'start_date': run.start_date.isoformat() if run.start_date else None,
+        'num_days': run.num_days,
+        'num_csrs': run.num_csrs,
+        'timings': run.timings,
+        'stats': run.stats,
+        'params': run.params,
+    }
+
@@ -0,0 +1,97 @@
+import json
+import logging
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import PROFILE_LOG
+
+# One JSON line per schedule run, written to PROFILE_LOG when it is set
+logger = logging.getLogger("schedule.profile")
+
+
+def _get_logger():
+    if PROFILE_LOG and not logger.handlers:
+        handler = logging.FileHandler(PROFILE_LOG)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    return logger
+
+
+# Peak resident memory in MB of this process, or with children=True of the largest child
+# process waited for so far (the CBC and HiGHS executables run as child processes). A forked
+# child counts the memory of this process at the fork, so the child figure is never below it.
+def peak_rss_mb(children=False):
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+# Number of variables, constraints and constraint nonzeros of a PuLP problem
+def model_size(prob):
+    return {
+        'variables': prob.numVariables(),
+        'constraints': len(prob.constraints),
+        'nonzeros': sum(len(constraint) for constraint in prob.constraints.values()),
+    }
+
+
+# Add up the model sizes of several solves, None when none of them is known
+def sum_model_sizes(sizes):
+    sizes = [size for size in sizes if size]
+    if not sizes:
+        return None
+    return {field: sum(size[field] for size in sizes) for field in sizes[0]}
+
+
+# Timings and statistics of one schedule run. Phases are timed with
+#     with profile.phase("build"):
+#         ...
+# or between begin(name) and end(name), and add up when a phase is timed more than once.
+class RunProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+        self.stats = {}
+        self._started = {}
+
+    def begin(self, name):
+        self._started[name] = time.perf_counter()
+
+    def end(self, name):
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - self._started.pop(name)
+
+    @contextmanager
+    def phase(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    # Model size and solver statistics of a SolveResult
+    def record_solve(self, result):
+        if result.model_size:
+            self.stats['model'] = result.model_size
+        self.stats['solver'] = {
+            'status': result.status,
+            'objective': result.objective,
+            'best_bound': result.best_bound,
+            'gap': result.gap,
+            'nodes': result.nodes,
+            'solve_time': result.solve_time,
+        }
+
+    # Total time and peak memory so far
+    def finish(self):
+        self.timings['total'] = time.perf_counter() - self.start
+        self.stats['peak_rss_mb'] = peak_rss_mb()
+        self.stats['solver_peak_rss_mb'] = peak_rss_mb(children=True)
+
+    # Write the profile as one structured log line, together with `fields` (run_id, mode, ...)
+    def log(self, **fields):
+        record = {'time': datetime.now().isoformat(), **fields, 'timings': self.timings, **self.stats}
+        _get_logger().info(json.dumps(record, default=str))
@@ -0,0 +1,89 @@
+import calendar
+from dataclasses import replace
+from datetime import timedelta
+
+import numpy as np
+
+from utils.extraction import extract_solution
+from utils.model_builder import build_model
+from utils.profiling import sum_model_sizes
+from utils.solvers import SolveResult, SolverSettings, solve
+
+
+# Split the horizon into calendar months: (first day, number of days) pairs, the first and
+# last of which may be partial months
+def month_windows(start_date, num_days):
+    windows = []
+    k = 0
+    while k < num_days:
+        day = start_date + timedelta(days=k)
+        days_in_month = calendar.monthrange(day.year, day.month)[1]
+        length = min(days_in_month - day.day + 1, num_days - k)
+        windows.append((k, length))
+        k += length
+    return windows
+
+
+# Days off for a window of `length` days in a month of `days_in_month` days
+def days_off_in_window(exact_days_off_per_month, length, days_in_month):
+    return int(round(exact_days_off_per_month * length / days_in_month))
+
+
+# Days off for the whole horizon: the days off of every calendar month it covers, scaled to
+# the part of the month inside the horizon. A whole month keeps exact_days_off_per_month.
+def days_off_in_horizon(exact_days_off_per_month, start_date, num_days):
+    days_off = 0
+    for first, length in month_windows(start_date, num_days):
+        day = start_date + timedelta(days=first)
+        days_off += days_off_in_window(exact_days_off_per_month, length, calendar.monthrange(day.year, day.month)[1])
+    return days_off
+
+
+# Rolling-horizon solve of a long horizon (a quarter or a year) one calendar month at a time.
+# Every window is solved with `lookahead` extra days of the next month, so its last days are
+# planned with the start of the next month in view, and only the month itself is kept. The
+# last days of the fixed months are passed to the next window as history, so the sliding-
+# window rules hold across month boundaries. Model size and solve time grow linearly with
+# the horizon.
+# Returns (SolveResult, schedule, lack_values) like solve_two_stage; the objective is the
+# total lack of the kept days and the status the weakest over the windows.
+def solve_rolling(coverage, demand, start_date, num_csrs, leave_index, night_indices, afternoon_indices, constraints,
+                  settings=None, lookahead=7):
+    settings = settings or SolverSettings()
+    num_days, num_periods = demand.shape
+    # Days of history that a sliding window can reach back into
+    history_days = max((window or 1) - 1 for window in (constraints.max_night_shifts_in_period,
+                                                        constraints.max_afternoon_shifts_in_period,
+                                                        constraints.max_days_off_in_period))
+
+    schedule = np.empty((num_csrs, num_days), dtype=np.int32)
+    lack_values = np.zeros((num_days, num_periods))
+    statuses = []
+    sizes = []
+    solve_time = 0.0
+    for first, length in month_windows(start_date, num_days):
+        day = start_date + timedelta(days=first)
+        days_in_month = calendar.monthrange(day.year, day.month)[1]
+        extra = min(lookahead, num_days - first - length)
+        history = schedule[:, max(0, first - history_days):first] if first else None
+
+        prob, x, lack = build_model(coverage, demand[first:first + length + extra], num_csrs, leave_index,
+                                    night_indices, afternoon_indices, constraints,
+                                    days_off=days_off_in_window(constraints.exact_days_off_per_month, length,
+                                                                days_in_month),
+                                    days_off_days=length, history=history)
+        result = solve(prob, replace(settings, warm_start=False))
+        solve_time += result.solve_time or 0.0
+        if not result.has_solution:
+            print(f"No schedule found for the window starting {day.isoformat()} ({result.status}).")
+            return SolveResult(result.status, solve_time=solve_time), None, None
+        window_schedule, window_lack = extract_solution(x, lack)
+        schedule[:, first:first + length] = window_schedule[:, :length]
+        lack_values[first:first + length] = window_lack[:length]
+        statuses.append(result.status)
+        sizes.append(result.model_size)
+        del prob, x, lack
+
+    status = "OPTIMAL" if all(status == "OPTIMAL" for status in statuses) else "FEASIBLE"
+    return SolveResult(status, float(lack_values.sum()), solve_time=solve_time, model_size=sum_model_sizes(sizes)), \
+        schedule, lack_values
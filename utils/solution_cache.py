@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict
+
+import numpy as np
+
+from config import SOLUTION_CACHE_DIR, SOLUTION_CACHE_MAX_AGE, SOLUTION_CACHE_MAX_BYTES
+from utils.solvers import SolveResult
+
+
+# Column values of a model row, in a form json can dump (dates become ISO strings)
+def _row_values(row):
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+
+# Canonical hash of everything that decides the solution: the ShiftDefinition and Constraint
+# rows, the (days x periods) demand of the horizon per team, the scheduled CSRs with their teams,
+# the horizon and the solver settings. Any change to an input gives a different key, so stale
+# entries are never returned and simply age out.
+def cache_key(shift_definitions, demand_by_team, constraints, workforce, start_date, num_days, mode, settings,
+              warm_start=None):
+    settings_values = asdict(settings)
+    settings_values.pop('msg', None)  # logging only, does not change the solution
+    payload = {
+        'shift_definitions': sorted((_row_values(sd) for sd in shift_definitions),
+                                    key=lambda values: values['shift_def_id']),
+        'demands': sorted(([team, np.asarray(matrix).tolist()] for team, matrix in demand_by_team.items()),
+                          key=lambda item: (item[0] is not None, str(item[0]))),
+        'constraints': _row_values(constraints) if constraints is not None else None,
+        'workforce': [list(csr) for csr in workforce],  # (user_id, team) pairs
+        'start_date': start_date.isoformat(),
+        'num_days': num_days,
+        'mode': mode,
+        'settings': settings_values,
+        'warm_start': warm_start,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+# Another process may have evicted the entry already
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.npz")
+
+
+# Stored (SolveResult, schedule, lack_values) for `key`, or None on a miss
+def get_solution(key, cache_dir=SOLUTION_CACHE_DIR, max_age=SOLUTION_CACHE_MAX_AGE):
+    path = _entry_path(key, cache_dir)
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            _remove(path)
+            return None
+        with np.load(path) as entry:
+            result = SolveResult(**json.loads(str(entry['result'])))
+            schedule = entry['schedule']
+            lack_values = entry['lack_values']
+        # Touch the entry so that eviction drops the least recently used solutions first
+        os.utime(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return result, schedule, lack_values
+
+
+def put_solution(key, result, schedule, lack_values, cache_dir=SOLUTION_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _entry_path(key, cache_dir)
+    # Write to a temporary file first so a concurrent reader never sees half an entry
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, result=json.dumps(asdict(result)), schedule=schedule, lack_values=lack_values)
+    os.replace(tmp_path, path)
+    evict(cache_dir)
+
+
+# Drop entries older than max_age seconds, then the least recently used ones until the
+# cache is no larger than max_bytes
+def evict(cache_dir=SOLUTION_CACHE_DIR, max_bytes=SOLUTION_CACHE_MAX_BYTES, max_age=SOLUTION_CACHE_MAX_AGE):
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npz"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if max_age is not None and now - stat.st_mtime > max_age:
+            _remove(path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if max_bytes is None or total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def clear_cache(cache_dir=SOLUTION_CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            _remove(os.path.join(cache_dir, name))
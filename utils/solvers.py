@@ -0,0 +1,244 @@
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+
+import pulp
+
+from utils.profiling import model_size
+
+BACKENDS = ("cbc", "highs", "cpsat")
+
+# CP-SAT needs finite domains, unbounded PuLP variables are capped at this value
+CPSAT_MAX_VALUE = 10 ** 9
+
+
+# Which backend to run and how long / hard it may work
+@dataclass
+class SolverSettings:
+    backend: str = "cbc"
+    threads: int = None
+    time_limit: float = None  # seconds
+    gap_rel: float = None     # stop once the relative gap is below this value
+    seed: int = None
+    msg: bool = False
+    warm_start: bool = False  # pass the current variable values to the solver as a starting solution
+
+
+# Outcome of a solve. status is one of "OPTIMAL", "FEASIBLE" (a solution was found but the
+# solver stopped on its time or gap limit), "INFEASIBLE" or "NOT_SOLVED".
+@dataclass
+class SolveResult:
+    status: str
+    objective: float = None
+    best_bound: float = None
+    gap: float = None
+    nodes: int = None
+    solve_time: float = None
+    model_size: dict = None   # variables, constraints and nonzeros of the model(s) solved
+
+    @property
+    def has_solution(self):
+        return self.status in ("OPTIMAL", "FEASIBLE")
+
+
+def relative_gap(objective, best_bound):
+    if objective is None or best_bound is None:
+        return None
+    if abs(objective - best_bound) < 1e-9:
+        return 0.0
+    return abs(objective - best_bound) / max(abs(objective), 1e-9)
+
+
+# Map PuLP's (status, sol_status) pair to a SolveResult status
+def _pulp_status(prob):
+    if prob.status == pulp.LpStatusInfeasible:
+        return "INFEASIBLE"
+    if prob.sol_status == pulp.LpSolutionOptimal:
+        return "OPTIMAL"
+    if prob.sol_status == pulp.LpSolutionIntegerFeasible:
+        return "FEASIBLE"
+    return "NOT_SOLVED"
+
+
+# Pull the summary block CBC prints at the end of its log
+def _parse_cbc_log(log):
+    def number(label):
+        match = re.search(rf"^{label}:\s+(\S+)", log, re.MULTILINE)
+        if not match:
+            return None
+        try:
+            return float(match.group(1))
+        except ValueError:
+            return None
+
+    nodes = number("Enumerated nodes")
+    return {
+        'objective': number("Objective value"),
+        'best_bound': number("Lower bound"),
+        'gap': number("Gap"),
+        'nodes': int(nodes) if nodes is not None else None,
+    }
+
+
+def _solve_cbc(prob, settings):
+    options = []
+    if settings.seed is not None:
+        options += [f"randomCbcSeed {settings.seed}", f"randomSeed {settings.seed}"]
+
+    fd, log_path = tempfile.mkstemp(suffix=".log", prefix="cbc_")
+    os.close(fd)
+    try:
+        solver = pulp.PULP_CBC_CMD(msg=False, threads=settings.threads, timeLimit=settings.time_limit,
+                                   gapRel=settings.gap_rel, options=options, logPath=log_path,
+                                   warmStart=settings.warm_start)
+        prob.solve(solver)
+        with open(log_path) as f:
+            log = f.read()
+    finally:
+        os.remove(log_path)
+    if settings.msg:
+        print(log)
+
+    stats = _parse_cbc_log(log)
+    status = _pulp_status(prob)
+    objective = pulp.value(prob.objective) if status in ("OPTIMAL", "FEASIBLE") else None
+    best_bound = stats['best_bound']
+    if best_bound is None and status == "OPTIMAL":
+        best_bound = objective
+    gap = relative_gap(objective, best_bound)
+    # CBC reports a solve that stopped on gapRel as optimal
+    if status == "OPTIMAL" and gap:
+        status = "FEASIBLE"
+    return SolveResult(status, objective, best_bound, gap, stats['nodes'])
+
+
+# pulp.HiGHS has no warm start option, hand the current variable values to highspy directly
+class _HiGHSWarmStart(pulp.HiGHS):
+    def callSolver(self, lp):
+        import highspy
+
+        solution = highspy.HighsSolution()
+        values = [0.0] * lp.solverModel.getNumCol()
+        for v in lp.variables():
+            values[v.index] = v.varValue if v.varValue is not None else 0.0
+        solution.col_value = values
+        solution.value_valid = True
+        lp.solverModel.setSolution(solution)
+        super().callSolver(lp)
+
+
+def _solve_highs(prob, settings):
+    solver_class = _HiGHSWarmStart if settings.warm_start else pulp.HiGHS
+    solver = solver_class(msg=settings.msg, threads=settings.threads, timeLimit=settings.time_limit,
+                          gapRel=settings.gap_rel)
+    if not solver.available():
+        # highspy is not installed, use the HiGHS executable (no solver statistics)
+        solver = pulp.HiGHS_CMD(msg=settings.msg, threads=settings.threads, timeLimit=settings.time_limit,
+                                gapRel=settings.gap_rel, warmStart=settings.warm_start)
+        prob.solve(solver)
+        status = _pulp_status(prob)
+        objective = pulp.value(prob.objective) if status in ("OPTIMAL", "FEASIBLE") else None
+        return SolveResult(status, objective)
+
+    if settings.seed is not None:
+        solver.optionsDict["random_seed"] = settings.seed
+    prob.solve(solver)
+    status = _pulp_status(prob)
+    info = prob.solverModel.getInfo()
+    objective = pulp.value(prob.objective) if status in ("OPTIMAL", "FEASIBLE") else None
+    best_bound = info.mip_dual_bound if prob.isMIP() else objective
+    gap = info.mip_gap if prob.isMIP() and objective is not None else relative_gap(objective, best_bound)
+    if status == "OPTIMAL" and gap and gap > 1e-9:
+        status = "FEASIBLE"
+    return SolveResult(status, objective, best_bound, gap, info.mip_node_count if prob.isMIP() else None)
+
+
+# Translate the PuLP model into a CP-SAT model. Every constraint coefficient must be
+# integral, which holds for the scheduling models (0/1 coverage, integer demand).
+def _solve_cpsat(prob, settings):
+    from ortools.sat.python import cp_model
+
+    model = cp_model.CpModel()
+    variables = prob.variables()
+    cp_vars = {}
+    for v in variables:
+        lower = int(v.lowBound) if v.lowBound is not None else -CPSAT_MAX_VALUE
+        upper = int(v.upBound) if v.upBound is not None else CPSAT_MAX_VALUE
+        cp_vars[v.name] = model.NewIntVar(lower, upper, v.name)
+        if settings.warm_start and v.varValue is not None:
+            model.AddHint(cp_vars[v.name], int(round(v.varValue)))
+
+    def linear(expr):
+        if any(c != int(c) for c in expr.values()):
+            raise ValueError("The CP-SAT backend needs integer constraint coefficients")
+        return sum(int(c) * cp_vars[v.name] for v, c in expr.items())
+
+    for name, constraint in prob.constraints.items():
+        rhs = -constraint.constant
+        if rhs != int(rhs):
+            raise ValueError(f"The CP-SAT backend needs an integer right-hand side ({name})")
+        lhs = linear(constraint)
+        if constraint.sense == pulp.LpConstraintLE:
+            model.Add(lhs <= int(rhs))
+        elif constraint.sense == pulp.LpConstraintGE:
+            model.Add(lhs >= int(rhs))
+        else:
+            model.Add(lhs == int(rhs))
+    if prob.objective is not None and len(prob.objective):
+        # CP-SAT accepts floating point objective coefficients
+        objective = sum(c * cp_vars[v.name] for v, c in prob.objective.items())
+        if prob.sense == pulp.LpMaximize:
+            model.Maximize(objective)
+        else:
+            model.Minimize(objective)
+
+    solver = cp_model.CpSolver()
+    if settings.threads is not None:
+        solver.parameters.num_workers = settings.threads
+    if settings.time_limit is not None:
+        solver.parameters.max_time_in_seconds = float(settings.time_limit)
+    if settings.gap_rel is not None:
+        solver.parameters.relative_gap_limit = float(settings.gap_rel)
+    if settings.seed is not None:
+        solver.parameters.random_seed = settings.seed
+    solver.parameters.log_search_progress = settings.msg
+    cp_status = solver.Solve(model)
+
+    status = {
+        cp_model.OPTIMAL: "OPTIMAL",
+        cp_model.FEASIBLE: "FEASIBLE",
+        cp_model.INFEASIBLE: "INFEASIBLE",
+    }.get(cp_status, "NOT_SOLVED")
+
+    if status in ("OPTIMAL", "FEASIBLE"):
+        for v in variables:
+            v.varValue = solver.Value(cp_vars[v.name])
+        sol_status = pulp.LpSolutionOptimal if status == "OPTIMAL" else pulp.LpSolutionIntegerFeasible
+        prob.assignStatus(pulp.LpStatusOptimal, sol_status)
+        objective = pulp.value(prob.objective) if prob.objective is not None else 0.0
+        best_bound = solver.BestObjectiveBound() + (prob.objective.constant if prob.objective is not None else 0)
+        return SolveResult(status, objective, best_bound, relative_gap(objective, best_bound), solver.NumBranches())
+
+    prob.assignStatus(pulp.LpStatusInfeasible if status == "INFEASIBLE" else pulp.LpStatusNotSolved)
+    return SolveResult(status)
+
+
+# Solve `prob` with the backend from `settings` and report how it went. Variable values are
+# written back to the PuLP variables, so pulp.value() works the same for every backend.
+def solve(prob, settings=None):
+    settings = settings or SolverSettings()
+    if settings.backend not in BACKENDS:
+        raise ValueError(f"Unknown solver backend {settings.backend!r}, expected one of {', '.join(BACKENDS)}")
+
+    start = time.perf_counter()
+    if settings.backend == "cbc":
+        result = _solve_cbc(prob, settings)
+    elif settings.backend == "highs":
+        result = _solve_highs(prob, settings)
+    else:
+        result = _solve_cpsat(prob, settings)
+    result.solve_time = time.perf_counter() - start
+    result.model_size = model_size(prob)
+    return result
@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Previous schedule from a csr_schedule.csv file as a (csrs x days) matrix of shift indices,
+# -1 where the shift name is no longer defined. Returns None when the file does not exist.
+def load_schedule_csv(path, shift_definitions):
+    if not os.path.exists(path):
+        return None
+    schedule_df = pd.read_csv(path, index_col=0, dtype=str)
+    name_to_index = {str(sd.name): idx for idx, sd in enumerate(shift_definitions)}
+    return np.vectorize(lambda name: name_to_index.get(name, -1), otypes=[np.int64])(schedule_df.to_numpy())
+
+
+# Stretch or cut the previous schedule to num_csrs x num_days. Extra CSRs copy existing rows
+# and extra days repeat the previous week, so the weekly rhythm of each roster is kept.
+def _resize(previous, num_csrs, num_days):
+    rows = previous[np.arange(num_csrs) % len(previous)]
+    if rows.shape[1] >= num_days:
+        return rows[:, :num_days].copy()
+    resized = np.full((num_csrs, num_days), -1, dtype=np.int64)
+    resized[:, :rows.shape[1]] = rows
+    for k in range(rows.shape[1], num_days):
+        resized[:, k] = resized[:, k - 7] if k >= 7 else -1
+    return resized
+
+
+# Place exactly `days_off` leave days with at most `window - 1` working days in a row,
+# keeping as many of the existing leave days as possible. Returns None when impossible.
+def _repair_leave(is_leave, days_off, window):
+    num_days = len(is_leave)
+    is_leave = is_leave.copy()
+    max_streak = window - 1 if window else num_days
+
+    # Break streaks that are too long by adding leave at the end of them
+    streak = 0
+    for k in range(num_days):
+        streak = 0 if is_leave[k] else streak + 1
+        if streak > max_streak:
+            is_leave[k] = True
+            streak = 0
+
+    def longest_streak_without(k):
+        trial = is_leave.copy()
+        trial[k] = False
+        run = best = 0
+        for leave in trial:
+            run = 0 if leave else run + 1
+            best = max(best, run)
+        return best
+
+    # Too many days off: drop the ones whose removal keeps every streak short enough
+    for k in np.flatnonzero(is_leave)[::-1]:
+        if is_leave.sum() <= days_off:
+            break
+        if longest_streak_without(k) <= max_streak:
+            is_leave[k] = False
+
+    # Too few days off: split the longest working streaks
+    while is_leave.sum() < days_off:
+        best_k, best_run, run = None, -1, 0
+        for k in range(num_days):
+            run = 0 if is_leave[k] else run + 1
+            if run > best_run:
+                best_k, best_run = k - run // 2, run
+        if best_run <= 0:
+            return None
+        is_leave[best_k] = True
+
+    if is_leave.sum() != days_off:
+        return None
+    return is_leave
+
+
+# Replace shifts of one type that break its sliding-window limit with `replacement`
+def _repair_window(roster, indices, window, limit, replacement):
+    if not indices or not window:
+        return
+    of_type = np.isin(roster, indices)
+    for k in range(len(roster)):
+        if of_type[k] and of_type[max(0, k - window + 1):k + 1].sum() > limit:
+            roster[k] = replacement
+            of_type[k] = False
+
+
+# Turn the previous schedule into one that satisfies the current Constraint row, so that it
+# can be handed to the solver as a starting incumbent. Unknown shifts and shifts that break
+# the night/afternoon windows become a shift of another type, and the leave days are moved
+# as little as possible to give every CSR exactly exact_days_off_per_month of them.
+def repair_schedule(previous, num_csrs, num_days, num_shifts, leave_index, night_indices, afternoon_indices,
+                    constraints):
+    schedule = _resize(previous, num_csrs, num_days)
+    restricted = set(night_indices) | set(afternoon_indices) | {leave_index}
+    others = [j for j in range(num_shifts) if j not in restricted]
+    replacement = others[0] if others else next(j for j in range(num_shifts) if j != leave_index)
+
+    for roster in schedule:
+        is_leave = _repair_leave(roster == leave_index, constraints.exact_days_off_per_month,
+                                 constraints.max_days_off_in_period)
+        if is_leave is None:
+            return None
+        roster[is_leave] = leave_index
+        roster[~is_leave & ((roster == leave_index) | (roster < 0))] = replacement
+        _repair_window(roster, list(night_indices), constraints.max_night_shifts_in_period,
+                       constraints.max_night_shifts, replacement)
+        _repair_window(roster, list(afternoon_indices), constraints.max_afternoon_shifts_in_period,
+                       constraints.max_afternoon_shifts, replacement)
+    return schedule
+
+
+# Give the y (shifts x days) count and lack variables of the aggregate model the values of `schedule`
+def set_initial_counts(y, lack, schedule, coverage, demand):
+    num_shifts, num_days = y.shape
+    counts = (schedule[None, :, :] == np.arange(num_shifts)[:, None, None]).sum(axis=1)
+    for (j, k), v in np.ndenumerate(y):
+        v.setInitialValue(int(counts[j, k]))
+    lack_values = np.maximum(demand - coverage[schedule].sum(axis=0), 0)
+    for (k, t), v in np.ndenumerate(lack):
+        v.setInitialValue(int(lack_values[k, t]))